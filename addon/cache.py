@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from .voxel_grid import to_jsonable
+
+INDEX_FILE = "index.json"
+
+
+def content_key(*arrays, **params):
+    """
+    Hashes array buffers and parameters into a cache key.
+
+    Parameters
+    ----------
+    arrays : numpy.ndarray
+        Arrays whose dtype, shape and content are part of the key.
+    params : dict
+        JSON serializable parameters that are part of the key.
+
+    Returns
+    -------
+    key : str
+        Hexadecimal SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        digest.update(memoryview(array).cast("B"))
+    digest.update(json.dumps(params, sort_keys=True,
+                             default=to_jsonable).encode())
+    return digest.hexdigest()
+
+
+def file_key(path, **params):
+    """
+    Hashes the content of a file, or of a list of files, and parameters into
+    a cache key.
+    """
+    digest = hashlib.sha256()
+    for path in [path] if isinstance(path, str) else path:
+        # The size separates the contents of consecutive files.
+        digest.update(f"{os.path.getsize(path)}:".encode())
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    digest.update(json.dumps(params, sort_keys=True,
+                             default=to_jsonable).encode())
+    return digest.hexdigest()
+
+
+def _stat(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class FileCache:
+    """
+    Least recently used cache of output files, keyed on content hashes.
+
+    Each entry is a list of files copied into its own folder of the cache
+    directory. The index records the size and last use of every entry, and
+    the least recently used entries are evicted once the total size goes
+    over the limit.
+    """
+
+    def __init__(self, directory, max_bytes):
+        """
+        Parameters
+        ----------
+        directory : str
+            Folder holding the cached files and the index.
+        max_bytes : int
+            Total size above which entries are evicted.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._index = self._read_index()
+
+    @property
+    def size(self):
+        """
+        Total size in bytes of the cached files.
+        """
+        return sum(entry["size"] for entry in self._index.values())
+
+    def entries(self):
+        """
+        Returns the entries as dictionaries, most recently used first.
+        """
+        entries = [dict(entry, key=key) for key, entry in self._index.items()]
+        return sorted(entries, key=lambda entry: entry["used"], reverse=True)
+
+    def get(self, key, targets):
+        """
+        Restores the files of an entry to the target paths.
+
+        Targets that still hold the files written by the previous get or put
+        of the same entry are left untouched.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+        targets : list of str
+            Destination paths, in the order the files were put.
+
+        Returns
+        -------
+        hit : bool
+            True when the entry exists and the targets are up to date.
+        """
+        entry = self._index.get(key)
+        if entry is None or len(entry["files"]) != len(targets):
+            self.misses += 1
+            return False
+
+        written = entry.setdefault("targets", {})
+        for name, target in zip(entry["files"], targets):
+            if os.path.isfile(target) and written.get(target) == _stat(target):
+                continue
+            shutil.copyfile(os.path.join(self.directory, key, name), target)
+            written[target] = _stat(target)
+
+        entry["used"] = time.time()
+        self._write_index()
+        self.hits += 1
+        return True
+
+    def put(self, key, sources):
+        """
+        Stores copies of files as a new entry and evicts old entries.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+        sources : list of str
+            Paths of the files to store.
+        """
+        folder = os.path.join(self.directory, key)
+        os.makedirs(folder, exist_ok=True)
+        files = []
+        for i, source in enumerate(sources):
+            name = f"{i}{os.path.splitext(source)[1]}"
+            shutil.copyfile(source, os.path.join(folder, name))
+            files.append(name)
+
+        self._index[key] = {
+            "files": files,
+            "size": sum(os.path.getsize(os.path.join(folder, name))
+                        for name in files),
+            "used": time.time(),
+            "targets": {source: _stat(source) for source in sources},
+        }
+        self._evict(keep=key)
+        self._write_index()
+
+    def clear(self):
+        """
+        Removes every entry from the cache.
+        """
+        for key in list(self._index):
+            self._remove(key)
+        self._write_index()
+
+    def _evict(self, keep=None):
+        # Drop the least recently used entries until the cache fits.
+        for entry in reversed(self.entries()):
+            if self.size <= self.max_bytes:
+                break
+            if entry["key"] != keep:
+                self._remove(entry["key"])
+
+    def _remove(self, key):
+        shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+        self._index.pop(key, None)
+
+    def _read_index(self):
+        path = os.path.join(self.directory, INDEX_FILE)
+        if not os.path.isfile(path):
+            return {}
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except ValueError:
+            # A corrupted index only loses the cached entries.
+            return {}
+
+    def _write_index(self):
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self._index, f)
+        os.replace(path + ".tmp", path)
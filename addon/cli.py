@@ -0,0 +1,276 @@
+"""
+Headless batch voxelization, without Blender.
+
+Usage::
+
+    python -m addon.cli parts/ -o out/ --mesh-size 0.5 --workers 8 \\
+        --material epsilon=4.2 --summary out/summary.json
+
+The source is a directory, searched recursively for stl files, or a
+manifest file listing one stl file per line. A manifest line may be followed
+by key=value material properties that override the --material ones for
+that file. Outputs whose source and parameters did not change since the
+last run are skipped.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from .cache import file_key
+from .constants import VOXELS_DIR
+from .sparse import sparse_path
+from .voxel_grid import grid_path
+from .voxelizer import VoxelJob
+
+# Index of the outputs written by the previous runs, in the output directory.
+INDEX_FILE = "voxelize.index.json"
+
+DONE = "done"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+def parse_value(value):
+    """
+    Reads a material value given on the command line as an int, a float or
+    a string.
+    """
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def parse_properties(pairs):
+    """
+    Reads key=value pairs into a dict of material properties.
+    """
+    properties = {}
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        if not sep or not key:
+            raise ValueError(f"Expected key=value, got '{pair}'")
+        properties[key] = parse_value(value)
+    return properties
+
+
+def find_sources(source, material):
+    """
+    Lists the stl files to voxelize with their material properties.
+
+    Parameters
+    ----------
+    source : str
+        A directory searched recursively, or a manifest file.
+    material : dict
+        Material properties shared by every file.
+
+    Returns
+    -------
+    sources : list of tuple
+        (stl_file, material) of each file, sorted by path.
+    """
+    if os.path.isdir(source):
+        sources = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith(".stl"):
+                    sources.append((os.path.join(root, name), dict(material)))
+        return sorted(sources)
+
+    base = os.path.dirname(os.path.abspath(source))
+    sources = []
+    with open(source) as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            path = os.path.join(base, fields[0])
+            sources.append(
+                (path, dict(material, **parse_properties(fields[1:]))))
+    return sources
+
+
+def output_name(stl_file, root):
+    """
+    Name of the outputs of an stl file, its path relative to the source
+    directory, so that files of different folders do not collide.
+    """
+    relative = os.path.relpath(os.path.splitext(stl_file)[0], root)
+    return relative.replace(os.sep, "__")
+
+
+def _timed_run(job):
+    # Runs in a worker, errors are returned so one bad part does not stop
+    # the batch.
+    start = time.perf_counter()
+    try:
+        job.run()
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return time.perf_counter() - start, error
+
+
+def run_batch(sources, output_dir, root, voxel_size=.1, export_mode='BOXES',
+              memory_budget=None, workers=1, force=False):
+    """
+    Voxelizes stl files and returns the summary of the run.
+
+    Parameters
+    ----------
+    sources : list of tuple
+        (stl_file, material) of each file.
+    output_dir : str
+        Directory of the outputs.
+    root : str
+        Directory the output names are relative to.
+    voxel_size : float
+        Size of the voxels.
+    export_mode : str
+        The voxel geometry to write, 'BOXES', 'SURFACE' or 'GREEDY'.
+    memory_budget : int
+        Peak memory of a brick for chunked voxelization, in bytes.
+    workers : int
+        Number of worker processes.
+    force : bool
+        Voxelize every file, even when its outputs are up to date.
+
+    Returns
+    -------
+    summary : dict
+        Parameters, per file status and timings, and totals.
+    """
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    index_file = os.path.join(output_dir, INDEX_FILE)
+    index = {}
+    if os.path.exists(index_file):
+        with open(index_file) as f:
+            index = json.load(f)
+
+    files = []
+    jobs = []
+    keys = []
+    for stl_file, material in sources:
+        obj_file = os.path.join(output_dir, output_name(stl_file, root) + ".obj")
+        entry = {"source": stl_file, "obj_file": obj_file,
+                 "status": SKIPPED, "seconds": 0.0, "error": None}
+        files.append(entry)
+
+        outputs = [obj_file, os.path.splitext(obj_file)[0] + ".mtl",
+                   sparse_path(obj_file) if memory_budget else grid_path(obj_file)]
+        try:
+            key = file_key(stl_file, voxel_size=voxel_size,
+                           export_mode=export_mode, material=material,
+                           memory_budget=memory_budget)
+        except OSError as e:
+            entry.update(status=FAILED, error=f"{type(e).__name__}: {e}")
+            continue
+
+        if (not force and index.get(obj_file) == key
+                and all(os.path.exists(path) for path in outputs)):
+            continue
+
+        jobs.append(VoxelJob(stl_file, os.path.splitext(obj_file)[0],
+                             output_dir, obj_file, voxel_size=voxel_size,
+                             export_mode=export_mode, material=material,
+                             memory_budget=memory_budget))
+        keys.append((entry, key))
+
+    if min(workers, len(jobs)) > 1:
+        # Same start method as in Blender, so the batch behaves the same.
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(min(workers, len(jobs))) as pool:
+            results = pool.map(_timed_run, jobs, chunksize=1)
+    else:
+        results = [_timed_run(job) for job in jobs]
+
+    for (entry, key), (seconds, error) in zip(keys, results):
+        entry.update(seconds=seconds, error=error,
+                     status=FAILED if error else DONE)
+        if error:
+            index.pop(entry["obj_file"], None)
+        else:
+            index[entry["obj_file"]] = key
+
+    with open(index_file, "w") as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+
+    counts = {status: sum(entry["status"] == status for entry in files)
+              for status in (DONE, SKIPPED, FAILED)}
+    return {
+        "parameters": {"voxel_size": voxel_size, "export_mode": export_mode,
+                       "memory_budget": memory_budget, "workers": workers},
+        "files": files,
+        "counts": counts,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m addon.cli",
+        description="Voxelizes stl files without Blender.")
+    parser.add_argument(
+        "source", help="Directory of stl files, or manifest listing them.")
+    parser.add_argument(
+        "-o", "--output",
+        help=f"Output directory, by default {VOXELS_DIR} next to the source.")
+    parser.add_argument("--mesh-size", type=float, default=.1,
+                        help="Size of the voxels.")
+    parser.add_argument("--mode", choices=['BOXES', 'SURFACE', 'GREEDY'],
+                        default='BOXES', help="Voxel geometry to write.")
+    parser.add_argument("--memory-budget", type=int, default=None,
+                        help="Voxelize in chunks of about this many MB.")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(),
+                        help="Number of worker processes.")
+    parser.add_argument("-m", "--material", action="append", default=[],
+                        metavar="KEY=VALUE",
+                        help="Material property of every file, repeatable.")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="Voxelize files whose outputs are up to date.")
+    parser.add_argument("--summary",
+                        help="Path of the JSON summary, '-' for stdout.")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    root = args.source
+    if not os.path.isdir(root):
+        root = os.path.dirname(os.path.abspath(root))
+    output_dir = args.output or os.path.join(root, VOXELS_DIR)
+
+    material = parse_properties(args.material)
+    sources = find_sources(args.source, material)
+    memory_budget = None
+    if args.memory_budget:
+        memory_budget = args.memory_budget * 1024 * 1024
+
+    summary = run_batch(sources, output_dir, root, voxel_size=args.mesh_size,
+                        export_mode=args.mode, memory_budget=memory_budget,
+                        workers=args.workers, force=args.force)
+
+    if args.summary == "-":
+        json.dump(summary, sys.stdout, indent=1)
+        print()
+    elif args.summary:
+        with open(args.summary, "w") as f:
+            json.dump(summary, f, indent=1)
+
+    counts = summary["counts"]
+    print(f"{counts[DONE]} voxelized, {counts[SKIPPED]} up to date, "
+          f"{counts[FAILED]} failed in {summary['seconds']:.1f}s",
+          file=sys.stderr)
+    return 1 if counts[FAILED] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
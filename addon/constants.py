@@ -1,4 +1,12 @@
 VOXELS_DIR = "export/voxels"
+VOXEL_CACHE_DIR = "export/voxels/cache"
 DEPENDENCIES = ['seaborn', 'trimesh', 'matplotlib', 'pandas', 'numpy', 'scipy']
 VISUALISATIONS_DIR = "export/visualizations"
 SIMULATIONS_DIR = "export/simulations"
+SIMULATION_CACHE_DIR = "export/simulations/cache"
+CHECKPOINTS_DIR = "export/simulations/checkpoints"
+CHECKPOINT_EXTENSION = ".checkpoint.npz"
+JOBS_FILE = "export/simulations/jobs.sqlite"
+GRID_EXTENSION = ".grid.npz"
+SPARSE_EXTENSION = ".bricks.npz"
+FREQUENCY_UNIT = 1e9
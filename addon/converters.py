@@ -1,24 +1,37 @@
 
 import bpy
 import os
-from .constants import VOXELS_DIR
-from .voxelizer import Voxelizer, CustomMaterial
-
-
-class OBJECT_OT_stl_to_obj(bpy.types.Operator):
+import numpy as np
+import trimesh
+from mathutils import Vector
+from .cache import FileCache, content_key, file_key
+from .constants import GRID_EXTENSION, VOXELS_DIR, VOXEL_CACHE_DIR
+from .scene_grid import save_scene_grid
+from .sparse import sparse_path
+from .voxel_grid import grid_path, to_jsonable
+from .task_opt import BackgroundOperator
+from .tasks import BackgroundTask, DONE
+from .voxelizer import Voxelizer, CustomMaterial, VoxelJob, default_material
+
+
+class OBJECT_OT_stl_to_obj(BackgroundOperator, bpy.types.Operator):
     """
     Operator to convert STL files to MSH format.
 
     Provides an interface for the user to perform the conversion from the Blender UI.
+    The voxelization runs in worker processes while the UI stays responsive.
     """
 
     bl_idname = "object.stl_to_obj"
     bl_label = "Generate OBJ file"
     bl_options = {'REGISTER', 'UNDO'}
 
-    def execute(self, context):
+    task_name = "Voxelization"
+
+    def prepare(self, context):
         """
-        Main execution function which is called when the operator is run.
+        Reads the geometry of the filtered objects on the main thread and
+        returns the task voxelizing them.
 
         Handles the conversion of STL files to MSH.
         """
@@ -39,6 +52,28 @@ class OBJECT_OT_stl_to_obj(bpy.types.Operator):
         # Extracting global settings from the context.
         global_settings = context.scene.settings
 
+        # Evaluated dependency graph, used to read meshes with their modifiers
+        # applied without going through an STL export.
+        depsgraph = context.evaluated_depsgraph_get()
+
+        task = BackgroundTask(workers=global_settings.workers)
+        self.cache = None
+        self.pending = []
+
+        if global_settings.unified_grid:
+            return self.prepare_unified(context, task, blend_directory, depsgraph)
+
+        # Cache of the voxelization outputs, keyed on the geometry and the
+        # voxelization parameters.
+        if global_settings.use_cache:
+            self.cache = FileCache(os.path.join(blend_directory, VOXEL_CACHE_DIR),
+                                   global_settings.cache_size * 1024 * 1024)
+
+        # Peak memory of a brick when voxelizing in chunks, in bytes.
+        memory_budget = None
+        if global_settings.chunked:
+            memory_budget = global_settings.memory_budget * 1024 * 1024
+
         # Deselecting all objects to prepare for operation.
         bpy.ops.object.select_all(action='DESELECT')
         self.report({'INFO'}, "Conversion to OBJ started")
@@ -47,38 +82,141 @@ class OBJECT_OT_stl_to_obj(bpy.types.Operator):
         for obj in filtered_objects:
             current_object = obj.object
 
-            # Selecting the current object and making it active.
-            current_object.select_set(True)
-            bpy.context.view_layer.objects.active = current_object
-            custom_properties = {}
-            if current_object.type == 'MESH':
-                if len(current_object.keys()) > 2:
-                    # First item is _RNA_UI
-                    for property in list(current_object.keys())[1:]:
-                        if property not in '_RNA_UI':
-                            custom_properties[property] = current_object[property]
+            custom_properties = object_properties(current_object)
             self.report({'INFO'}, f"{current_object}")
 
             stl_file = os.path.join(
                 blend_directory, VOXELS_DIR, f"{current_object.name}.stl")
             obj_file = os.path.join(
                 blend_directory, VOXELS_DIR, f"{current_object.name}.obj")
+            outputs = [obj_file, os.path.splitext(obj_file)[0] + ".mtl"]
+            if memory_budget:
+                # Chunked voxelization writes a sparse brick map instead of
+                # the dense grid.
+                outputs.append(sparse_path(obj_file))
+            else:
+                outputs.append(grid_path(obj_file))
+            parameters = dict(voxel_size=global_settings.mesh_size,
+                              export_mode=global_settings.export_mode,
+                              material=custom_properties,
+                              memory_budget=memory_budget)
 
-            self.report({'INFO'}, f"{stl_file}")
             self.report({'INFO'}, f"{obj_file}")
 
-            # Export the mesh of the current object to an STL file.
-            bpy.ops.export_mesh.stl(filepath=stl_file, use_selection=True)
+            if global_settings.export_stl:
+                self.report({'INFO'}, f"{stl_file}")
+
+                # Selecting the current object and making it active.
+                current_object.select_set(True)
+                bpy.context.view_layer.objects.active = current_object
+
+                # Export the mesh of the current object to an STL file.
+                bpy.ops.export_mesh.stl(filepath=stl_file, use_selection=True)
+
+                # Deselect the current object.
+                current_object.select_set(False)
+
+                key = file_key(stl_file, **parameters)
+                source = stl_file
+                mtl_name = stl_file.split(".stl")[0]
+            else:
+                # The vertices are in world space, so the key also covers
+                # the transform of the object.
+                mesh = extract_mesh(current_object, depsgraph)
+                key = content_key(mesh.vertices, mesh.faces, **parameters)
+                source = (np.asarray(mesh.vertices), np.asarray(mesh.faces))
+                mtl_name = os.path.splitext(obj_file)[0]
+
+            if self.cache is not None and self.cache.get(key, outputs):
+                continue
+
+            # Geometry is read on the main thread, the voxelization itself
+            # only needs the job and runs in a worker process.
+            job = VoxelJob(source, mtl_name, blend_directory, obj_file,
+                           voxel_size=global_settings.mesh_size,
+                           export_mode=global_settings.export_mode,
+                           material=custom_properties,
+                           memory_budget=memory_budget)
+            task.add(current_object.name, job.run)
+            self.pending.append((key, outputs))
+
+        return task
+
+    def finish(self, context):
+        """
+        Stores the new outputs in the cache and reports the result.
+        """
 
-            # Convert the STL file to a OBJ file.
-            stl_to_obj(global_settings.mesh_size, blend_directory, stl_file, obj_file,
-                       CustomMaterial(**custom_properties))
+        if self.cache is not None:
+            for item, (key, outputs) in zip(self.task.items, self.pending):
+                if item.status == DONE:
+                    self.cache.put(key, outputs)
+            self.report(
+                {'INFO'}, f"Voxel cache: {self.cache.hits} hits, {self.cache.misses} misses")
 
-            # Deselect the current object.
-            current_object.select_set(False)
         self.report({'INFO'}, "Conversion to OBJ completed")
         return {'FINISHED'}
 
+    def prepare_unified(self, context, task, blend_directory, depsgraph):
+        """
+        Returns the task voxelizing every filtered object into one grid
+        aligned on the CubeScene, where each voxel holds the id of its
+        material.
+        """
+
+        container = bpy.data.objects.get("CubeScene")
+        if container is None:
+            self.report({'ERROR'}, "CubeScene not found.")
+            return {'CANCELLED'}
+
+        # Axis aligned bounds of the CubeScene in world space.
+        corners = np.array([container.matrix_world @ Vector(corner)
+                            for corner in container.bound_box])
+
+        sources = []
+        materials = []
+        for obj in context.scene.FilteredObjects:
+            mesh = extract_mesh(obj.object, depsgraph)
+            sources.append((np.asarray(mesh.vertices), np.asarray(mesh.faces)))
+            materials.append(dict(default_material().kwargs,
+                                  **object_properties(obj.object)))
+
+        grid_file = os.path.join(
+            blend_directory, VOXELS_DIR, f"{container.name}{GRID_EXTENSION}")
+        self.report({'INFO'}, "Scene voxelization started")
+        task.add(container.name, save_scene_grid, sources, materials,
+                 corners.min(axis=0), corners.max(axis=0),
+                 context.scene.settings.mesh_size, grid_file)
+        return task
+
+
+def object_properties(obj):
+    """
+    Reads the custom properties of an object as plain Python values.
+
+    Parameters
+    ----------
+    obj : bpy.types.Object
+        The object to read.
+
+    Returns
+    -------
+    properties : dict
+        The custom properties, by name.
+    """
+
+    custom_properties = {}
+    if obj.type == 'MESH':
+        if len(obj.keys()) > 2:
+            # First item is _RNA_UI
+            for property in list(obj.keys())[1:]:
+                if property not in '_RNA_UI':
+                    value = obj[property]
+                    if not isinstance(value, (int, float, str)):
+                        value = to_jsonable(value)
+                    custom_properties[property] = value
+    return custom_properties
+
 
 def export_stl(context, filepath):
     """
@@ -113,8 +251,81 @@ def export_stl(context, filepath):
         obj.select_set(True)
 
 
+def extract_mesh(obj, depsgraph):
+    """
+    Reads the evaluated geometry of a mesh object into a trimesh mesh.
+
+    Vertices and triangles are copied in bulk with ``foreach_get`` and the
+    world transform is applied with NumPy, so no file is written and no
+    operator is called.
+
+    Parameters
+    ----------
+    obj : bpy.types.Object
+        The mesh object to read.
+    depsgraph : bpy.types.Depsgraph
+        The evaluated dependency graph of the scene.
+
+    Returns
+    -------
+    mesh : trimesh.Trimesh
+        The triangulated mesh in world coordinates.
+    """
+
+    evaluated = obj.evaluated_get(depsgraph)
+    mesh = evaluated.to_mesh()
+    try:
+        mesh.calc_loop_triangles()
+
+        vertices = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", vertices)
+        vertices = vertices.reshape(-1, 3).astype(np.float64)
+
+        faces = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+        mesh.loop_triangles.foreach_get("vertices", faces)
+        faces = faces.reshape(-1, 3)
+    finally:
+        evaluated.to_mesh_clear()
+
+    # Apply the world transform to every vertex at once.
+    matrix = np.array(evaluated.matrix_world, dtype=np.float64)
+    vertices = vertices @ matrix[:3, :3].T + matrix[:3, 3]
+
+    return trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+
+
+def mesh_to_obj(mesh_size, blender_dir, mesh, mtl_name, obj_file,
+                custom_material: CustomMaterial = None, export_mode='BOXES'):
+    """
+    Converts an in-memory mesh to an OBJ file.
+
+    Utilizes the Voxelizer class to perform the conversion.
+
+    Parameters
+    ----------
+    mesh_size : float
+        The mesh size for the voxelization.
+    blender_dir : str
+        The directory of the Blender file.
+    mesh : trimesh.Trimesh
+        The mesh to voxelize.
+    mtl_name : str
+        The name of the material file, without extension.
+    obj_file : str
+        The path of the output OBJ file.
+    custom_material : CustomMaterial
+        The material properties for the voxelization.
+    export_mode : str
+        The voxel geometry to write, 'BOXES', 'SURFACE' or 'GREEDY'.
+    """
+
+    v = Voxelizer(mesh, mtl_name, blender_dir, voxel_size=mesh_size,
+                  export_mode=export_mode)
+    v.export_obj(obj_file=obj_file, custom_material=custom_material)
+
+
 def stl_to_obj(mesh_size, blender_dir, stl_file, obj_file,
-               custom_material: CustomMaterial = None):
+               custom_material: CustomMaterial = None, export_mode='BOXES'):
     """
     Converts an STL file to an OBJ file.
 
@@ -132,8 +343,10 @@ def stl_to_obj(mesh_size, blender_dir, stl_file, obj_file,
         The path of the output OBJ file.
     custom_material : CustomMaterial
         The material properties for the voxelization.
+    export_mode : str
+        The voxel geometry to write, 'BOXES', 'SURFACE' or 'GREEDY'.
     """
 
     v = Voxelizer(stl_file, stl_file.split(".stl")[
-                  0], blender_dir, voxel_size=mesh_size)
+                  0], blender_dir, voxel_size=mesh_size, export_mode=export_mode)
     v.export_obj(obj_file=obj_file, custom_material=custom_material)
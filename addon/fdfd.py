@@ -0,0 +1,392 @@
+from collections import OrderedDict
+
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+
+from .cache import content_key
+from .fdtd import (EPSILON_0, ETA_0, MARGIN_CELLS, MU_0, PML_CELLS, PML_ORDER,
+                   C_0, domain_labels, material_arrays)
+from .probes import probe_cells
+
+# Reflection targeted by the stretched coordinate PML at normal incidence.
+PML_REFLECTION = 1e-8
+
+# Number of factorizations kept by the cache, they can take a lot of memory.
+CACHE_SIZE = 4
+
+# Tolerance and restart of the iterative solver.
+TOLERANCE = 1e-8
+RESTART = 200
+
+# Largest number of restart cycles of the iterative solver, and the
+# fraction of the residual a cycle must leave for the preconditioner to be
+# deemed too poor.
+MAX_CYCLES = 20
+STAGNATION = .9
+
+# Fallbacks of the iterative method to the complete factorization, when the
+# incomplete one fails or when GMRES stagnates with it.
+SPILU_FAILED = 'SPILU_FAILED'
+GMRES_STAGNATED = 'GMRES_STAGNATED'
+
+# Factorizations and preconditioners by problem key, with the fallback that
+# produced them, least recently used first.
+FACTORIZATIONS = OrderedDict()
+
+
+def _difference(size, pitch):
+    # Forward difference along one axis, the cell past the edge counting as
+    # zero.
+    return sp.diags([-np.ones(size), np.ones(size - 1)], [0, 1],
+                    shape=(size, size)) / pitch
+
+
+def _axis_operator(matrix, shape, axis):
+    # Applies a 1D operator along one axis of a C ordered grid.
+    operator = sp.identity(1, format="csr")
+    for i, size in enumerate(shape):
+        factor = matrix if i == axis else sp.identity(size, format="csr")
+        operator = sp.kron(operator, factor, format="csr")
+    return operator
+
+
+def _stretch(size, pml_cells, pitch, omega, offset):
+    # Complex coordinate stretching factors of the cells of one axis, at
+    # positions shifted by offset cells.
+    positions = np.arange(size) + offset
+    depth = np.maximum(pml_cells - positions, positions - (size - 1 - pml_cells))
+    depth = np.clip(depth / pml_cells, 0, 1)
+    sigma_max = -(PML_ORDER + 1) * np.log(PML_REFLECTION) / (
+        2 * ETA_0 * pml_cells * pitch)
+    return 1 - 1j * sigma_max * depth ** PML_ORDER / (omega * EPSILON_0)
+
+
+class FDFD:
+    """
+    Finite difference frequency domain solver on a Yee grid.
+
+    Assembles the curl-curl operator of the electric field,
+    curl(mu^-1 curl E) - k0^2 epsilon E, as a sparse matrix, with the
+    complex permittivity of every cell and stretched coordinate PML on
+    every side. 1D and 2D solve for Ez only, 3D for the three components.
+
+    The factorization of the direct method, or the incomplete LU
+    preconditioner of the iterative one, is computed once per problem and
+    kept in the FACTORIZATIONS cache of the process. The sources of one
+    solve share it, as do later solves of the same problem in the same
+    process, which then only cost the triangular solves. When the
+    incomplete factorization fails, or GMRES stagnates with it, the
+    complete one replaces it and the fallback attribute tells which.
+    """
+
+    def __init__(self, labels, materials, pitch, frequency, dimension=3,
+                 pml_cells=PML_CELLS, method='DIRECT'):
+        """
+        Parameters
+        ----------
+        labels : numpy.ndarray
+            Material ids of the cells, with dimension axes. The outer
+            pml_cells cells of each side are the PML layers.
+        materials : list of dict
+            Properties of each material id, epsilon and mu relative to the
+            vacuum and sigma in S/m.
+        pitch : float
+            Edge length of a cell, in meters.
+        frequency : float
+            Frequency, in Hz.
+        dimension : int
+            1, 2 or 3.
+        pml_cells : int
+            Thickness of the PML layers, in cells.
+        method : str
+            'DIRECT' for a sparse LU factorization, 'ITERATIVE' for GMRES
+            preconditioned by an incomplete LU factorization.
+        """
+        labels = np.asarray(labels)
+        if labels.ndim != dimension:
+            raise ValueError(
+                f"Expected a {dimension}D grid, got {labels.ndim}D")
+        if method not in ('DIRECT', 'ITERATIVE'):
+            raise ValueError(f"Unknown method: {method}")
+
+        self.labels = labels
+        self.materials = list(materials)
+        self.shape = labels.shape
+        self.dimension = dimension
+        self.pitch = float(pitch)
+        self.frequency = float(frequency)
+        self.pml_cells = pml_cells
+        self.method = method
+        self.omega = 2 * np.pi * self.frequency
+        self._operator = None
+        # SPILU_FAILED or GMRES_STAGNATED when the iterative method uses the
+        # complete factorization, None otherwise.
+        self.fallback = None
+        # Identifies the operator, solvers with the same key share their
+        # factorization. The labels are hashed rather than copied into it.
+        self.key = content_key(labels, materials=self.materials,
+                               pitch=self.pitch, frequency=self.frequency,
+                               dimension=dimension, pml_cells=pml_cells,
+                               method=method)
+
+    @property
+    def size(self):
+        """
+        Number of unknowns.
+        """
+        cells = int(np.prod(self.shape))
+        return cells * (3 if self.dimension == 3 else 1)
+
+    @property
+    def operator(self):
+        """
+        The sparse curl-curl operator, assembled on first use.
+        """
+        if self._operator is None:
+            self._operator = self._assemble()
+        return self._operator
+
+    def _assemble(self):
+        k0 = self.omega / C_0
+        epsilon, mu, sigma = material_arrays(self.materials)
+        epsilon = epsilon[self.labels] - 1j * sigma[self.labels] / (
+            self.omega * EPSILON_0)
+        inverse_mu = sp.diags((1 / mu[self.labels]).ravel())
+
+        # Differences with the PML stretching, forward ones from the
+        # electric to the magnetic positions, backward ones back.
+        forward = []
+        backward = []
+        for axis in range(3):
+            if axis >= self.dimension:
+                forward.append(None)
+                backward.append(None)
+                continue
+            size = self.shape[axis]
+            difference = _difference(size, self.pitch)
+            h_stretch = _stretch(size, self.pml_cells, self.pitch,
+                                 self.omega, .5)
+            e_stretch = _stretch(size, self.pml_cells, self.pitch,
+                                 self.omega, 0.)
+            forward.append(_axis_operator(
+                sp.diags(1 / h_stretch) @ difference, self.shape, axis))
+            backward.append(_axis_operator(
+                sp.diags(1 / e_stretch) @ -difference.T, self.shape, axis))
+
+        if self.dimension < 3:
+            # Ez only: curl curl Ez = -sum of d/du (mu^-1 d/du Ez).
+            laplacian = sum(backward[axis] @ inverse_mu @ forward[axis]
+                            for axis in range(self.dimension))
+            operator = -laplacian - k0 ** 2 * sp.diags(epsilon.ravel())
+        else:
+            zero = None
+            dx, dy, dz = forward
+            curl_e = sp.bmat([[zero, -dz, dy],
+                              [dz, zero, -dx],
+                              [-dy, dx, zero]])
+            dx, dy, dz = backward
+            curl_h = sp.bmat([[zero, -dz, dy],
+                              [dz, zero, -dx],
+                              [-dy, dx, zero]])
+            inverse_mu = sp.block_diag([inverse_mu] * 3)
+            operator = curl_h @ inverse_mu @ curl_e - k0 ** 2 * sp.diags(
+                np.tile(epsilon.ravel(), 3))
+        return operator.tocsc()
+
+    def factorization(self):
+        """
+        Returns the factorization of the operator, from the cache when the
+        same problem was already factorized.
+        """
+        key = self.key
+        if key in FACTORIZATIONS:
+            FACTORIZATIONS.move_to_end(key)
+            factorization, self.fallback = FACTORIZATIONS[key]
+            return factorization
+
+        fallback = None
+        if self.method == 'DIRECT':
+            factorization = spla.splu(self.operator)
+        else:
+            try:
+                factorization = spla.spilu(self.operator, drop_tol=1e-4,
+                                           fill_factor=10)
+            except RuntimeError:
+                # The curl-curl operator of 3D problems often has a zero
+                # pivot once small entries are dropped, the complete
+                # factorization is then used as preconditioner.
+                factorization = spla.splu(self.operator)
+                fallback = SPILU_FAILED
+        self._store(factorization, fallback)
+        return factorization
+
+    def _store(self, factorization, fallback):
+        # Caches the factorization of the problem, dropping the least
+        # recently used ones past CACHE_SIZE.
+        self.fallback = fallback
+        FACTORIZATIONS[self.key] = (factorization, fallback)
+        FACTORIZATIONS.move_to_end(self.key)
+        while len(FACTORIZATIONS) > CACHE_SIZE:
+            FACTORIZATIONS.popitem(last=False)
+
+    def point_source(self, index=None, component=2):
+        """
+        Right hand side of a unit current on one cell.
+
+        Parameters
+        ----------
+        index : tuple
+            Cell of the source, by default the first cell after the low x
+            layer, centered on the other axes, as in the FDTD solver. A
+            tuple of index arrays spreads the source over several cells.
+        component : int
+            Direction of the current in 3D, 0, 1 or 2 for x, y or z.
+
+        Returns
+        -------
+        rhs : numpy.ndarray
+            The right hand side, -i omega mu0 J.
+        """
+        if index is None:
+            index = (self.pml_cells + 1,) + tuple(
+                n // 2 for n in self.shape[1:])
+        cells = int(np.prod(self.shape))
+        rhs = np.zeros(self.size, dtype=complex)
+        offset = component * cells if self.dimension == 3 else 0
+        rhs[offset + np.ravel_multi_index(index, self.shape)] = (
+            -1j * self.omega * MU_0)
+        return rhs
+
+    def solve(self, rhs):
+        """
+        Solves for one or several right hand sides.
+
+        Parameters
+        ----------
+        rhs : numpy.ndarray
+            (size,) or (size, k) right hand sides.
+
+        Returns
+        -------
+        fields : numpy.ndarray
+            Complex electric field of the same shape as rhs, components
+            stacked x, y, z in 3D.
+        """
+        rhs = np.asarray(rhs, dtype=complex)
+        factorization = self.factorization()
+        if self.method == 'DIRECT':
+            return factorization.solve(rhs)
+
+        columns = rhs.reshape(self.size, -1)
+        fields = np.empty_like(columns)
+        for i in range(columns.shape[1]):
+            fields[:, i] = self._gmres(columns[:, i])
+        return fields.reshape(rhs.shape)
+
+    def _gmres(self, rhs):
+        # Restart cycles of GMRES as long as each one reduces the residual.
+        # The incomplete factorization can be a poor preconditioner of the
+        # curl-curl operator, mostly in 3D, GMRES then stagnates and the
+        # complete factorization replaces it in the cache.
+        fields = None
+        residual = np.linalg.norm(rhs)
+        for _ in range(MAX_CYCLES):
+            preconditioner = spla.LinearOperator(
+                self.operator.shape, self.factorization().solve,
+                dtype=complex)
+            fields, info = spla.gmres(
+                self.operator, rhs, x0=fields, M=preconditioner,
+                rtol=TOLERANCE, restart=RESTART, maxiter=1)
+            if info == 0:
+                return fields
+            previous = residual
+            residual = np.linalg.norm(rhs - self.operator @ fields)
+            if residual > STAGNATION * previous:
+                if self.fallback is not None:
+                    break
+                self._store(spla.splu(self.operator), GMRES_STAGNATED)
+        raise RuntimeError(
+            f"GMRES did not converge in {MAX_CYCLES} restart cycles")
+
+    def magnitude(self, fields):
+        """
+        Returns the magnitude of the electric field of every cell, one
+        column per right hand side.
+        """
+        fields = fields.reshape(self.size, -1)
+        if self.dimension < 3:
+            return np.abs(fields)
+        cells = int(np.prod(self.shape))
+        return np.sqrt(sum(np.abs(fields[i * cells:(i + 1) * cells]) ** 2
+                           for i in range(3)))
+
+
+def probe_sources(grid, dimension, probes, pml_cells=PML_CELLS,
+                  margin=MARGIN_CELLS):
+    """
+    Returns the cells of the sources placed at probes, one source per probe
+    spread over its cells, see probes.probe_cells.
+
+    Returns
+    -------
+    sources : list of numpy.ndarray
+        (M, dimension) cells of each source, in the indices of the padded
+        domain, empty for the probes outside of it.
+    """
+    padding = pml_cells + margin
+    shape = tuple(n + 2 * padding for n in grid.labels.shape[:dimension])
+    cells, owners = probe_cells(probes, grid.origin, grid.pitch, shape,
+                                padding, dimension)
+    return [cells[owners == i] for i in range(len(probes))]
+
+
+def solve(grid, dimension, frequency, sources=None, method='DIRECT',
+          pml_cells=PML_CELLS, margin=MARGIN_CELLS):
+    """
+    Runs the FDFD solver on a voxel grid for one or several sources, all
+    solved with the same factorization.
+
+    Parameters
+    ----------
+    grid : OccupancyGrid
+        Voxelized scene, its pitch being in meters.
+    dimension : int
+        1, 2 or 3.
+    frequency : float
+        Frequency, in Hz.
+    sources : list
+        Cell of each source, a tuple, or its (M, dimension) cells, in the
+        indices of the padded domain, see probe_sources. By default a
+        single source as in the FDTD solver.
+    method : str
+        'DIRECT' or 'ITERATIVE', see FDFD.
+    pml_cells : int
+        Thickness of the PML layers, in cells.
+    margin : int
+        Background cells between the grid and the layers.
+
+    Returns
+    -------
+    points : numpy.ndarray
+        (N, dimension) positions of the cell centers.
+    magnitude : numpy.ndarray
+        (N, k) electric field magnitude of each cell, for each source.
+    stats : dict
+        'sources', their number, and 'fallback', see FDFD.fallback.
+    """
+    padding = pml_cells + margin
+    labels = domain_labels(grid.labels, dimension, padding)
+    solver = FDFD(labels, grid.materials, grid.pitch, frequency, dimension,
+                  pml_cells=pml_cells, method=method)
+    if sources is None:
+        sources = [None]
+    rhs = np.stack([solver.point_source(
+        None if cells is None else tuple(np.asarray(cells).T))
+        for cells in sources], axis=1)
+    magnitude = solver.magnitude(solver.solve(rhs))
+    stats = {'sources': len(sources), 'fallback': solver.fallback}
+
+    indices = np.indices(labels.shape).reshape(dimension, -1).T
+    points = grid.origin[:dimension] + (indices - padding) * grid.pitch
+    return points, magnitude, stats
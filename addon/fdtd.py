@@ -0,0 +1,800 @@
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from .cache import content_key
+from .probes import DECIMATION, probe_cells
+from .shared import SharedArrays, attach
+from .voxel_grid import BACKGROUND_MATERIAL
+
+# Vacuum constants, in SI units.
+EPSILON_0 = 8.8541878128e-12
+MU_0 = 1.25663706212e-6
+C_0 = 1 / np.sqrt(EPSILON_0 * MU_0)
+ETA_0 = np.sqrt(MU_0 / EPSILON_0)
+
+# Thickness of the CPML layers and of the empty margin between the layers
+# and the voxelized objects, in cells.
+PML_CELLS = 10
+MARGIN_CELLS = 5
+
+# Grading of the CPML profiles.
+PML_ORDER = 3
+PML_KAPPA_MAX = 5.
+PML_ALPHA_MAX = .05
+
+# Fraction of the Courant limit used for the time step.
+COURANT = .99
+
+# Largest fraction of the run time spent writing checkpoints, and the write
+# throughput assumed before the first checkpoint is timed, in bytes/s.
+CHECKPOINT_OVERHEAD = .02
+CHECKPOINT_THROUGHPUT = 200e6
+
+# Actions of the workers after each step, decided by the first slab.
+RUN = 0
+SAVE = 1
+STOP = 2
+
+# Field components of each dimension and the curl terms updating them, as
+# (field, source field, axis of the derivative, sign).
+COMPONENTS = {
+    1: (('Ez',), ('Hy',)),
+    2: (('Ez',), ('Hx', 'Hy')),
+    3: (('Ex', 'Ey', 'Ez'), ('Hx', 'Hy', 'Hz')),
+}
+H_TERMS = {
+    1: (('Hy', 'Ez', 0, 1),),
+    2: (('Hx', 'Ez', 1, -1), ('Hy', 'Ez', 0, 1)),
+    3: (('Hx', 'Ez', 1, -1), ('Hx', 'Ey', 2, 1),
+        ('Hy', 'Ex', 2, -1), ('Hy', 'Ez', 0, 1),
+        ('Hz', 'Ey', 0, -1), ('Hz', 'Ex', 1, 1)),
+}
+E_TERMS = {
+    1: (('Ez', 'Hy', 0, 1),),
+    2: (('Ez', 'Hy', 0, 1), ('Ez', 'Hx', 1, -1)),
+    3: (('Ex', 'Hz', 1, 1), ('Ex', 'Hy', 2, -1),
+        ('Ey', 'Hx', 2, 1), ('Ey', 'Hz', 0, -1),
+        ('Ez', 'Hy', 0, 1), ('Ez', 'Hx', 1, -1)),
+}
+
+
+def material_arrays(materials, dtype=np.float64):
+    """
+    Reads the relative permittivity, relative permeability and conductivity
+    of every entry of a materials table.
+
+    Missing or non numeric properties fall back to the background.
+
+    Returns
+    -------
+    epsilon, mu, sigma : numpy.ndarray
+        Properties indexed by material id.
+    """
+    arrays = []
+    for name in ("epsilon", "mu", "sigma"):
+        values = []
+        for material in materials:
+            try:
+                values.append(float(material.get(name, BACKGROUND_MATERIAL[name])))
+            except (TypeError, ValueError):
+                values.append(BACKGROUND_MATERIAL[name])
+        arrays.append(np.array(values, dtype=dtype))
+    return arrays
+
+
+def domain_labels(labels, dimension, padding):
+    """
+    Cuts the material ids of the simulated domain out of a 3D grid and pads
+    them with background cells.
+
+    The 1D domain is the line along x through the center of the grid, the
+    2D domain the xy plane through its center.
+
+    Returns
+    -------
+    labels : numpy.ndarray
+        Material ids of the domain, with dimension axes.
+    """
+    center = [n // 2 for n in labels.shape]
+    if dimension == 1:
+        labels = labels[:, center[1], center[2]]
+    elif dimension == 2:
+        labels = labels[:, :, center[2]]
+    return np.pad(labels, padding)
+
+
+def _grading(depth):
+    # Polynomial grading of the CPML profiles at depths in [0, 1] into the
+    # layer, as fractions of their maximum.
+    return depth ** PML_ORDER
+
+
+def _zeros(shape, dtype):
+    return np.zeros(shape, dtype=dtype)
+
+
+class FDTD:
+    """
+    Finite difference time domain solver on a Yee grid.
+
+    Fields are stored on arrays of the size of the grid, the magnetic
+    components half a cell ahead of the electric ones along their
+    derivative axes. Each step updates the magnetic then the electric
+    field with whole array NumPy operations, using per cell coefficients
+    derived from the material of each cell.
+
+    The domain is closed by convolutional PML layers. Their auxiliary psi
+    fields only exist in the slabs of the layers, so the memory and the
+    work they need do not grow with the interior of the domain.
+
+    1D runs Ez/Hy along x, 2D runs the TMz mode (Ez, Hx, Hy) and 3D runs
+    the six components.
+
+    With several workers, the arrays live in shared memory and the domain
+    is split into slabs along x, one per worker process. A worker only
+    reads the plane of its neighbours next to its slab, and the workers
+    meet at a barrier after each half step. Every cell goes through the
+    same operations as with a single process, so the results are
+    identical bit for bit.
+    """
+
+    def __init__(self, labels, materials, pitch, frequency, dimension=3,
+                 pml_cells=PML_CELLS, source=None, dtype=np.float64,
+                 workers=1):
+        """
+        Parameters
+        ----------
+        labels : numpy.ndarray
+            Material ids of the cells, with dimension axes. The outer
+            pml_cells cells of each side are the CPML layers.
+        materials : list of dict
+            Properties of each material id, epsilon and mu relative to the
+            vacuum and sigma in S/m.
+        pitch : float
+            Edge length of a cell, in meters.
+        frequency : float
+            Frequency of the source, in Hz.
+        dimension : int
+            1, 2 or 3.
+        pml_cells : int
+            Thickness of the CPML layers, in cells.
+        source : tuple
+            Index of the soft Ez source, by default the first cell after
+            the low x layer, centered on the other axes.
+        dtype : numpy.dtype
+            Type of the fields.
+        workers : int
+            Number of worker processes, each updating a slab along x.
+        """
+        labels = np.asarray(labels)
+        if labels.ndim != dimension:
+            raise ValueError(
+                f"Expected a {dimension}D grid, got {labels.ndim}D")
+        if min(labels.shape) <= 2 * pml_cells:
+            raise ValueError("Grid too small for the PML layers")
+
+        self.shape = labels.shape
+        self.dimension = dimension
+        self.pitch = float(pitch)
+        self.frequency = float(frequency)
+        self.pml_cells = pml_cells
+        self.dtype = dtype
+        self.dt = COURANT * self.pitch / (C_0 * np.sqrt(dimension))
+        self.steps = 0
+        # Identifies the problem, a checkpoint only restores a solver with
+        # the same key.
+        self.key = content_key(labels, materials=materials, pitch=self.pitch,
+                               frequency=self.frequency, dimension=dimension,
+                               pml_cells=pml_cells, source=source,
+                               dtype=np.dtype(dtype).str)
+        self.workers = max(min(int(workers), self.shape[0]), 1)
+        self.shared = SharedArrays() if self.workers > 1 else None
+        allocate = self.shared or _zeros
+
+        if source is None:
+            source = (pml_cells + 1,) + tuple(n // 2 for n in self.shape[1:])
+        self.source = tuple(source)
+
+        # Update coefficients of every cell, from its material.
+        epsilon, mu, sigma = material_arrays(materials, dtype)
+        epsilon = EPSILON_0 * epsilon[labels]
+        loss = sigma[labels] * self.dt / (2 * epsilon)
+        self.ca = allocate(self.shape, dtype)
+        self.ca[...] = (1 - loss) / (1 + loss)
+        self.cb = allocate(self.shape, dtype)
+        self.cb[...] = self.dt / (epsilon * self.pitch) / (1 + loss)
+        self.db = allocate(self.shape, dtype)
+        self.db[...] = self.dt / (MU_0 * mu[labels] * self.pitch)
+
+        e_names, h_names = COMPONENTS[dimension]
+        self.fields = {name: allocate(self.shape, dtype)
+                       for name in e_names + h_names}
+        self.amplitude = allocate(self.shape, dtype)
+        # Electric field of the probe cells, recorded every decimation
+        # steps once set_probes is called.
+        self.probe_cells = None
+        self.probe_values = None
+        self.decimation = 1
+        # Action decided by the first slab after each step, then the number
+        # of checkpoints written and the time spent writing them.
+        self._control = allocate((3,), np.float64)
+
+        self._pml = {}
+        for field, source_field, axis, _ in H_TERMS[dimension]:
+            self._pml[field, axis] = self._layers(axis, .5, allocate)
+        for field, source_field, axis, _ in E_TERMS[dimension]:
+            self._pml[field, axis] = self._layers(axis, 0., allocate)
+        self._buffers()
+
+    def _buffers(self):
+        # Work arrays, private to each process.
+        self._derivative = np.zeros(self.shape, dtype=self.dtype)
+        self._term = np.zeros(self.shape, dtype=self.dtype)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_derivative"], state["_term"]
+        if self.shared is not None:
+            state = self.shared.handle(state)
+            state["shared"] = None
+        return state
+
+    def __setstate__(self, state):
+        self._blocks = []
+        self.__dict__.update(attach(state, self._blocks))
+        self._buffers()
+
+    def close(self):
+        """
+        Frees the shared memory of the arrays.
+        """
+        if self.shared is not None:
+            self.shared.close()
+
+    def _state(self):
+        # Arrays changed by the time steps, by checkpoint member name.
+        state = {f"field_{name}": array
+                 for name, array in self.fields.items()}
+        state["amplitude"] = self.amplitude
+        if self.probe_values is not None:
+            state["probes"] = self.probe_values
+        for (field, axis), layers in self._pml.items():
+            for i, layer in enumerate(layers):
+                state[f"psi_{field}_{axis}_{i}"] = layer[-1]
+        return state
+
+    def save(self, path, end, metadata=None):
+        """
+        Writes the state of the fields to a checkpoint file.
+
+        The file is written next to path then renamed over it, so path
+        always holds a complete checkpoint, even if the process is killed
+        while writing.
+
+        Parameters
+        ----------
+        path : str
+            Path of the npz checkpoint.
+        end : int
+            Step the run stops at.
+        metadata : dict
+            JSON serializable description of the run, stored with the
+            state.
+        """
+        header = dict(metadata or {}, key=self.key, steps=self.steps, end=end)
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as f:
+            np.savez(f, header=np.array(json.dumps(header)), **self._state())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+
+    def restore(self, path):
+        """
+        Reads the state of the fields from a checkpoint written by save.
+
+        Returns
+        -------
+        header : dict
+            The metadata of the checkpoint, with the step it was written at
+            as 'steps' and the step the run stops at as 'end'.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(str(data["header"]))
+            if header["key"] != self.key:
+                raise ValueError(
+                    f"The checkpoint {path} belongs to another problem")
+            for name, array in self._state().items():
+                if name not in data.files or data[name].shape != array.shape:
+                    raise ValueError(
+                        f"The checkpoint {path} does not match the probes")
+                array[...] = data[name]
+        self.steps = header["steps"]
+        return header
+
+    def set_probes(self, cells, decimation, end):
+        """
+        Records the electric field of some cells every decimation steps,
+        instead of only keeping the peak magnitude of the whole domain.
+
+        Parameters
+        ----------
+        cells : numpy.ndarray
+            (M, dimension) indices of the cells.
+        decimation : int
+            Number of steps between two records.
+        end : int
+            Step the run stops at, which sizes the records.
+        """
+        allocate = self.shared or _zeros
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, self.dimension)
+        self.probe_cells = tuple(cells.T)
+        self.decimation = max(int(decimation), 1)
+        components = len(COMPONENTS[self.dimension][0])
+        self.probe_values = allocate(
+            (end // self.decimation, len(cells), components), self.dtype)
+
+    def probe_times(self):
+        """
+        Returns the time of each record of the probes, in seconds.
+        """
+        records = np.arange(1, len(self.probe_values) + 1)
+        return records * self.decimation * self.dt
+
+    def _record(self):
+        # Electric field of the probe cells, once every slab is done with
+        # the step. The other slabs only update the magnetic field until
+        # the first slab meets them again.
+        if self.probe_values is None or self.steps % self.decimation:
+            return
+        row = self.steps // self.decimation - 1
+        if row >= len(self.probe_values):
+            return
+        for i, name in enumerate(COMPONENTS[self.dimension][0]):
+            self.probe_values[row, :, i] = self.fields[name][self.probe_cells]
+
+    def _layers(self, axis, offset, allocate):
+        # Slabs, coefficients and psi fields of the two layers of an axis,
+        # for field positions shifted by offset cells.
+        n = self.pml_cells
+        size = self.shape[axis]
+        layers = []
+        for indices, depth in (
+                (np.arange(n), lambda p: (n - p) / n),
+                (np.arange(size - n, size), lambda p: (p - (size - 1 - n)) / n)):
+            depth = np.clip(depth(indices + offset), 0, 1)
+            sigma = _grading(depth) * .8 * (PML_ORDER + 1) / (
+                ETA_0 * self.pitch)
+            kappa = 1 + (PML_KAPPA_MAX - 1) * _grading(depth)
+            alpha = PML_ALPHA_MAX * (1 - depth)
+            b = np.exp(-(sigma / kappa + alpha) * self.dt / EPSILON_0)
+            denominator = sigma * kappa + kappa ** 2 * alpha
+            c = np.divide(sigma * (b - 1), denominator,
+                          out=np.zeros_like(sigma), where=denominator > 0)
+
+            view = [1] * self.dimension
+            view[axis] = n
+            psi_shape = list(self.shape)
+            psi_shape[axis] = n
+            layers.append((axis, int(indices[0]),
+                           b.reshape(view).astype(self.dtype),
+                           c.reshape(view).astype(self.dtype),
+                           (1 / kappa - 1).reshape(view).astype(self.dtype),
+                           allocate(tuple(psi_shape), self.dtype)))
+        return layers
+
+    def _difference(self, field, axis, forward, lo, hi):
+        # Difference of a field along an axis over the rows lo:hi, into the
+        # derivative buffer. Forward differences give the curl at the
+        # magnetic positions, backward ones at the electric positions.
+        # Cells past the edge of the domain count as zero. Along x, the
+        # difference reads one row past the slab.
+        out = self._derivative[:hi - lo]
+        size = self.shape[axis]
+        if axis == 0:
+            if forward:
+                last = min(hi, size - 1)
+                np.subtract(field[lo + 1:last + 1], field[lo:last],
+                            out=out[:last - lo])
+                if hi == size:
+                    np.negative(field[size - 1:], out=out[-1:])
+            else:
+                first = max(lo, 1)
+                np.subtract(field[first:hi], field[first - 1:hi - 1],
+                            out=out[first - lo:])
+                if lo == 0:
+                    out[:1] = field[:1]
+            return out
+
+        field = field[lo:hi]
+        head = [slice(None)] * self.dimension
+        tail = [slice(None)] * self.dimension
+        edge = [slice(None)] * self.dimension
+        head[axis] = slice(1, None)
+        tail[axis] = slice(None, -1)
+        head, tail = tuple(head), tuple(tail)
+        if forward:
+            np.subtract(field[head], field[tail], out=out[tail])
+            edge[axis] = slice(-1, None)
+            np.negative(field[tuple(edge)], out=out[tuple(edge)])
+        else:
+            np.subtract(field[head], field[tail], out=out[head])
+            edge[axis] = slice(0, 1)
+            out[tuple(edge)] = field[tuple(edge)]
+        return out
+
+    def _apply(self, terms, coefficient, forward, lo, hi):
+        coefficient = coefficient[lo:hi]
+        for field, source, axis, sign in terms:
+            target = self.fields[field][lo:hi]
+            derivative = self._difference(
+                self.fields[source], axis, forward, lo, hi)
+            term = np.multiply(coefficient, derivative,
+                               out=self._term[:hi - lo])
+            if sign > 0:
+                target += term
+            else:
+                target -= term
+
+            # CPML correction of the derivative in the layers, restricted
+            # to the rows of the slab.
+            for layer_axis, start, b, c, kappa, psi in self._pml[field, axis]:
+                if layer_axis == 0:
+                    first, last = max(lo, start), min(hi, start + len(psi))
+                    if first >= last:
+                        continue
+                    rows = slice(first - start, last - start)
+                    b, c, kappa = b[rows], c[rows], kappa[rows]
+                    psi = psi[rows]
+                    slab = (slice(first - lo, last - lo),)
+                else:
+                    psi = psi[lo:hi]
+                    slab = [slice(None)] * self.dimension
+                    slab[layer_axis] = slice(start, start + psi.shape[layer_axis])
+                    slab = tuple(slab)
+                local = derivative[slab]
+                psi *= b
+                psi += c * local
+                correction = psi + kappa * local
+                correction *= coefficient[slab]
+                if sign > 0:
+                    target[slab] += correction
+                else:
+                    target[slab] -= correction
+
+    def _update_h(self, lo, hi):
+        self._apply(H_TERMS[self.dimension], self.db, True, lo, hi)
+
+    def _update_e(self, lo, hi):
+        for name in COMPONENTS[self.dimension][0]:
+            self.fields[name][lo:hi] *= self.ca[lo:hi]
+        self._apply(E_TERMS[self.dimension], self.cb, False, lo, hi)
+
+        # Soft source, ramped up over a few periods to limit the transient.
+        if lo <= self.source[0] < hi:
+            t = self.steps * self.dt
+            ramp = 1 - np.exp(-(t * self.frequency / 2) ** 2)
+            self.fields['Ez'][self.source] += ramp * np.sin(
+                2 * np.pi * self.frequency * t)
+
+    def step(self):
+        """
+        Advances the fields by one time step, in the calling process.
+        """
+        self._update_h(0, self.shape[0])
+        self._update_e(0, self.shape[0])
+        self.steps += 1
+
+    def electric_magnitude(self, lo=0, hi=None):
+        """
+        Returns the magnitude of the electric field of every cell, of the
+        rows lo:hi.
+        """
+        names = COMPONENTS[self.dimension][0]
+        if len(names) == 1:
+            return np.abs(self.fields[names[0]][lo:hi])
+        return np.sqrt(sum(self.fields[name][lo:hi] ** 2 for name in names))
+
+    def _run_slab(self, end, period, lo, hi, barrier=None, checkpoint=None):
+        # Time loop over the rows lo:hi up to step end, meeting the other
+        # slabs at the barrier after each half step. After each step, the
+        # first slab tells the others whether to write a checkpoint, which
+        # it does alone while they wait, or to stop.
+        control = self._control
+        while self.steps < end:
+            self._update_h(lo, hi)
+            if barrier is not None:
+                barrier.wait()
+            self._update_e(lo, hi)
+            self.steps += 1
+            if self.steps > end - period:
+                np.maximum(self.amplitude[lo:hi],
+                           self.electric_magnitude(lo, hi),
+                           out=self.amplitude[lo:hi])
+            if lo == 0:
+                control[0] = self._action(barrier, checkpoint)
+            if barrier is not None:
+                barrier.wait()
+            if lo == 0:
+                self._record()
+
+            if control[0] == STOP:
+                return
+            if control[0] == SAVE and self.steps < end:
+                if lo == 0:
+                    checkpoint.write(self, end)
+                    control[1] += 1
+                    control[2] += checkpoint.cost
+                if barrier is not None:
+                    barrier.wait()
+
+    def _action(self, barrier, checkpoint):
+        # Workers stop when the process that started them is gone, such as
+        # a cancelled task, instead of running on unattended.
+        if barrier is not None:
+            parent = multiprocessing.parent_process()
+            if parent is not None and not parent.is_alive():
+                return STOP
+        if checkpoint is not None and checkpoint.due(self):
+            return SAVE
+        return RUN
+
+    def slabs(self):
+        """
+        Returns the (lo, hi) rows along x updated by each worker.
+        """
+        bounds = np.linspace(0, self.shape[0], self.workers + 1).astype(int)
+        return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    def run(self, steps, checkpoint=None):
+        """
+        Runs time steps and records the peak electric field magnitude of
+        every cell over the last period of the source.
+
+        Parameters
+        ----------
+        steps : int
+            Number of time steps.
+        checkpoint : Checkpoint
+            Writes the state of the fields periodically, so the run can be
+            resumed with restore.
+
+        Returns
+        -------
+        amplitude : numpy.ndarray
+            Peak magnitude of the electric field of every cell.
+        stats : dict
+            Number of steps and cells, workers, run time and throughput in
+            cell updates per second, checkpoints written and time spent
+            writing them.
+        """
+        period = int(np.ceil(1 / (self.frequency * self.dt)))
+        end = self.steps + steps
+        self._control[...] = 0
+        start = time.perf_counter()
+        if self.workers == 1:
+            self._run_slab(end, period, 0, self.shape[0],
+                           checkpoint=checkpoint)
+        else:
+            self._run_workers(end, period, checkpoint)
+        seconds = time.perf_counter() - start
+
+        cells = int(np.prod(self.shape))
+        stats = {
+            "steps": steps,
+            "cells": cells,
+            "workers": self.workers,
+            "seconds": seconds,
+            "cell_updates_per_second": cells * steps / max(seconds, 1e-12),
+            "dt": self.dt,
+            "cells_per_wavelength": C_0 / (self.frequency * self.pitch),
+            "checkpoints": int(self._control[1]),
+            "checkpoint_seconds": float(self._control[2]),
+        }
+        return self.amplitude.copy(), stats
+
+    def _run_workers(self, end, period, checkpoint=None):
+        # Blender cannot be forked safely, workers start a fresh interpreter.
+        context = multiprocessing.get_context("spawn")
+        barrier = context.Barrier(self.workers)
+        processes = [context.Process(target=_run_slab,
+                                     args=(self, end, period, lo, hi, barrier,
+                                           checkpoint))
+                     for lo, hi in self.slabs()]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        if any(process.exitcode != 0 for process in processes):
+            raise RuntimeError("An FDTD worker failed")
+        self.steps = end
+
+
+def _run_slab(solver, end, period, lo, hi, barrier, checkpoint):
+    try:
+        solver._run_slab(end, period, lo, hi, barrier, checkpoint)
+    except BaseException:
+        # Releases the other workers waiting at the barrier.
+        barrier.abort()
+        raise
+    finally:
+        for block in solver._blocks:
+            block.close()
+
+
+class Checkpoint:
+    """
+    Periodic checkpoints of an FDTD run to one file.
+
+    The interval adapts to the time a checkpoint takes to write: a new one
+    is due once the time since the last one is long enough for writing to
+    stay under overhead of the run time. The write time of the first one
+    is estimated from the size of the state.
+    """
+
+    def __init__(self, path, metadata=None, overhead=CHECKPOINT_OVERHEAD):
+        """
+        Parameters
+        ----------
+        path : str
+            Path of the npz checkpoint, replaced by each new checkpoint.
+        metadata : dict
+            JSON serializable description of the run, stored with the
+            state, such as what is needed to resume it.
+        overhead : float
+            Largest fraction of the run time spent writing checkpoints.
+        """
+        self.path = path
+        self.metadata = dict(metadata or {})
+        self.overhead = overhead
+        self.cost = None
+        self._last = None
+
+    def due(self, solver):
+        """
+        Tells whether a checkpoint of the solver should be written now.
+        """
+        now = time.perf_counter()
+        if self._last is None:
+            self._last = now
+            size = sum(array.nbytes for array in solver._state().values())
+            self.cost = size / CHECKPOINT_THROUGHPUT
+            return False
+        return (now - self._last) * self.overhead >= self.cost
+
+    def write(self, solver, end):
+        """
+        Writes a checkpoint of the solver and times it.
+        """
+        start = time.perf_counter()
+        solver.save(self.path, end, self.metadata)
+        self._last = time.perf_counter()
+        self.cost = self._last - start
+
+
+def read_checkpoint(path):
+    """
+    Returns the metadata of a checkpoint file, with the step it was written
+    at as 'steps' and the step the run stops at as 'end'.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        return json.loads(str(data["header"]))
+
+
+def solve(grid, dimension, frequency, steps, pml_cells=PML_CELLS,
+          margin=MARGIN_CELLS, workers=1, checkpoint=None, resume=False):
+    """
+    Runs the FDTD solver on a voxel grid.
+
+    Parameters
+    ----------
+    grid : OccupancyGrid
+        Voxelized scene, its pitch being in meters.
+    dimension : int
+        1, 2 or 3.
+    frequency : float
+        Frequency of the source, in Hz.
+    steps : int
+        Number of time steps.
+    pml_cells : int
+        Thickness of the CPML layers, in cells.
+    margin : int
+        Background cells between the grid and the layers.
+    workers : int
+        Number of worker processes.
+    checkpoint : Checkpoint
+        Writes the state of the run periodically.
+    resume : bool
+        Continues from the file of the checkpoint when it exists, the
+        steps already done counting towards steps.
+
+    Returns
+    -------
+    points : numpy.ndarray
+        (N, dimension) positions of the cell centers.
+    amplitude : numpy.ndarray
+        (N,) peak electric field magnitude of each cell.
+    stats : dict
+        Run statistics, see FDTD.run.
+    """
+    padding = pml_cells + margin
+    labels = domain_labels(grid.labels, dimension, padding)
+    solver = FDTD(labels, grid.materials, grid.pitch, frequency, dimension,
+                  pml_cells=pml_cells, workers=workers)
+    try:
+        amplitude, stats = _advance(solver, steps, checkpoint, resume)
+    finally:
+        solver.close()
+
+    indices = np.indices(labels.shape).reshape(dimension, -1).T
+    points = grid.origin[:dimension] + (indices - padding) * grid.pitch
+    return points, amplitude.reshape(-1), stats
+
+
+def _advance(solver, steps, checkpoint, resume):
+    # Runs the solver up to step steps, from its checkpoint when resuming.
+    if resume and checkpoint is not None and os.path.isfile(checkpoint.path):
+        solver.restore(checkpoint.path)
+    return solver.run(steps - solver.steps, checkpoint)
+
+
+def record(grid, dimension, frequency, steps, probes, decimation=DECIMATION,
+           pml_cells=PML_CELLS, margin=MARGIN_CELLS, workers=1,
+           checkpoint=None, resume=False):
+    """
+    Runs the FDTD solver on a voxel grid and records the electric field at
+    probes only, so the output grows with the probes and the number of
+    records, not with the grid.
+
+    Parameters
+    ----------
+    grid : OccupancyGrid
+        Voxelized scene, its pitch being in meters.
+    dimension : int
+        1, 2 or 3.
+    frequency : float
+        Frequency of the source, in Hz.
+    steps : int
+        Number of time steps.
+    probes : list of dict
+        'name', 'kind' and 'points', (N, 3) world positions, of each probe,
+        see probes.probe_cells.
+    decimation : int
+        Number of steps between two records.
+    pml_cells, margin, workers, checkpoint, resume
+        As in solve.
+
+    Returns
+    -------
+    points : numpy.ndarray
+        (M, dimension) positions of the sampled cells.
+    owners : numpy.ndarray
+        (M,) index in probes of the probe of each cell.
+    times : numpy.ndarray
+        (R,) time of each record, in seconds.
+    values : numpy.ndarray
+        (R, M, C) electric field components of each cell at each record,
+        Ez in 1D and 2D, Ex, Ey and Ez in 3D.
+    stats : dict
+        Run statistics, see FDTD.run.
+    """
+    padding = pml_cells + margin
+    labels = domain_labels(grid.labels, dimension, padding)
+    cells, owners = probe_cells(probes, grid.origin, grid.pitch, labels.shape,
+                                padding, dimension)
+    solver = FDTD(labels, grid.materials, grid.pitch, frequency, dimension,
+                  pml_cells=pml_cells, workers=workers)
+    try:
+        solver.set_probes(cells, decimation, steps)
+        _, stats = _advance(solver, steps, checkpoint, resume)
+        times = solver.probe_times()
+        values = solver.probe_values.copy()
+    finally:
+        solver.close()
+
+    points = grid.origin[:dimension] + (cells - padding) * grid.pitch
+    return points, owners, times, values, stats
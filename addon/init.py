@@ -13,7 +13,8 @@ from bpy.props import (
 from . converters import OBJECT_OT_stl_to_obj
 from . scene_opt import CreateCubeSceneOperator, FilteredObjectItem, OBJECT_PT_scene_section, OBJECT_UL_List, UpdateListOperator, update_filtered_objects
 from . settings_opt import GlobalSettings, OBJECT_PT_parameters_section
-from . simulation_opt import OBJECT_PT_simulation_section, SIMULATION_OT_execute_simulation, SIMULATION_OT_open_filebrowser
+from . task_opt import TASK_OT_cancel
+from . simulation_opt import OBJECT_PT_simulation_section, SIMULATION_OT_clear_cache, SIMULATION_OT_execute_simulation, SIMULATION_OT_open_filebrowser, SIMULATION_OT_resume_simulation, SIMULATION_OT_start_worker, SIMULATION_OT_submit_job, refresh_simulation_state
 from . visualization_opt import OBJECT_PT_visualization_section, VISUALIZATION_OT_generate_visu, VISUALIZATION_OT_open_filebrowser
 
 
@@ -31,8 +32,13 @@ classes = (
     GlobalSettings,
     SIMULATION_OT_open_filebrowser,
     SIMULATION_OT_execute_simulation,
+    SIMULATION_OT_resume_simulation,
+    SIMULATION_OT_clear_cache,
+    SIMULATION_OT_submit_job,
+    SIMULATION_OT_start_worker,
     VISUALIZATION_OT_open_filebrowser,
-    VISUALIZATION_OT_generate_visu
+    VISUALIZATION_OT_generate_visu,
+    TASK_OT_cancel
 )
 
 # Function to register all the classes and properties to Blender.
@@ -44,6 +50,9 @@ def register_init():
     for cls in classes:
         bpy.utils.register_class(cls)
 
+    # The Simulation panel draws the job queue state this timer reads.
+    bpy.app.timers.register(refresh_simulation_state, persistent=True)
+
     # Here it registers properties to the 'Scene' type in Blender. These properties will be available in every scene.
         # CollectionProperty is used to create a list of custom items
         # (FilteredObjectItem).
@@ -65,7 +74,7 @@ def register_init():
     # clicked in the UI.
     bpy.types.Scene.obj_file_path = StringProperty(
         name="Obj File Path",
-        description="The path of the selected .obj file for simulation",
+        description="The path of the selected .obj or voxel grid file for simulation",
         default="",
         subtype='FILE_PATH'
     )
@@ -96,6 +105,8 @@ def register_init():
             ('SCATTERPLOT', 'Scatterplot', 'Scatterplot visualization'),
             ('SURFACECHART', 'Surfacechart', 'Surfacechart visualization'),
             ('BUBBLEPLOT', 'Bubbleplot', 'Bubbleplot visualization'),
+            ('VOXELS', 'Voxels', 'Voxel grid visualization'),
+            ('ALL', 'All', 'Heatmap, scatterplot, surfacechart and bubbleplot, rendered together'),
         ]
     )
 
@@ -108,6 +119,9 @@ def unregister_init():
     for cls in classes:
         bpy.utils.unregister_class(cls)
 
+    if bpy.app.timers.is_registered(refresh_simulation_state):
+        bpy.app.timers.unregister(refresh_simulation_state)
+
     # It deletes the custom properties from the 'Scene' type.
     del bpy.types.Scene.FilteredObjects
     del bpy.types.Scene.active_object_index
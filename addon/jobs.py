@@ -0,0 +1,426 @@
+"""
+Local queue of simulation jobs, run by a worker daemon outside Blender.
+
+Usage::
+
+    python -m addon.jobs worker export/simulations/jobs.sqlite -j 4
+    python -m addon.jobs status export/simulations/jobs.sqlite
+
+Jobs are stored in an SQLite file, so the Simulation panel, any number of
+workers and the command line share the same queue. A worker runs up to -j
+jobs at once, highest priority first, and puts failed jobs back in the
+queue until they run out of attempts, waiting longer after each failure.
+Jobs of a worker that died are queued again by the next worker.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import sqlite3
+import sys
+import time
+
+from .simulations import resume_simulation, simulate, simulate_sweep
+from .tasks import WorkerPool
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Functions a job can run, by the name stored in the queue.
+FUNCTIONS = {
+    "simulate": simulate,
+    "simulate_sweep": simulate_sweep,
+    "resume_simulation": resume_simulation,
+}
+
+# Attempts of a job before it is marked as failed, and the delay before the
+# first retry, in seconds, doubled after each failure.
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 30.
+
+# Seconds between two looks at the queue by an idle worker.
+POLL_INTERVAL = 1.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    label TEXT NOT NULL,
+    function TEXT NOT NULL,
+    arguments TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    not_before REAL NOT NULL DEFAULT 0,
+    worker INTEGER,
+    result TEXT,
+    error TEXT,
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, id);
+"""
+
+
+class JobQueue:
+    """
+    Simulation jobs stored in an SQLite file.
+
+    Every method runs in its own transaction, so several processes can use
+    the same queue. The database is in WAL mode, readers such as the
+    Simulation panel are not blocked by a worker updating a job.
+    """
+
+    def __init__(self, path, timeout=10.):
+        """
+        Parameters
+        ----------
+        path : str
+            Path of the SQLite file, created if needed.
+        timeout : float
+            Seconds to wait for a lock held by another process.
+        """
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=timeout,
+                                           isolation_level=None)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _transaction(self):
+        # Takes the write lock at once, so two workers never claim the same
+        # job.
+        self._connection.execute("BEGIN IMMEDIATE")
+        return self._connection
+
+    def submit(self, function, arguments, label=None, priority=0,
+               max_attempts=MAX_ATTEMPTS):
+        """
+        Adds a job to the queue.
+
+        Parameters
+        ----------
+        function : str
+            Name of the function to run, a key of FUNCTIONS.
+        arguments : dict
+            JSON serializable keyword arguments of the function.
+        label : str
+            Name of the job in the status, by default the function name.
+        priority : int
+            Jobs of higher priority run first, then the oldest ones.
+        max_attempts : int
+            Number of runs before a failing job is marked as failed.
+
+        Returns
+        -------
+        job_id : int
+            Identifier of the job.
+        """
+        if function not in FUNCTIONS:
+            raise ValueError(f"Unknown job function: {function}")
+        cursor = self._connection.execute(
+            "INSERT INTO jobs (label, function, arguments, priority, status,"
+            " max_attempts, submitted) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (label or function, function, json.dumps(arguments), priority,
+             QUEUED, max(int(max_attempts), 1), time.time()))
+        return cursor.lastrowid
+
+    def claim(self, worker):
+        """
+        Marks the next job to run as running by the worker and returns it,
+        or None if no job is ready.
+        """
+        connection = self._transaction()
+        try:
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE status = ? AND not_before <= ?"
+                " ORDER BY priority DESC, id LIMIT 1",
+                (QUEUED, time.time())).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1,"
+                    " worker = ?, started = ?, error = NULL WHERE id = ?",
+                    (RUNNING, worker, time.time(), row["id"]))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return self.job(row["id"])
+
+    def complete(self, job_id, result):
+        """
+        Marks a job as done with its JSON serializable result.
+        """
+        self._connection.execute(
+            "UPDATE jobs SET status = ?, result = ?, finished = ? WHERE id = ?",
+            (DONE, json.dumps(result), time.time(), job_id))
+
+    def fail(self, job_id, error):
+        """
+        Puts a failed job back in the queue, after a delay growing with its
+        attempts, or marks it as failed once it has none left.
+        """
+        connection = self._transaction()
+        try:
+            row = connection.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ?",
+                (job_id,)).fetchone()
+            if row["attempts"] < row["max_attempts"]:
+                delay = RETRY_DELAY * 2 ** (row["attempts"] - 1)
+                connection.execute(
+                    "UPDATE jobs SET status = ?, error = ?, worker = NULL,"
+                    " not_before = ? WHERE id = ?",
+                    (QUEUED, error, time.time() + delay, job_id))
+            else:
+                connection.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished = ?"
+                    " WHERE id = ?", (FAILED, error, time.time(), job_id))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def release(self, job_id):
+        """
+        Puts a running job back in the queue without counting its attempt,
+        when its worker stops before it ends.
+        """
+        self._connection.execute(
+            "UPDATE jobs SET status = ?, attempts = attempts - 1,"
+            " worker = NULL WHERE id = ? AND status = ?",
+            (QUEUED, job_id, RUNNING))
+
+    def cancel(self, job_id):
+        """
+        Cancels a job that has not started yet.
+
+        Returns
+        -------
+        cancelled : bool
+            False when the job is already running or over.
+        """
+        cursor = self._connection.execute(
+            "UPDATE jobs SET status = ?, finished = ? WHERE id = ? AND status = ?",
+            (CANCELLED, time.time(), job_id, QUEUED))
+        return cursor.rowcount > 0
+
+    def recover(self):
+        """
+        Puts back in the queue the running jobs of workers that are gone,
+        as a failed attempt.
+
+        Returns
+        -------
+        count : int
+            Number of jobs recovered.
+        """
+        rows = self._connection.execute(
+            "SELECT id, worker FROM jobs WHERE status = ?",
+            (RUNNING,)).fetchall()
+        count = 0
+        for row in rows:
+            if not _alive(row["worker"]):
+                self.fail(row["id"], f"Worker {row['worker']} stopped")
+                count += 1
+        return count
+
+    def job(self, job_id):
+        """
+        Returns a job as a dictionary, its arguments and result decoded.
+        """
+        row = self._connection.execute(
+            "SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return None if row is None else _decode(row)
+
+    def jobs(self, limit=None):
+        """
+        Returns the jobs, the most recently submitted first.
+        """
+        query = "SELECT * FROM jobs ORDER BY id DESC"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        return [_decode(row) for row in self._connection.execute(query)]
+
+    def counts(self):
+        """
+        Returns the number of jobs of each status.
+        """
+        counts = {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED,
+                                           CANCELLED)}
+        for row in self._connection.execute(
+                "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+            counts[row["status"]] = row["n"]
+        return counts
+
+
+def _decode(row):
+    job = dict(row)
+    job["arguments"] = json.loads(job["arguments"])
+    if job["result"] is not None:
+        job["result"] = json.loads(job["result"])
+    return job
+
+
+def _alive(pid):
+    # Tells whether a process of this machine is running.
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _run_job(function, arguments):
+    # Runs in a worker process, with the arguments of the queue.
+    return FUNCTIONS[function](**arguments)
+
+
+def run_worker(path, concurrency=1, poll=POLL_INTERVAL, once=False):
+    """
+    Runs the jobs of a queue until interrupted.
+
+    Parameters
+    ----------
+    path : str
+        Path of the SQLite queue.
+    concurrency : int
+        Number of jobs run at once, each in its own process.
+    poll : float
+        Seconds between two looks at the queue.
+    once : bool
+        Stops as soon as no job is running or ready, instead of waiting
+        for new ones.
+
+    Returns
+    -------
+    counts : dict
+        Number of jobs this worker completed and failed.
+    """
+    concurrency = max(int(concurrency), 1)
+    worker = os.getpid()
+    counts = {DONE: 0, FAILED: 0}
+    running = {}
+    # Blender cannot be forked safely, the same goes for its jobs.
+    context = multiprocessing.get_context("spawn")
+    with JobQueue(path) as queue, WorkerPool(
+            max_workers=concurrency, mp_context=context) as pool:
+        try:
+            while True:
+                for future in [future for future in running if future.done()]:
+                    job = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        queue.fail(job["id"], f"{type(e).__name__}: {e}")
+                        counts[FAILED] += 1
+                        print(f"Job {job['id']} failed: {e}", file=sys.stderr)
+                    else:
+                        queue.complete(job["id"], result)
+                        counts[DONE] += 1
+                        print(f"Job {job['id']} done", file=sys.stderr)
+
+                queue.recover()
+                while len(running) < concurrency:
+                    job = queue.claim(worker)
+                    if job is None:
+                        break
+                    print(f"Job {job['id']} started: {job['label']}",
+                          file=sys.stderr)
+                    future = pool.submit(_run_job, job["function"],
+                                         job["arguments"])
+                    running[future] = job
+
+                if once and not running:
+                    break
+                time.sleep(poll)
+        except KeyboardInterrupt:
+            for future, job in running.items():
+                future.cancel()
+                queue.release(job["id"])
+            pool.terminate()
+    return counts
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m addon.jobs",
+        description="Runs and inspects the local queue of simulation jobs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    worker = commands.add_parser("worker", help="Run the jobs of the queue.")
+    worker.add_argument("queue", help="Path of the SQLite queue.")
+    worker.add_argument("-j", "--concurrency", type=int, default=1,
+                        help="Number of jobs run at once.")
+    worker.add_argument("--poll", type=float, default=POLL_INTERVAL,
+                        help="Seconds between two looks at the queue.")
+    worker.add_argument("--once", action="store_true",
+                        help="Stop once the queue is empty.")
+
+    status = commands.add_parser("status", help="List the jobs.")
+    status.add_argument("queue", help="Path of the SQLite queue.")
+    status.add_argument("-n", "--limit", type=int, default=20,
+                        help="Number of jobs listed.")
+
+    cancel = commands.add_parser("cancel", help="Cancel queued jobs.")
+    cancel.add_argument("queue", help="Path of the SQLite queue.")
+    cancel.add_argument("ids", type=int, nargs="+", help="Job ids.")
+    return parser
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.command == "worker":
+        # Stopping the daemon puts its running jobs back in the queue.
+        signal.signal(signal.SIGTERM, _interrupt)
+        counts = run_worker(args.queue, args.concurrency, args.poll,
+                            args.once)
+        print(f"{counts[DONE]} jobs done, {counts[FAILED]} failed",
+              file=sys.stderr)
+        return 0
+
+    with JobQueue(args.queue) as queue:
+        if args.command == "cancel":
+            for job_id in args.ids:
+                if not queue.cancel(job_id):
+                    print(f"Job {job_id} is not queued", file=sys.stderr)
+            return 0
+
+        for job in queue.jobs(args.limit):
+            error = f"  {job['error']}" if job["error"] else ""
+            print(f"{job['id']:>5}  {job['status']:<9}  p{job['priority']}  "
+                  f"{job['attempts']}/{job['max_attempts']}  "
+                  f"{job['label']}{error}")
+        counts = queue.counts()
+        print(", ".join(f"{n} {status}" for status, n in counts.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import numpy as np
+import trimesh
+
+
+def exposed_faces(matrix, axis, sign):
+    """
+    Finds the voxel faces that are not shared with an occupied neighbour.
+
+    Parameters
+    ----------
+    matrix : numpy.ndarray
+        Boolean occupancy grid of shape (nx, ny, nz).
+    axis : int
+        Axis normal to the faces, 0, 1 or 2.
+    sign : int
+        Direction of the face normal along the axis, 1 or -1.
+
+    Returns
+    -------
+    mask : numpy.ndarray
+        Boolean grid with the shape of matrix, True where the voxel has an
+        exposed face in the given direction.
+    """
+    matrix = np.asarray(matrix, dtype=bool)
+    neighbour = np.zeros_like(matrix)
+    inner = [slice(None)] * 3
+    outer = [slice(None)] * 3
+    if sign > 0:
+        inner[axis] = slice(None, -1)
+        outer[axis] = slice(1, None)
+    else:
+        inner[axis] = slice(1, None)
+        outer[axis] = slice(None, -1)
+    neighbour[tuple(inner)] = matrix[tuple(outer)]
+    return matrix & ~neighbour
+
+
+def _face_rectangles(mask, greedy):
+    """
+    Covers the True cells of a stack of 2D face masks with rectangles.
+
+    The mask is indexed as (slice, u, v). Without merging every cell is its
+    own rectangle. With merging, cells are first joined into runs along v and
+    runs with the same extent in consecutive rows are then joined along u.
+
+    Returns
+    -------
+    rectangles : numpy.ndarray
+        Integer array of rows (slice, u0, u1, v0, v1), bounds exclusive.
+    """
+    if not greedy:
+        w, u, v = np.nonzero(mask)
+        return np.column_stack((w, u, u + 1, v, v + 1))
+
+    # Runs along v: +1 marks the start of a run, -1 one past its end.
+    padded = np.zeros(mask.shape[:2] + (mask.shape[2] + 2,), dtype=np.int8)
+    padded[:, :, 1:-1] = mask
+    edges = np.diff(padded, axis=2)
+    w, u, start = np.nonzero(edges == 1)
+    end = np.nonzero(edges == -1)[2]
+    if len(w) == 0:
+        return np.zeros((0, 5), dtype=np.int64)
+
+    # Runs with the same slice and extent in consecutive rows form one
+    # rectangle.
+    order = np.lexsort((u, end, start, w))
+    w, u, start, end = w[order], u[order], start[order], end[order]
+    new = np.ones(len(w), dtype=bool)
+    new[1:] = ((w[1:] != w[:-1]) | (start[1:] != start[:-1]) |
+               (end[1:] != end[:-1]) | (u[1:] != u[:-1] + 1))
+    first = np.flatnonzero(new)
+    last = np.append(first[1:], len(w)) - 1
+    return np.column_stack(
+        (w[first], u[first], u[last] + 1, start[first], end[first]))
+
+
+def box_mesh(indices, transform):
+    """
+    Builds a mesh made of one closed box per voxel.
+
+    Parameters
+    ----------
+    indices : numpy.ndarray
+        Integer (N, 3) indices of the occupied voxels.
+    transform : numpy.ndarray
+        4x4 matrix mapping voxel indices to the world position of the voxel
+        centers.
+
+    Returns
+    -------
+    mesh : trimesh.Trimesh
+        Boxes with 12 consecutive triangles per voxel, in the order of the
+        indices. Corners shared between boxes are merged.
+    """
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    unit = trimesh.creation.box(bounds=[[0, 0, 0], [1, 1, 1]])
+    template = np.round(unit.vertices).astype(np.int64)
+
+    corners = (indices[:, None, :] + template[None]).reshape(-1, 3)
+    faces = (8 * np.arange(len(indices))[:, None, None] +
+             unit.faces[None]).reshape(-1, 3)
+    if len(corners):
+        corners, inverse = np.unique(corners, axis=0, return_inverse=True)
+        faces = inverse.reshape(-1)[faces]
+
+    vertices = trimesh.transformations.transform_points(
+        corners - 0.5, transform)
+    return trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+
+
+def surface_mesh(matrix, transform, greedy=False, region=None):
+    """
+    Builds a mesh made only of the exposed faces of a voxel grid.
+
+    Interior faces shared between two occupied voxels are skipped, so the
+    size of the result grows with the surface of the grid instead of its
+    volume. With greedy merging, coplanar faces are coalesced into larger
+    quads.
+
+    Parameters
+    ----------
+    matrix : numpy.ndarray
+        Boolean occupancy grid of shape (nx, ny, nz).
+    transform : numpy.ndarray
+        4x4 matrix mapping voxel indices to the world position of the voxel
+        centers, as given by trimesh.voxel.VoxelGrid.transform.
+    greedy : bool
+        Merge coplanar faces into larger quads.
+    region : numpy.ndarray
+        Boolean grid with the shape of matrix. When given, only the voxels
+        inside the region emit faces, the others only hide the faces of
+        their neighbours.
+
+    Returns
+    -------
+    mesh : trimesh.Trimesh
+        Triangulated surface with outward facing normals.
+    """
+    matrix = np.asarray(matrix, dtype=bool)
+    corners = []
+    faces = []
+    count = 0
+    for axis in range(3):
+        # (axis, u, v) is a cyclic permutation so that u x v points along
+        # the positive axis.
+        u_axis = (axis + 1) % 3
+        v_axis = (axis + 2) % 3
+        for sign in (1, -1):
+            mask = exposed_faces(matrix, axis, sign)
+            if region is not None:
+                mask &= region
+            mask = np.transpose(mask, (axis, u_axis, v_axis))
+            rects = _face_rectangles(mask, greedy)
+            if len(rects) == 0:
+                continue
+            w, u0, u1, v0, v1 = rects.T
+            if sign > 0:
+                w = w + 1
+
+            quad = np.empty((len(rects), 4, 3), dtype=np.int64)
+            quad[:, :, axis] = w[:, None]
+            quad[:, :, u_axis] = np.column_stack((u0, u1, u1, u0))
+            quad[:, :, v_axis] = np.column_stack((v0, v0, v1, v1))
+            corners.append(quad.reshape(-1, 3))
+
+            base = count + 4 * np.arange(len(rects))[:, None]
+            if sign > 0:
+                tris = np.array([[0, 1, 2], [0, 2, 3]])
+            else:
+                tris = np.array([[0, 2, 1], [0, 3, 2]])
+            faces.append((base[:, None, :] + tris[None]).reshape(-1, 3))
+            count += 4 * len(rects)
+
+    if count == 0:
+        return trimesh.Trimesh(vertices=np.zeros((0, 3)),
+                               faces=np.zeros((0, 3), dtype=np.int64),
+                               process=False)
+
+    # Share the corners between neighbouring faces.
+    corners, inverse = np.unique(
+        np.concatenate(corners), axis=0, return_inverse=True)
+    faces = inverse.reshape(-1)[np.concatenate(faces)]
+
+    # Voxel i spans [i - 0.5, i + 0.5] in index space.
+    vertices = trimesh.transformations.transform_points(
+        corners - 0.5, transform)
+    return trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
@@ -0,0 +1,276 @@
+import mmap
+import os
+import numpy as np
+
+# Number of rows formatted at once by the streaming writer.
+CHUNK_ROWS = 1 << 16
+
+# Size of the file buffers, in bytes.
+BUFFER_SIZE = 1 << 20
+
+# Approximate size of the blocks parsed at once by the readers, in bytes.
+BLOCK_SIZE = 1 << 24
+
+NEWLINE, CR, SPACE, TAB, SLASH = b"\n\r \t/"
+
+
+def format_rows(row_format, rows):
+    """
+    Formats a 2D array with a row format such as "v %.8f %.8f %.8f\\n".
+    Repeating the row format lets a single % call format the whole block.
+    """
+    return (row_format * len(rows)) % tuple(rows.ravel().tolist())
+
+
+class ObjWriter:
+    """
+    Streaming writer for OBJ files.
+
+    Vertex and face blocks are formatted in chunks of CHUNK_ROWS rows and
+    written straight to a buffered file, so the whole file never exists as
+    one string in memory. Meshes can be appended one after the other, the
+    face indices being shifted by the number of vertices already written.
+    """
+
+    def __init__(self, path, mtl_file=None, chunk_rows=CHUNK_ROWS):
+        """
+        Parameters
+        ----------
+        path : str
+            Path to the obj file.
+        mtl_file : str
+            Path to the material file referenced by the obj file.
+        chunk_rows : int
+            Number of rows formatted at once.
+        """
+        self.path = path
+        self.mtl_file = mtl_file
+        self.chunk_rows = chunk_rows
+        self.count = 0
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "w", buffering=BUFFER_SIZE)
+        if self.mtl_file:
+            name = os.path.splitext(os.path.basename(self.mtl_file))[0]
+            relative = os.path.relpath(
+                self.mtl_file, os.path.dirname(os.path.abspath(self.path)))
+            self._file.write(f"mtllib {relative}\n")
+            self._file.write(f"usemtl {name}\n")
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()
+        self._file = None
+
+    def write_vertices(self, vertices):
+        """
+        Writes vertex records.
+
+        Parameters
+        ----------
+        vertices : numpy.ndarray
+            Float (N, 3) vertex positions.
+        """
+        vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        for start in range(0, len(vertices), self.chunk_rows):
+            self._file.write(format_rows(
+                "v %.8f %.8f %.8f\n", vertices[start:start + self.chunk_rows]))
+        self.count += len(vertices)
+
+    def write_faces(self, faces, offset=0):
+        """
+        Writes triangle records.
+
+        Parameters
+        ----------
+        faces : numpy.ndarray
+            Integer (M, 3) zero based vertex indices.
+        offset : int
+            Number of vertices written before the ones the faces refer to.
+        """
+        faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+        for start in range(0, len(faces), self.chunk_rows):
+            chunk = faces[start:start + self.chunk_rows] + (offset + 1)
+            self._file.write(format_rows("f %d %d %d\n", chunk))
+
+    def write_mesh(self, mesh):
+        """
+        Appends a mesh after the meshes already written.
+
+        Parameters
+        ----------
+        mesh : trimesh.Trimesh
+            The mesh to write.
+        """
+        offset = self.count
+        self.write_vertices(mesh.vertices)
+        self.write_faces(mesh.faces, offset)
+
+
+def write_obj(path, mesh, mtl_file=None):
+    """
+    Writes a mesh to an OBJ file with the streaming writer.
+    """
+    with ObjWriter(path, mtl_file) as writer:
+        writer.write_mesh(mesh)
+
+
+def _iter_blocks(path, block_size):
+    # Yields blocks of whole lines of the file, read through a memory map.
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped.
+            return
+        with data:
+            start = 0
+            while start < len(data):
+                end = data.find(b"\n", start + block_size)
+                end = len(data) if end == -1 else end + 1
+                yield np.frombuffer(data[start:end], dtype=np.uint8)
+                start = end
+
+
+def _record_bytes(block, record):
+    # Keeps the lines of the block starting with the record keyword, with
+    # the keywords blanked, so only numbers and whitespace are left. Also
+    # returns the number of kept lines.
+    newlines = np.flatnonzero(block == NEWLINE)
+    newlines = newlines[newlines + 1 < len(block)]
+    starts = np.concatenate(([0], newlines + 1))
+
+    # Padding so the keyword test of a short last line stays in bounds.
+    padded = np.concatenate((block[starts[-1]:],
+                             np.zeros(len(record) + 1, np.uint8)))
+    keep = np.ones(len(starts), dtype=bool)
+    for i, char in enumerate(record + b" "):
+        column = block[starts[:-1] + i]
+        column = np.append(column, padded[i])
+        if i < len(record):
+            keep &= column == char
+        else:
+            after = column
+    keep &= (after == SPACE) | (after == TAB)
+    if not keep.any():
+        return None, 0
+
+    # The bytes of the kept lines are copied at once.
+    lengths = np.diff(np.append(starts, len(block)))
+    data = block[np.repeat(keep, lengths)]
+
+    starts = np.cumsum(lengths[keep]) - lengths[keep]
+    for i in range(len(record)):
+        data[starts + i] = SPACE
+    return data, len(starts)
+
+
+def _value_counts(data):
+    # Number of values of each line, a value starts at every non blank
+    # byte following a blank one.
+    blank = _blank(data)
+    first = ~blank & np.concatenate(([True], blank[:-1]))
+    starts = np.flatnonzero(np.concatenate(([True], data[:-1] == NEWLINE)))
+    return np.add.reduceat(first, starts)
+
+
+def _blank(data):
+    return (data == SPACE) | (data == TAB) | (data == NEWLINE) | (data == CR)
+
+
+def _strip_references(data):
+    # Blanks the texture and normal references of face corners, the part
+    # of each token from its first slash.
+    token_start = np.maximum.accumulate(
+        np.where(_blank(data), np.arange(len(data)), 0))
+    slashes = np.cumsum(data == SLASH)
+    data[slashes - slashes[token_start] > 0] = SPACE
+    return data
+
+
+def iter_records(path, record, columns=3, block_size=BLOCK_SIZE):
+    """
+    Parses the records of an OBJ file block by block.
+
+    The file is memory mapped and read in blocks of whole lines. The lines
+    of other records are dropped with NumPy masks, and the numbers of the
+    kept lines are parsed by a single NumPy call per block, without a
+    Python loop over the lines.
+
+    Parameters
+    ----------
+    path : str
+        Path to the obj file.
+    record : str
+        Keyword of the records, 'v' for vertices or 'f' for faces.
+    columns : int
+        Number of values kept of each record, the following ones, such as
+        vertex weights or colors, are dropped.
+    block_size : int
+        Approximate size of the blocks, in bytes.
+
+    Yields
+    ------
+    values : numpy.ndarray
+        (N, columns) values of the records of a block.
+    """
+    record = record.encode()
+    for block in _iter_blocks(path, block_size):
+        data, lines = _record_bytes(block, record)
+        if data is None:
+            continue
+        if record == b"f" and (data == SLASH).any():
+            data = _strip_references(data)
+        values = np.fromstring(data.tobytes(), sep=" ")
+        if len(values) == lines * columns:
+            yield values.reshape(-1, columns)
+            continue
+
+        # Records with extra values, the first columns of each are kept.
+        counts = _value_counts(data)
+        if (counts < columns).any():
+            raise ValueError(
+                f"{path}: '{record.decode()}' record with less than {columns} values")
+        offsets = np.cumsum(counts) - counts
+        yield values[offsets[:, None] + np.arange(columns)]
+
+
+def iter_vertices(path, block_size=BLOCK_SIZE):
+    """
+    Yields the (N, 3) float vertex positions of an OBJ file, block by block.
+    """
+    yield from iter_records(path, "v", 3, block_size)
+
+
+def read_vertices(path, block_size=BLOCK_SIZE):
+    """
+    Reads the vertex positions of an OBJ file.
+
+    Returns
+    -------
+    vertices : numpy.ndarray
+        Contiguous (N, 3) float64 array of the vertex positions.
+    """
+    blocks = list(iter_vertices(path, block_size))
+    if not blocks:
+        return np.empty((0, 3), dtype=np.float64)
+    return np.ascontiguousarray(np.concatenate(blocks))
+
+
+def read_faces(path, block_size=BLOCK_SIZE):
+    """
+    Reads the faces of an OBJ file.
+
+    Texture and normal references are ignored. Only the first three
+    corners of each face are read, as written by ObjWriter.
+
+    Returns
+    -------
+    faces : numpy.ndarray
+        (M, 3) int64 array of zero based vertex indices.
+    """
+    blocks = list(iter_records(path, "f", 3, block_size))
+    if not blocks:
+        return np.empty((0, 3), dtype=np.int64)
+    return np.concatenate(blocks).astype(np.int64) - 1
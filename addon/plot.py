@@ -1,10 +1,8 @@
 import seaborn as sns
-import matplotlib.pyplot as plt
 import numpy as np
-import matplotlib
-from .voxelizer import Voxelizer
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from matplotlib.ticker import LinearLocator
-matplotlib.use('Agg')
 
 # Define type aliases for convenience
 Labels = list[str]
@@ -13,43 +11,71 @@ Ticks = list[int]
 
 # Base class for creating different types of plots
 class AbstractPlot:
+    """
+    Base class of the plots.
+
+    Each plot draws on its own Figure, attached to an Agg canvas, instead
+    of the pyplot current figure, so plots do not share state and can be
+    rendered from any thread or process. Close the plot, or use it as a
+    context manager, to release the figure once it is saved.
+    """
 
     def __init__(self):
-        # Clear current figure
-        plt.clf()
+        self.figure = Figure()
+        FigureCanvasAgg(self.figure)
+        self.ax = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def axes(self, projection=None):
+        """
+        Returns the axes of the plot, created on first use.
+        """
+        if self.ax is None:
+            self.ax = self.figure.add_subplot(projection=projection)
+        return self.ax
+
+    def close(self) -> None:
+        """
+        Releases the artists of the figure.
+        """
+        self.figure.clear()
+        self.ax = None
 
     # Function to set the legend on the plot
     def set_legend(self, **kwargs) -> None:
         # Various ways to call legend, based on what's passed in kwargs
         if ('labels' in kwargs and 'handles' in kwargs):
-            plt.legend(labels=kwargs['labels'], handles=kwargs['handles'])
+            self.axes().legend(labels=kwargs['labels'],
+                               handles=kwargs['handles'])
         elif ('labels' in kwargs and not 'handles' in kwargs):
-            plt.legend(labels=kwargs['labels'])
+            self.axes().legend(labels=kwargs['labels'])
         elif (not 'labels' in kwargs and 'handles' in kwargs):
-            plt.legend(handles=kwargs['handles'])
+            self.axes().legend(handles=kwargs['handles'])
 
     # Remaining methods are self-explanatory setters for title, labels, ticks,
     # etc.
     def set_title(self, title: str) -> None:
-        plt.title(title)
+        self.axes().set_title(title)
 
     def set_xlabel(self, label: str) -> None:
-        plt.xlabel(label)
+        self.axes().set_xlabel(label)
 
     def set_ylabel(self, label: str) -> None:
-        plt.ylabel(label)
+        self.axes().set_ylabel(label)
 
     def set_xticks(self, ticks: Ticks):
-        plt.xticks(ticks)
+        self.axes().set_xticks(ticks)
 
     def set_yticks(self, ticks: Ticks):
-        plt.yticks(ticks)
-
-    def show(self):
-        plt.show()
+        self.axes().set_yticks(ticks)
 
     def save_to_png(self, *args, **kwargs) -> None:
-        plt.savefig(*args, **kwargs)
+        self.figure.savefig(*args, **kwargs)
 
 ######## pie_chart ##########
 
@@ -64,7 +90,8 @@ class PieChart(AbstractPlot):
     # Function to create a pie chart
     def create_pie(self, wedges: Wedges, labels: Labels,
                    autopct: str, colors=None):
-        plt.pie(x=wedges, labels=labels, colors=colors, autopct=autopct)
+        self.axes().pie(x=wedges, labels=labels, colors=colors,
+                        autopct=autopct)
 
 ######## bar_chart ##########
 
@@ -76,7 +103,8 @@ class HeatMap(AbstractPlot):
     def create_heatmap(self, data, annot=False, fmt=".1f", cmap=None,
                        vmin=None, vmax=None, linewidth=.0, linecolor="white"):
         sns.heatmap(data=data, annot=annot, fmt=fmt,
-                    cmap=cmap, vmin=vmin, vmax=vmax, linewidth=linewidth, linecolor=linecolor)
+                    cmap=cmap, vmin=vmin, vmax=vmax, linewidth=linewidth, linecolor=linecolor,
+                    ax=self.axes())
 
 
 # Subclass for creating scatter plots
@@ -85,29 +113,28 @@ class ScatterPlot(AbstractPlot):
     # Function to create a scatter plot
     def create_scatter(self, x, y, z, s=30, c=None, marker='o', cmap=None, norm=None, vmin=None, vmax=None,
                        alpha=None, linewidths=None, verts=None, edgecolors=None, *, plotnonfinite=False, data=None, **kwargs):
-        fig = plt.figure()
-        ax = fig.add_subplot(projection='3d')
+        ax = self.axes(projection='3d')
         ax.scatter3D(x, y, z, color="green")
         ax.set_xlabel('X Label')
         ax.set_ylabel('Y Label')
         ax.set_zlabel('Z Label')
 
-# Subclass for creating voxel plots (currently not implemented)
+# Subclass for creating voxel plots from an occupancy grid
 
 
 class VoxelPlot(AbstractPlot):
 
-    """
-    NOT IMPLEMENTED
-    """
-
     def create_voxel(self, voxelarray, colors=None, facecolors=None, edgecolors=None,
                      shade=True, norm=None, vmin=None, vmax=None, linewidth=0.0, edgecolor=None, **kwargs):
-        fig = plt.figure()
-        ax = fig.add_subplot(projection='3d')
-
-        ax.voxels(np.array(voxelarray), facecolors=facecolors, edgecolors=edgecolors,
-                  shade=shade, norm=norm, vmin=vmin, vmax=vmax, linewidth=linewidth, edgecolor=edgecolor, **kwargs)
+        ax = self.axes(projection='3d')
+
+        # Poly3DCollection rejects vmin/vmax and the edgecolor alias, so only
+        # the options it understands are forwarded.
+        if norm is not None:
+            kwargs['norm'] = norm
+        ax.voxels(np.array(voxelarray), facecolors=facecolors,
+                  edgecolors=edgecolors if edgecolors is not None else edgecolor,
+                  shade=shade, linewidth=linewidth, **kwargs)
         ax.set_xlabel('X Label')
         ax.set_ylabel('Y Label')
         ax.set_zlabel('Z Label')
@@ -116,15 +143,14 @@ class VoxelPlot(AbstractPlot):
 class SurfaceChart(AbstractPlot):
 
     def create_surface(self, x, y, z):
-        fig = plt.figure()
-        ax = fig.add_subplot(projection='3d')
+        ax = self.axes(projection='3d')
         surf = ax.plot_trisurf(x, y, z, linewidth=0, antialiased=False)
         ax.set_xlabel('X Label')
         ax.set_ylabel('Y Label')
         ax.set_zlabel('Z Label')
         ax.zaxis.set_major_locator(LinearLocator(10))
         ax.zaxis.set_major_formatter('{x:.02f}')
-        fig.colorbar(surf, shrink=0.5, aspect=5)
+        self.figure.colorbar(surf, ax=ax, shrink=0.5, aspect=5)
 
 
 # Subclass for creating surface charts
@@ -132,7 +158,7 @@ class BubblePlot(AbstractPlot):
 
     # Function to create a surface chart
     def create_bubble(self, x, y):
-        plt.figure()
-        plt.scatter(x, y, color='darkblue')
-        plt.xlabel('X label')
-        plt.ylabel('Y label')
+        ax = self.axes()
+        ax.scatter(x, y, color='darkblue')
+        ax.set_xlabel('X label')
+        ax.set_ylabel('Y label')
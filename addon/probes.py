@@ -0,0 +1,170 @@
+import json
+
+import numpy as np
+
+# Kinds of probes, as placed in the scene.
+POINT = 'POINT'
+LINE = 'LINE'
+PLANE = 'PLANE'
+
+# Default number of time steps between two recorded samples.
+DECIMATION = 10
+
+# Keys of the dict returned by read_probes that are not probes.
+RESERVED_NAMES = ('time', 'metadata')
+
+
+def line_points(start, end, pitch):
+    """
+    Samples a segment every pitch, both ends included.
+
+    Returns
+    -------
+    points : numpy.ndarray
+        (N, 3) positions along the segment.
+    """
+    start = np.asarray(start, dtype=np.float64)
+    end = np.asarray(end, dtype=np.float64)
+    count = int(np.ceil(np.linalg.norm(end - start) / pitch)) + 1
+    return start + np.linspace(0, 1, count)[:, None] * (end - start)
+
+
+def probe_name(name, taken=()):
+    """
+    Returns name, prefixed with 'probe_' as long as it is one of the
+    RESERVED_NAMES or already taken, so it can be a key of read_probes.
+    """
+    while name in RESERVED_NAMES or name in taken:
+        name = 'probe_' + name
+    return name
+
+
+def plane_points(corner, u, v, pitch):
+    """
+    Samples the parallelogram spanned by u and v from corner every pitch
+    along both edges.
+
+    Returns
+    -------
+    points : numpy.ndarray
+        (N, 3) positions, row by row along u.
+    """
+    corner = np.asarray(corner, dtype=np.float64)
+    u = np.asarray(u, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+    nu = int(np.ceil(np.linalg.norm(u) / pitch)) + 1
+    nv = int(np.ceil(np.linalg.norm(v) / pitch)) + 1
+    s, t = np.meshgrid(np.linspace(0, 1, nu), np.linspace(0, 1, nv))
+    return corner + s.reshape(-1, 1) * u + t.reshape(-1, 1) * v
+
+
+def probe_cells(probes, origin, pitch, shape, padding, dimension):
+    """
+    Maps the points of probes to the cells of a simulated domain.
+
+    The 1D and 2D domains being the line and the plane through the center
+    of the grid, points are projected on them. Points outside the domain
+    are dropped, as are repeated cells of a probe.
+
+    Parameters
+    ----------
+    probes : list of dict
+        'name', 'kind' and 'points', (N, 3) world positions, of each probe.
+    origin : array_like
+        World position of the center of voxel (0, 0, 0) of the grid.
+    pitch : float
+        Edge length of a cell.
+    shape : tuple
+        Shape of the domain, the grid padded on each side.
+    padding : int
+        Cells added on each side of the grid.
+    dimension : int
+        1, 2 or 3.
+
+    Returns
+    -------
+    cells : numpy.ndarray
+        (M, dimension) indices of the sampled cells.
+    owners : numpy.ndarray
+        (M,) index in probes of the probe of each cell.
+    """
+    origin = np.asarray(origin, dtype=np.float64)[:dimension]
+    cells = []
+    owners = []
+    for i, probe in enumerate(probes):
+        points = np.asarray(probe['points'], dtype=np.float64).reshape(-1, 3)
+        indices = np.rint((points[:, :dimension] - origin) / pitch).astype(
+            np.int64) + padding
+        inside = np.all((indices >= 0) & (indices < shape), axis=1)
+        indices = indices[inside]
+        _, first = np.unique(indices, axis=0, return_index=True)
+        indices = indices[np.sort(first)]
+        cells.append(indices.reshape(-1, dimension))
+        owners.append(np.full(len(indices), i, dtype=np.int32))
+    if not cells:
+        return np.empty((0, dimension), np.int64), np.empty(0, np.int32)
+    return np.concatenate(cells), np.concatenate(owners)
+
+
+def write_probes(path, probes, points, owners, times, values, metadata=None):
+    """
+    Writes the samples of probes to an npz file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the npz file.
+    probes : list of dict
+        The probes, their 'name' and 'kind' are stored.
+    points : numpy.ndarray
+        (M, dimension) positions of the sampled cells.
+    owners : numpy.ndarray
+        (M,) index of the probe of each cell.
+    times : numpy.ndarray
+        (R,) time of each record.
+    values : numpy.ndarray
+        (R, M, C) field components of each cell at each record.
+    metadata : dict
+        JSON serializable description of the run.
+
+    Raises
+    ------
+    ValueError
+        If a probe is named like one of the RESERVED_NAMES, or two probes
+        share a name, see probe_name.
+    """
+    names = [probe['name'] for probe in probes]
+    for i, name in enumerate(names):
+        if name in RESERVED_NAMES or name in names[:i]:
+            raise ValueError(f"Probe name {name!r} is reserved or repeated")
+    metadata = dict(metadata or {}, probes=[
+        {'name': probe['name'], 'kind': probe['kind'],
+         'count': int(np.sum(owners == i))}
+        for i, probe in enumerate(probes)])
+    np.savez(path, metadata=np.array(json.dumps(metadata)), points=points,
+             probe=owners, time=times, values=values)
+
+
+def read_probes(path):
+    """
+    Reads a file written by write_probes.
+
+    Returns
+    -------
+    probes : dict
+        The samples of each probe by name, a dict of its 'kind', 'points',
+        (N, dimension), and 'values', (R, N, C), along with the 'time' of
+        the records and the 'metadata'.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        metadata = json.loads(str(data["metadata"]))
+        owners = data["probe"]
+        points = data["points"]
+        values = data["values"]
+        probes = {'time': data["time"], 'metadata': metadata}
+    for i, probe in enumerate(metadata['probes']):
+        mask = owners == i
+        probes[probe['name']] = {'kind': probe['kind'],
+                                 'points': points[mask],
+                                 'values': values[:, mask]}
+    return probes
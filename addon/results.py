@@ -0,0 +1,185 @@
+import json
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from .obj_io import BUFFER_SIZE, format_rows
+
+# File extension of each simulation output format.
+RESULT_EXTENSIONS = {
+    'NPZ': ".npz",
+    'PARQUET': ".parquet",
+    'FEATHER': ".feather",
+    'CSV': ".csv",
+}
+
+# Key of the metadata in the schema of Parquet and Feather files.
+METADATA_KEY = b"cem"
+
+
+def result_format(path):
+    """
+    Returns the output format of a path from its extension.
+    """
+    for name, extension in RESULT_EXTENSIONS.items():
+        if path.endswith(extension):
+            return name
+    raise ValueError(f"Unknown result format: {path}")
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError(
+            "Parquet and Feather results need pyarrow, install it or use the NPZ format")
+    return pyarrow
+
+
+class ResultWriter:
+    """
+    Streaming writer of simulation results.
+
+    Rows are appended block by block, each block is written as soon as it
+    is given: a member of the npz archive, a row group of the Parquet file,
+    a record batch of the Feather file or lines of the CSV file. Binary
+    formats keep the full float64 precision and store the column names and
+    the metadata along with the rows.
+    """
+
+    def __init__(self, path, columns, metadata=None):
+        """
+        Parameters
+        ----------
+        path : str
+            Path of the output, its extension gives the format.
+        columns : list of str
+            Names of the columns.
+        metadata : dict
+            JSON serializable description of the results.
+        """
+        self.path = path
+        self.columns = list(columns)
+        self.metadata = dict(metadata or {}, columns=self.columns)
+        self.format = result_format(path)
+        self.count = 0
+        self._chunks = 0
+        self._file = None
+        self._schema = None
+
+    def __enter__(self):
+        if self.format == 'NPZ':
+            self._file = zipfile.ZipFile(self.path, "w", zipfile.ZIP_STORED)
+        elif self.format == 'CSV':
+            self._file = open(self.path, "w", buffering=BUFFER_SIZE)
+            self._file.write(','.join(self.columns) + '\n')
+        else:
+            pa = _pyarrow()
+            schema = pa.schema(
+                [(name, pa.float64()) for name in self.columns],
+                metadata={METADATA_KEY: json.dumps(self.metadata)})
+            if self.format == 'PARQUET':
+                self._file = pa.parquet.ParquetWriter(self.path, schema)
+            else:
+                self._file = pa.ipc.new_file(self.path, schema)
+            self._schema = schema
+        return self
+
+    def __exit__(self, *exc):
+        if self.format == 'NPZ':
+            self._write_member("columns", np.array(self.columns))
+            self._write_member("metadata", np.array(json.dumps(self.metadata)))
+        self._file.close()
+        self._file = None
+
+    def write(self, rows):
+        """
+        Appends a block of rows.
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            (N, len(columns)) values.
+        """
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(self.columns))
+        if not len(rows):
+            return
+        if self.format == 'NPZ':
+            self._write_member(f"rows_{self._chunks:06d}", rows)
+        elif self.format == 'CSV':
+            row_format = ','.join(['%s'] * len(self.columns)) + '\n'
+            self._file.write(format_rows(row_format, rows))
+        else:
+            pa = _pyarrow()
+            batch = pa.record_batch(
+                [pa.array(rows[:, i]) for i in range(len(self.columns))],
+                schema=self._schema)
+            if self.format == 'PARQUET':
+                self._file.write_batch(batch)
+            else:
+                self._file.write(batch)
+        self._chunks += 1
+        self.count += len(rows)
+
+    def flush(self):
+        """
+        Pushes the rows written so far to the file, where supported.
+        """
+        if self.format == 'CSV':
+            self._file.flush()
+        elif self.format == 'NPZ' and self._file.fp is not None:
+            self._file.fp.flush()
+
+    def _write_member(self, name, array):
+        with self._file.open(name + ".npy", "w", force_zip64=True) as f:
+            np.lib.format.write_array(f, array, allow_pickle=False)
+
+
+def read_results(path):
+    """
+    Reads simulation results written by ResultWriter.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+        The rows, with the column names. The metadata is in df.attrs.
+    """
+    fmt = result_format(path)
+    if fmt == 'CSV':
+        return pd.read_csv(path)
+
+    if fmt == 'NPZ':
+        with np.load(path, allow_pickle=False) as data:
+            metadata = json.loads(str(data["metadata"]))
+            chunks = sorted(name for name in data.files
+                            if name.startswith("rows_"))
+            columns = metadata["columns"]
+            if chunks:
+                rows = np.concatenate([data[name] for name in chunks])
+            else:
+                rows = np.empty((0, len(columns)))
+        df = pd.DataFrame(rows, columns=columns)
+    else:
+        pa = _pyarrow()
+        if fmt == 'PARQUET':
+            table = pa.parquet.read_table(path)
+        else:
+            with pa.memory_map(path) as source:
+                table = pa.ipc.open_file(source).read_all()
+        df = table.to_pandas()
+        metadata = json.loads(
+            (table.schema.metadata or {}).get(METADATA_KEY, b"{}"))
+
+    df.attrs["metadata"] = metadata
+    return df
+
+
+def is_result_file(path):
+    """
+    Tells whether the path has the extension of a simulation output.
+    """
+    return os.path.splitext(path)[1] in RESULT_EXTENSIONS.values()
@@ -0,0 +1,144 @@
+import numpy as np
+import trimesh
+from scipy import ndimage
+
+from .voxel_grid import BACKGROUND_MATERIAL, OccupancyGrid
+
+
+def material_table(materials):
+    """
+    Deduplicates material properties into a table indexed by material id.
+
+    Parameters
+    ----------
+    materials : list of dict
+        Properties of the material of each object.
+
+    Returns
+    -------
+    table : list of dict
+        Distinct materials, the background first.
+    ids : numpy.ndarray
+        Material id of each object.
+    """
+    table = [dict(BACKGROUND_MATERIAL)]
+    ids = []
+    for material in materials:
+        material = dict(material)
+        if material not in table[1:]:
+            table.append(material)
+        ids.append(table.index(material, 1))
+    dtype = np.uint8 if len(table) <= 256 else np.uint16
+    return table, np.array(ids, dtype=dtype)
+
+
+def _surface_indices(mesh, lower, pitch, max_iter=10):
+    # Voxels crossed by the surface, from the vertices of the mesh
+    # subdivided below half a voxel, as trimesh's subdivide voxelization.
+    vertices, faces = trimesh.remesh.subdivide_to_size(
+        mesh.vertices, mesh.faces, max_edge=pitch / 2, max_iter=max_iter)
+    points = vertices[np.unique(faces)]
+    return np.unique(np.floor((points - lower) / pitch).astype(np.int64),
+                     axis=0)
+
+
+def _filled_indices(indices):
+    # Adds the voxels enclosed by the surface of one object.
+    lo = indices.min(axis=0)
+    shell = np.zeros(indices.max(axis=0) - lo + 1, dtype=bool)
+    shell[tuple((indices - lo).T)] = True
+    return np.argwhere(ndimage.binary_fill_holes(shell)) + lo
+
+
+def voxelize_scene(meshes, materials, lower, upper, pitch, fill=True):
+    """
+    Voxelizes several meshes into one grid of material ids.
+
+    The grid covers the box between lower and upper, voxel (0, 0, 0)
+    starting at lower, so every object shares the same origin and pitch.
+    The voxels of all objects are gathered first and labeled in a single
+    vectorized assignment. Where objects overlap, the one listed last wins.
+
+    Parameters
+    ----------
+    meshes : list of trimesh.Trimesh
+        Meshes in world coordinates.
+    materials : list of dict
+        Properties of the material of each mesh.
+    lower : array_like
+        Lower corner of the box to voxelize.
+    upper : array_like
+        Upper corner of the box to voxelize.
+    pitch : float
+        Edge length of a voxel.
+    fill : bool
+        Also label the voxels enclosed by each mesh, not only its surface.
+
+    Returns
+    -------
+    grid : OccupancyGrid
+        Grid of material ids with the materials table.
+    """
+    lower = np.asarray(lower, dtype=np.float64)
+    upper = np.asarray(upper, dtype=np.float64)
+    shape = np.maximum(np.ceil((upper - lower) / pitch).astype(np.int64), 1)
+    table, object_ids = material_table(materials)
+
+    indices = []
+    ids = []
+    for mesh, material_id in zip(meshes, object_ids):
+        if len(mesh.faces) == 0:
+            continue
+        voxels = _surface_indices(mesh, lower, pitch)
+        if fill:
+            voxels = _filled_indices(voxels)
+        indices.append(voxels)
+        ids.append(np.full(len(voxels), material_id, dtype=object_ids.dtype))
+
+    labels = np.zeros(tuple(shape), dtype=object_ids.dtype)
+    if indices:
+        indices = np.concatenate(indices)
+        ids = np.concatenate(ids)
+        inside = ((indices >= 0) & (indices < shape)).all(axis=1)
+        indices, ids = indices[inside], ids[inside]
+
+        # Keep the last object of every voxel, then assign all at once.
+        flat = np.ravel_multi_index(tuple(indices.T), labels.shape)
+        order = np.argsort(flat, kind="stable")
+        flat, ids = flat[order], ids[order]
+        last = np.append(flat[1:] != flat[:-1], True)
+        labels.reshape(-1)[flat[last]] = ids[last]
+
+    return OccupancyGrid(labels, lower + pitch / 2, pitch, table)
+
+
+def save_scene_grid(sources, materials, lower, upper, pitch, grid_file,
+                    fill=True):
+    """
+    Voxelizes meshes given as arrays into one grid and saves it.
+
+    Parameters
+    ----------
+    sources : list of tuple
+        (vertices, faces) arrays of each mesh, in world coordinates.
+    materials : list of dict
+        Properties of the material of each mesh.
+    lower, upper : array_like
+        Corners of the box to voxelize.
+    pitch : float
+        Edge length of a voxel.
+    grid_file : str
+        Path of the grid file.
+    fill : bool
+        Also label the voxels enclosed by each mesh.
+
+    Returns
+    -------
+    grid_file : str
+        Path of the written grid file.
+    """
+    meshes = [trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+              for vertices, faces in sources]
+    grid = voxelize_scene(meshes, materials, lower, upper, pitch, fill=fill)
+    grid.save(grid_file)
+    return grid_file
@@ -1,7 +1,14 @@
 import bpy
+import numpy as np
 
 from mathutils import Vector
 from . converters import OBJECT_OT_stl_to_obj
+from . probes import (LINE, PLANE, POINT, line_points, plane_points,
+                      probe_name)
+from . task_opt import draw_task
+
+# Custom property marking a plane mesh as a probe plane.
+PROBE_PROPERTY = "cem_probe"
 
 
 class OBJECT_PT_scene_section(bpy.types.Panel):
@@ -62,6 +69,8 @@ class OBJECT_PT_scene_section(bpy.types.Panel):
         row.operator(OBJECT_OT_stl_to_obj.bl_idname,
                      text="Voxelize")
 
+        draw_task(layout, OBJECT_OT_stl_to_obj.task_name)
+
 
 class OBJECT_UL_List(bpy.types.UIList):
     """
@@ -106,6 +115,59 @@ def is_inside_cube(obj, cube):
                <= cube_max[i] for i in range(3))
 
 
+def is_probe(obj):
+    """
+    Tells whether an object is a probe: an empty, or a mesh with the cem_probe custom property.
+    """
+    if obj.type == 'EMPTY':
+        return True
+    return obj.type == 'MESH' and bool(obj.get(PROBE_PROPERTY, False))
+
+
+def scene_probes(container, pitch):
+    """
+    Reads the probes placed inside the CubeScene, sampled every pitch.
+
+    Empties are point probes at their origin, or line probes along their local Z axis when displayed as a single arrow.
+    Meshes with the cem_probe custom property are probe planes covering their local XY bounds.
+
+    Returns
+    -------
+    probes : list of dict
+        'name', 'kind' and 'points', a list of world positions, of each probe, sorted by name.
+        Names are the object names, prefixed when reserved, see probes.probe_name.
+    """
+    probes = []
+    for obj in bpy.context.scene.objects:
+        if not is_probe(obj) or not is_inside_cube(obj, container):
+            continue
+        matrix = obj.matrix_world
+        if obj.type == 'EMPTY' and obj.empty_display_type == 'SINGLE_ARROW':
+            kind = LINE
+            end = matrix @ Vector((0, 0, obj.empty_display_size))
+            points = line_points(matrix.translation, end, pitch)
+        elif obj.type == 'EMPTY':
+            kind = POINT
+            points = np.array([matrix.translation])
+        else:
+            kind = PLANE
+            corners = np.array([corner[:] for corner in obj.bound_box])
+            lower = corners.min(axis=0)
+            upper = corners.max(axis=0)
+            z = (lower[2] + upper[2]) / 2
+            corner = matrix @ Vector((lower[0], lower[1], z))
+            u = matrix @ Vector((upper[0], lower[1], z)) - corner
+            v = matrix @ Vector((lower[0], upper[1], z)) - corner
+            points = plane_points(corner, u, v, pitch)
+        probes.append({'name': obj.name, 'kind': kind,
+                       'points': np.asarray(points).tolist()})
+    names = set()
+    for probe in sorted(probes, key=lambda probe: probe['name']):
+        probe['name'] = probe_name(probe['name'], names)
+        names.add(probe['name'])
+    return sorted(probes, key=lambda probe: probe['name'])
+
+
 # Function to update the list of objects that are inside the CubeScene
 def update_filtered_objects(self, context):
     container_name = "CubeScene"
@@ -115,7 +177,7 @@ def update_filtered_objects(self, context):
         # Create a list of all the mesh objects in the scene that are inside
         # the cube
         objects_inside_cube = [
-            obj for obj in bpy.context.scene.objects if obj.type == 'MESH' and is_inside_cube(obj, container)]
+            obj for obj in bpy.context.scene.objects if obj.type == 'MESH' and not is_probe(obj) and is_inside_cube(obj, container)]
 
         # Get the list of filtered objects from the current scene and clear it
         filtered_objects = context.scene.FilteredObjects
@@ -2,6 +2,8 @@ import bpy
 
 from bpy.types import PropertyGroup
 from bpy.props import (
+    BoolProperty,
+    EnumProperty,
     IntProperty,
     FloatProperty,
 )
@@ -51,6 +53,35 @@ class OBJECT_PT_parameters_section(bpy.types.Panel):
         # 'layout.prop' automatically creates an interactive UI element for a given property
         layout.prop(global_settings, "mesh_size")
         layout.prop(global_settings, "frequency")
+        layout.prop(global_settings, "sweep")
+        if global_settings.sweep:
+            layout.prop(global_settings, "frequency_start")
+            layout.prop(global_settings, "frequency_stop")
+            layout.prop(global_settings, "frequency_step")
+        layout.prop(global_settings, "solver")
+        if global_settings.solver == 'FDTD':
+            layout.prop(global_settings, "time_steps")
+            layout.prop(global_settings, "use_probes")
+            if global_settings.use_probes:
+                layout.prop(global_settings, "probe_decimation")
+        elif global_settings.solver == 'FDFD':
+            layout.prop(global_settings, "fdfd_method")
+            layout.prop(global_settings, "use_probe_sources")
+        layout.prop(global_settings, "group_size")
+        layout.prop(global_settings, "reduction")
+        layout.prop(global_settings, "streaming")
+        layout.prop(global_settings, "output_format")
+        layout.prop(global_settings, "export_stl")
+        layout.prop(global_settings, "export_mode")
+        layout.prop(global_settings, "unified_grid")
+        layout.prop(global_settings, "chunked")
+        if global_settings.chunked:
+            layout.prop(global_settings, "memory_budget")
+        layout.prop(global_settings, "workers")
+        layout.prop(global_settings, "job_priority")
+        layout.prop(global_settings, "job_attempts")
+        layout.prop(global_settings, "use_cache")
+        layout.prop(global_settings, "cache_size")
         layout.separator()
 
 
@@ -75,6 +106,186 @@ class GlobalSettings(PropertyGroup):
 
     frequency: IntProperty(
         name="Frequency",
-        description="Frequency",
+        description="Frequency of the simulation source, in GHz",
         default=1
     )
+
+    sweep: BoolProperty(
+        name="Frequency sweep",
+        description="Run the simulation at every frequency of a range and write them to one file, the geometry being read once",
+        default=False
+    )
+
+    frequency_start: FloatProperty(
+        name="Start (GHz)",
+        description="First frequency of the sweep",
+        default=1,
+        min=0.001
+    )
+
+    frequency_stop: FloatProperty(
+        name="Stop (GHz)",
+        description="Last frequency of the sweep",
+        default=10,
+        min=0.001
+    )
+
+    frequency_step: FloatProperty(
+        name="Step (GHz)",
+        description="Frequency increment of the sweep",
+        default=1,
+        min=0.001
+    )
+
+    solver: EnumProperty(
+        name="Solver",
+        description="Simulation run on the selected file",
+        items=[
+            ('AVERAGES', "Averages", "Reduce groups of vertices"),
+            ('FDTD', "FDTD", "Time domain electromagnetic solver on a voxel grid or voxel OBJ file"),
+            ('FDFD', "FDFD", "Frequency domain electromagnetic solver on a voxel grid or voxel OBJ file"),
+        ],
+        default='AVERAGES'
+    )
+
+    time_steps: IntProperty(
+        name="Time steps",
+        description="Number of time steps of the FDTD solver",
+        default=1000,
+        min=1
+    )
+
+    use_probes: BoolProperty(
+        name="Record probes only",
+        description="Record the field at the empties and cem_probe planes inside the CubeScene instead of the whole domain",
+        default=False
+    )
+
+    probe_decimation: IntProperty(
+        name="Probe decimation",
+        description="Number of time steps between two records of the probes",
+        default=10,
+        min=1
+    )
+
+    fdfd_method: EnumProperty(
+        name="FDFD method",
+        description="Sparse solver of the FDFD operator",
+        items=[
+            ('DIRECT', "Direct", "Sparse LU factorization, reused for other sources at the same frequency"),
+            ('ITERATIVE', "Iterative", "GMRES preconditioned by an incomplete LU factorization, for larger grids"),
+        ],
+        default='DIRECT'
+    )
+
+    use_probe_sources: BoolProperty(
+        name="Probe sources",
+        description="Place a source at each empty and cem_probe plane inside the CubeScene, all of them solved with one factorization",
+        default=False
+    )
+
+    group_size: IntProperty(
+        name="Group size",
+        description="Number of consecutive vertices reduced into one row of the simulation output",
+        default=10,
+        min=1
+    )
+
+    reduction: EnumProperty(
+        name="Reduction",
+        description="Reduction of the coordinates of each group of vertices",
+        items=[
+            ('MEAN', "Mean", "Average of the coordinates"),
+            ('MAX', "Max", "Largest coordinates"),
+            ('RMS', "RMS", "Root mean square of the coordinates"),
+        ],
+        default='MEAN'
+    )
+
+    streaming: BoolProperty(
+        name="Streaming simulation",
+        description="Read, reduce and write the simulation data block by block, with a memory use independent of the file size",
+        default=False
+    )
+
+    output_format: EnumProperty(
+        name="Output format",
+        description="File format of the simulation results",
+        items=[
+            ('NPZ', "NumPy", "Binary NumPy archive"),
+            ('PARQUET', "Parquet", "Columnar Parquet file, needs pyarrow"),
+            ('FEATHER', "Feather", "Columnar Feather file, needs pyarrow"),
+            ('CSV', "CSV", "Text file, slower and larger"),
+        ],
+        default='NPZ'
+    )
+
+    export_stl: BoolProperty(
+        name="Export STL",
+        description="Export each object to an STL file before voxelization instead of reading the mesh in memory",
+        default=False
+    )
+
+    export_mode: EnumProperty(
+        name="Export mode",
+        description="Geometry written to the voxel OBJ files",
+        items=[
+            ('BOXES', "Boxes", "One closed box per voxel"),
+            ('SURFACE', "Surface", "Only the exposed voxel faces"),
+            ('GREEDY', "Greedy", "Exposed voxel faces merged into larger quads"),
+        ],
+        default='BOXES'
+    )
+
+    job_priority: IntProperty(
+        name="Job priority",
+        description="Priority of the simulation jobs submitted to the queue, higher ones run first",
+        default=0
+    )
+
+    job_attempts: IntProperty(
+        name="Job attempts",
+        description="Number of times a failing queued job is run before it is marked as failed",
+        default=3,
+        min=1
+    )
+
+    use_cache: BoolProperty(
+        name="Use cache",
+        description="Reuse the voxelization of objects whose geometry, voxel size and material did not change, and the results of simulations whose input and parameters did not change",
+        default=True
+    )
+
+    cache_size: IntProperty(
+        name="Cache size (MB)",
+        description="Size above which the least recently used cached voxelizations, or simulation results, are evicted",
+        default=1024,
+        min=0
+    )
+
+    workers: IntProperty(
+        name="Workers",
+        description="Number of worker processes used for voxelization, the FDTD solver and frequency sweeps, the work always running in at least one process apart from Blender",
+        default=1,
+        min=1,
+        max=256
+    )
+
+    chunked: BoolProperty(
+        name="Chunked voxelization",
+        description="Voxelize large objects brick by brick to bound the memory used",
+        default=False
+    )
+
+    memory_budget: IntProperty(
+        name="Memory budget (MB)",
+        description="Peak memory of a brick when voxelizing in chunks",
+        default=256,
+        min=1
+    )
+
+    unified_grid: BoolProperty(
+        name="Unified scene grid",
+        description="Voxelize all objects into one grid aligned on the CubeScene, storing a material id per voxel",
+        default=False
+    )
@@ -0,0 +1,90 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedArrays:
+    """
+    Allocator of arrays in shared memory blocks.
+
+    Arrays it allocates are pickled as a reference to their block, so
+    worker processes attach to the same memory instead of copying it.
+    """
+
+    def __init__(self):
+        self.blocks = []
+        self._handles = {}
+
+    def __call__(self, shape, dtype):
+        """
+        Returns a zeroed array in a new shared memory block.
+        """
+        size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        block = shared_memory.SharedMemory(create=True, size=size)
+        self.blocks.append(block)
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array[...] = 0
+        self._handles[id(array)] = _SharedHandle(block.name, shape, dtype)
+        return array
+
+    def handle(self, value):
+        # Replaces the shared arrays of nested containers by handles.
+        if isinstance(value, np.ndarray):
+            return self._handles.get(id(value), value)
+        if isinstance(value, dict):
+            return {key: self.handle(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return type(value)(self.handle(item) for item in value)
+        return value
+
+    def close(self):
+        """
+        Frees the shared memory blocks.
+        """
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+        self._handles = {}
+
+
+class _SharedHandle:
+    # Picklable reference to an array of a shared memory block.
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+
+    def attach(self, blocks):
+        block = shared_memory.SharedMemory(name=self.name)
+        blocks.append(block)
+        return np.ndarray(self.shape, dtype=self.dtype, buffer=block.buf)
+
+
+def attach(value, blocks):
+    """
+    Replaces the handles of nested containers by the shared arrays they
+    refer to.
+
+    Parameters
+    ----------
+    value : object
+        A handle, or a dict, list or tuple holding handles, as returned by
+        SharedArrays.handle.
+    blocks : list
+        The shared memory blocks attached are appended to it, they must be
+        kept open as long as the arrays are used.
+
+    Returns
+    -------
+    value : object
+        The value with every handle replaced by its array.
+    """
+    if isinstance(value, _SharedHandle):
+        return value.attach(blocks)
+    if isinstance(value, dict):
+        return {key: attach(item, blocks) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(attach(item, blocks) for item in value)
+    return value
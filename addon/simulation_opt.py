@@ -1,9 +1,187 @@
 import bpy
 import os
+import sqlite3
+import subprocess
+import sys
 
 from bpy_extras.io_utils import ImportHelper
-from .constants import SIMULATIONS_DIR
-from .simulations import run_simulation
+from .cache import FileCache, file_key
+from .constants import (CHECKPOINTS_DIR, JOBS_FILE, SIMULATION_CACHE_DIR,
+                        SIMULATIONS_DIR)
+from .jobs import JobQueue
+from .scene_opt import scene_probes
+from .simulations import (grid_key, latest_checkpoint, result_path,
+                          resume_simulation, simulate, simulate_sweep)
+from .task_opt import BackgroundOperator, draw_task
+from .tasks import DONE, TASKS, BackgroundTask
+
+
+# Number of cache entries and of jobs listed in the Simulation panel.
+CACHE_ENTRIES_SHOWN = 5
+JOBS_SHOWN = 5
+
+# Seconds between two refreshes of the state shown in the Simulation panel.
+REFRESH_INTERVAL = 2.0
+
+# State of the job queue, of the result cache and the latest checkpoint
+# shown in the Simulation panel, read from disk by refresh_simulation_state and not by the panel,
+# which is drawn often.
+PANEL_STATE = {}
+
+# Icons of the job statuses in the queue list.
+JOB_ICONS = {
+    'queued': 'SORTTIME',
+    'running': 'PLAY',
+    'done': 'CHECKMARK',
+    'failed': 'ERROR',
+    'cancelled': 'CANCEL',
+}
+
+
+def simulation_cache_directory():
+    """ Returns the directory of the simulation result cache, None if the blend file is not saved """
+
+    blend_directory = bpy.path.abspath("//")
+    if not blend_directory:
+        return None
+    return os.path.join(blend_directory, SIMULATION_CACHE_DIR)
+
+
+def uses_probes(settings):
+    """ Returns whether the simulation of the settings records its field at the probes, or places its sources there """
+
+    if settings.sweep:
+        return False
+    if settings.solver == 'FDTD':
+        return settings.use_probes
+    if settings.solver == 'FDFD':
+        return settings.use_probe_sources
+    return False
+
+
+def simulation_probes(context):
+    """ Returns the probes of the CubeScene when the simulation records probes only or uses them as sources, None otherwise """
+
+    settings = context.scene.settings
+    container = bpy.data.objects.get("CubeScene")
+    if not uses_probes(settings) or container is None:
+        return None
+    return scene_probes(container, settings.mesh_size) or None
+
+
+def simulation_parameters(settings, dimension, frequency, probes=None):
+    """ Returns the settings changing the result of a simulation, part of its cache key """
+
+    parameters = dict(dimension=dimension, solver=settings.solver,
+                      output_format=settings.output_format)
+    if settings.sweep:
+        parameters.update(sweep=[settings.frequency_start,
+                                 settings.frequency_stop,
+                                 settings.frequency_step])
+    else:
+        parameters.update(frequency=frequency)
+    if settings.solver == 'AVERAGES':
+        parameters.update(group_size=settings.group_size,
+                          reduction=settings.reduction)
+    elif settings.solver == 'FDTD':
+        parameters.update(time_steps=settings.time_steps)
+        if probes:
+            parameters.update(probes=probes,
+                              decimation=settings.probe_decimation)
+    elif settings.solver == 'FDFD':
+        parameters.update(fdfd_method=settings.fdfd_method)
+        if probes:
+            parameters.update(sources=probes)
+    return parameters
+
+
+def simulation_dimension(context):
+    """ Returns the dimension of the selected simulation type, None if it is not valid """
+
+    return {'UNIDIMENSIONAL': 1,
+            'BIDIMENSIONAL': 2,
+            'TRIDIMENSIONAL': 3}.get(context.scene.simulation_types)
+
+
+def simulation_job(context, dimension, blend_directory):
+    """ Returns the function name and the keyword arguments of a queued job running the simulation of the settings """
+
+    settings = context.scene.settings
+    path = bpy.path.abspath(context.scene.obj_file_path)
+    save_path = os.path.join(blend_directory, SIMULATIONS_DIR)
+    common = dict(dimension=dimension, path=path, save_path=save_path,
+                  group_size=settings.group_size, reduction=settings.reduction,
+                  output_format=settings.output_format, solver=settings.solver,
+                  time_steps=settings.time_steps, workers=settings.workers,
+                  fdfd_method=settings.fdfd_method)
+    if settings.sweep:
+        return 'simulate_sweep', dict(common, start=settings.frequency_start,
+                                      stop=settings.frequency_stop,
+                                      step=settings.frequency_step)
+    return 'simulate', dict(common, frequency=settings.frequency or 1,
+                            streaming=settings.streaming,
+                            checkpoint_dir=os.path.join(blend_directory, CHECKPOINTS_DIR),
+                            probes=simulation_probes(context),
+                            decimation=settings.probe_decimation)
+
+
+def jobs_file():
+    """ Returns the path of the job queue, None if the blend file is not saved """
+
+    blend_directory = bpy.path.abspath("//")
+    if not blend_directory:
+        return None
+    return os.path.join(blend_directory, JOBS_FILE)
+
+
+def refresh_jobs_state():
+    """ Reads the counts and the latest jobs of the queue into PANEL_STATE """
+
+    path = jobs_file()
+    if path is None or not os.path.isfile(path):
+        PANEL_STATE['jobs'] = None
+        return
+    try:
+        # Short timeout, a worker holding the lock is waited for on the next
+        # refresh instead.
+        with JobQueue(path, timeout=.1) as queue:
+            PANEL_STATE['jobs'] = (queue.counts(), queue.jobs(JOBS_SHOWN))
+    except sqlite3.OperationalError:
+        pass
+
+
+def refresh_cache_state():
+    """ Reads the entries and the size of the result cache into PANEL_STATE """
+
+    directory = simulation_cache_directory()
+    if directory is None or not os.path.isdir(directory):
+        PANEL_STATE['cache'] = None
+        return
+    cache = FileCache(directory, bpy.context.scene.settings.cache_size * 1024 * 1024)
+    PANEL_STATE['cache'] = (cache.entries(), cache.size)
+
+
+def refresh_checkpoint_state():
+    """ Finds the latest checkpoint of an interrupted simulation for PANEL_STATE """
+
+    blend_directory = bpy.path.abspath("//")
+    PANEL_STATE['checkpoint'] = latest_checkpoint(
+        os.path.join(blend_directory, CHECKPOINTS_DIR)) if blend_directory else None
+
+
+def refresh_simulation_state():
+    """ Refreshes PANEL_STATE and redraws the panels if it changed, runs on a timer and returns the delay before the next call """
+
+    previous = dict(PANEL_STATE)
+    refresh_jobs_state()
+    refresh_cache_state()
+    refresh_checkpoint_state()
+    if PANEL_STATE != previous:
+        for window in bpy.context.window_manager.windows:
+            for area in window.screen.areas:
+                if area.type == 'VIEW_3D':
+                    area.tag_redraw()
+    return REFRESH_INTERVAL
 
 
 class OBJECT_PT_simulation_section(bpy.types.Panel):
@@ -51,10 +229,70 @@ class OBJECT_PT_simulation_section(bpy.types.Panel):
                 'simulation.run_simulation',
                 text="Run Simulation",
                 icon='PLAY')
+            row.operator(
+                'simulation.submit_job',
+                text="Queue",
+                icon='ADD')
         else:
             row = layout.row()
             row.label(text=f'No file selected.')
 
+        draw_task(layout, SIMULATION_OT_execute_simulation.task_name)
+        self.draw_checkpoint_section(context, layout)
+        self.draw_jobs_section(context, layout)
+        self.draw_cache_section(context, layout)
+
+    def draw_jobs_section(self, context, layout):
+        """ Draw the status of the job queue """
+
+        if PANEL_STATE.get('jobs') is None:
+            return
+        counts, jobs = PANEL_STATE['jobs']
+
+        row = layout.row()
+        row.label(
+            text=f"Jobs: {counts['queued']} queued, {counts['running']} running, "
+                 f"{counts['done']} done, {counts['failed']} failed",
+            icon='SEQ_STRIP_DUPLICATE')
+        row.operator('simulation.start_worker', text="", icon='PLAY')
+
+        col = layout.column(align=True)
+        for job in jobs:
+            col.label(text=f"{job['id']}: {job['label']} ({job['attempts']}/{job['max_attempts']})",
+                      icon=JOB_ICONS.get(job['status'], 'QUESTION'))
+
+    def draw_checkpoint_section(self, context, layout):
+        """ Draw the Resume button of the latest interrupted simulation """
+
+        checkpoint = PANEL_STATE.get('checkpoint')
+        if checkpoint is None or SIMULATION_OT_execute_simulation.task_name in TASKS:
+            return
+        row = layout.row()
+        row.label(text=f'Interrupted: {os.path.basename(checkpoint)}', icon='RECOVER_LAST')
+        row.operator('simulation.resume_simulation', text="Resume", icon='PLAY')
+
+    def draw_cache_section(self, context, layout):
+        """ Draw the entries of the simulation result cache """
+
+        if PANEL_STATE.get('cache') is None:
+            return
+        entries, size = PANEL_STATE['cache']
+
+        row = layout.row()
+        row.label(
+            text=f'Result cache: {len(entries)} entries, {size / (1024 * 1024):.1f} MB',
+            icon='FILE_CACHE')
+        row.operator('simulation.clear_cache', text="", icon='TRASH')
+
+        # Most recently used entries first, named after the result files.
+        col = layout.column(align=True)
+        for entry in entries[:CACHE_ENTRIES_SHOWN]:
+            names = ', '.join(os.path.basename(target)
+                              for target in entry.get("targets", {}))
+            col.label(text=f'{names or entry["key"][:12]} ({entry["size"] / 1024:.0f} kB)')
+        if len(entries) > CACHE_ENTRIES_SHOWN:
+            col.label(text=f'... {len(entries) - CACHE_ENTRIES_SHOWN} more')
+
 
 class SIMULATION_OT_open_filebrowser(bpy.types.Operator, ImportHelper):
     """
@@ -68,7 +306,8 @@ class SIMULATION_OT_open_filebrowser(bpy.types.Operator, ImportHelper):
     # filepath prop to store the user-selected file path.
     filepath = bpy.props.StringProperty(subtype="FILE_PATH")
 
-    filter_glob: bpy.props.StringProperty(default="*.obj", options={'HIDDEN'})
+    filter_glob: bpy.props.StringProperty(
+        default="*.obj;*.npz", options={'HIDDEN'})
 
     def invoke(self, context, event):
         """ Opens the file browser."""
@@ -84,14 +323,16 @@ class SIMULATION_OT_open_filebrowser(bpy.types.Operator, ImportHelper):
         return {'FINISHED'}
 
 
-class SIMULATION_OT_execute_simulation(bpy.types.Operator):
+class SIMULATION_OT_execute_simulation(BackgroundOperator, bpy.types.Operator):
     """ Operator to handle the action of running the simulation. """
 
     bl_idname = "simulation.run_simulation"
     bl_label = "Run Simulation"
 
-    def execute(self, context):
-        """ Runs the simulation """
+    task_name = "Simulation"
+
+    def prepare(self, context):
+        """ Returns the task running the simulation in a worker process """
 
         blend_directory = bpy.path.abspath("//")
 
@@ -113,17 +354,21 @@ class SIMULATION_OT_execute_simulation(bpy.types.Operator):
 
         # Add simulation execution code here
         print(f'Simulating: {context.scene.obj_file_path}')
-        save_path = os.path.join(blend_directory, SIMULATIONS_DIR)
+        self.save_path = os.path.join(blend_directory, SIMULATIONS_DIR)
+
+        frequency = context.scene.settings.frequency
+        if frequency is None:
+            frequency = 1
 
         # Executes the appropriate simulation based on user selection.
         if (context.scene.simulation_types == 'UNIDIMENSIONAL'):
-            run_simulation(1, context, context.scene.obj_file_path, save_path)
+            dimension = 1
 
         elif (context.scene.simulation_types == 'BIDIMENSIONAL'):
-            run_simulation(2, context, context.scene.obj_file_path, save_path)
+            dimension = 2
 
         elif (context.scene.simulation_types == 'TRIDIMENSIONAL'):
-            run_simulation(3, context, context.scene.obj_file_path, save_path)
+            dimension = 3
 
         else:
             self.report(
@@ -131,7 +376,210 @@ class SIMULATION_OT_execute_simulation(bpy.types.Operator):
                 "Invalid simulation type. Please select a valid simulation type.")
             return {'CANCELLED'}
 
+        settings = context.scene.settings
+        task = BackgroundTask()
+        if settings.sweep:
+            if settings.frequency_stop < settings.frequency_start:
+                self.report(
+                    {'ERROR'}, "The sweep stop frequency is below its start frequency")
+                return {'CANCELLED'}
+
+        # Results of an unchanged input with the same parameters are restored
+        # from the cache instead of being computed again.
+        self.cache = None
+        self.key = None
+        probes = simulation_probes(context)
+        if uses_probes(settings) and not probes:
+            if settings.solver == 'FDTD':
+                self.report(
+                    {'WARNING'}, "No probes in the CubeScene, the whole domain is recorded.")
+            else:
+                self.report(
+                    {'WARNING'}, "No probes in the CubeScene, a single source is used.")
+        self.result_file = result_path(
+            dimension, context.scene.obj_file_path, self.save_path,
+            settings.output_format, settings.solver, sweep=settings.sweep,
+            probes=bool(probes) and settings.solver == 'FDTD')
+        if settings.use_cache and os.path.isfile(context.scene.obj_file_path):
+            self.cache = FileCache(simulation_cache_directory(),
+                                   settings.cache_size * 1024 * 1024)
+            # Field solvers read the grid written next to a voxel OBJ file,
+            # or its material, rather than the OBJ file alone.
+            key = file_key if settings.solver == 'AVERAGES' else grid_key
+            self.key = key(context.scene.obj_file_path,
+                           **simulation_parameters(settings, dimension, frequency, probes))
+            if self.cache.get(self.key, [self.result_file]):
+                return task
+
+        if settings.sweep:
+            task.add(os.path.basename(context.scene.obj_file_path),
+                     simulate_sweep, dimension, context.scene.obj_file_path,
+                     self.save_path, settings.frequency_start,
+                     settings.frequency_stop, settings.frequency_step,
+                     settings.group_size, settings.reduction,
+                     settings.output_format, settings.solver,
+                     settings.time_steps, settings.workers,
+                     settings.fdfd_method)
+            return task
+
+        task.add(os.path.basename(context.scene.obj_file_path), simulate,
+                 dimension, context.scene.obj_file_path, self.save_path,
+                 frequency, context.scene.settings.group_size,
+                 context.scene.settings.reduction,
+                 context.scene.settings.streaming,
+                 context.scene.settings.output_format,
+                 context.scene.settings.solver,
+                 context.scene.settings.time_steps,
+                 context.scene.settings.workers,
+                 context.scene.settings.fdfd_method,
+                 os.path.join(blend_directory, CHECKPOINTS_DIR),
+                 probes, context.scene.settings.probe_decimation)
+        return task
+
+    def finish(self, context):
+        """ Stores the result in the cache and reports the end of the simulation """
+
+        refresh_checkpoint_state()
+        if self.task.failed:
+            return {'CANCELLED'}
+
+        if self.cache is not None:
+            refresh_cache_state()
+            if not self.task.items:
+                self.report(
+                    {'INFO'}, f'Simulation result restored from the cache: {self.result_file}')
+                return {'FINISHED'}
+            item = self.task.items[0]
+            if item.status == DONE and item.result:
+                self.cache.put(self.key, [item.result])
+                refresh_cache_state()
+
+        self.report(
+            {'INFO'},
+            f'Simulation on {os.path.basename(context.scene.obj_file_path)} completed successfully. Files saved to {self.save_path}')
+        return {'FINISHED'}
+
+
+class SIMULATION_OT_resume_simulation(BackgroundOperator, bpy.types.Operator):
+    """ Operator to continue the latest interrupted simulation from its checkpoint. """
+
+    bl_idname = "simulation.resume_simulation"
+    bl_label = "Resume Simulation"
+
+    task_name = SIMULATION_OT_execute_simulation.task_name
+
+    def prepare(self, context):
+        """ Returns the task resuming the simulation in a worker process """
+
+        blend_directory = bpy.path.abspath("//")
+        self.checkpoint = latest_checkpoint(os.path.join(blend_directory, CHECKPOINTS_DIR))
+        if not blend_directory or self.checkpoint is None:
+            self.report({'WARNING'}, "No interrupted simulation to resume.")
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, f'Resuming {os.path.basename(self.checkpoint)} ...')
+        task = BackgroundTask()
+        task.add(os.path.basename(self.checkpoint), resume_simulation, self.checkpoint)
+        return task
+
+    def finish(self, context):
+        """ Reports the end of the resumed simulation """
+
+        refresh_checkpoint_state()
+        if self.task.failed:
+            return {'CANCELLED'}
+
         self.report(
             {'INFO'},
-            f'Simulation on {os.path.basename(context.scene.obj_file_path)} completed successfully. Files saved to {save_path}')
+            f'Simulation resumed from {os.path.basename(self.checkpoint)} completed successfully. Results saved to {self.task.items[0].result}')
+        return {'FINISHED'}
+
+
+class SIMULATION_OT_submit_job(bpy.types.Operator):
+    """ Operator to add the simulation of the settings to the job queue. """
+
+    bl_idname = "simulation.submit_job"
+    bl_label = "Queue Simulation"
+
+    def execute(self, context):
+        """ Submits the job and returns at once, a worker runs it """
+
+        blend_directory = bpy.path.abspath("//")
+        if not blend_directory:
+            self.report(
+                {'ERROR'}, "Blend file not saved, Please open an existing blend file or save the current blend file")
+            return {'CANCELLED'}
+
+        if not context.scene.obj_file_path:
+            self.report(
+                {'WARNING'},
+                "No .obj file selected. Please select a file to simulate.")
+            return {'CANCELLED'}
+
+        dimension = simulation_dimension(context)
+        if dimension is None:
+            self.report(
+                {'ERROR'},
+                "Invalid simulation type. Please select a valid simulation type.")
+            return {'CANCELLED'}
+
+        settings = context.scene.settings
+        function, arguments = simulation_job(context, dimension, blend_directory)
+        label = f"{os.path.basename(arguments['path'])} {dimension}D {settings.solver.lower()}"
+        with JobQueue(jobs_file()) as queue:
+            job_id = queue.submit(function, arguments, label=label,
+                                  priority=settings.job_priority,
+                                  max_attempts=settings.job_attempts)
+        refresh_jobs_state()
+        self.report({'INFO'}, f"Job {job_id} queued: {label}")
+        return {'FINISHED'}
+
+
+class SIMULATION_OT_start_worker(bpy.types.Operator):
+    """ Operator to start a worker daemon running the jobs of the queue. """
+
+    bl_idname = "simulation.start_worker"
+    bl_label = "Start Job Worker"
+
+    def execute(self, context):
+        """ Starts the worker in its own process, it keeps running after Blender closes """
+
+        path = jobs_file()
+        if path is None:
+            self.report(
+                {'ERROR'}, "Blend file not saved, Please open an existing blend file or save the current blend file")
+            return {'CANCELLED'}
+
+        # The worker imports the add-on as a package, from the folder
+        # holding it.
+        package_directory = os.path.dirname(os.path.abspath(__file__))
+        log = open(os.path.splitext(path)[0] + ".log", "a")
+        subprocess.Popen(
+            [sys.executable, "-m", f"{__package__}.jobs", "worker", path,
+             "-j", str(context.scene.settings.workers)],
+            cwd=os.path.dirname(package_directory), stdout=log,
+            stderr=subprocess.STDOUT, start_new_session=True)
+        log.close()
+        self.report({'INFO'}, f"Job worker started on {path}")
+        return {'FINISHED'}
+
+
+class SIMULATION_OT_clear_cache(bpy.types.Operator):
+    """ Operator to remove every entry of the simulation result cache. """
+
+    bl_idname = "simulation.clear_cache"
+    bl_label = "Clear Result Cache"
+
+    def execute(self, context):
+        """ Clears the cache and reports the space freed """
+
+        directory = simulation_cache_directory()
+        if directory is None or not os.path.isdir(directory):
+            return {'CANCELLED'}
+
+        cache = FileCache(directory, context.scene.settings.cache_size * 1024 * 1024)
+        size = cache.size
+        cache.clear()
+        refresh_cache_state()
+        self.report({'INFO'}, f'Simulation cache cleared, {size / (1024 * 1024):.1f} MB freed')
         return {'FINISHED'}
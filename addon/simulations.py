@@ -1,55 +1,95 @@
 import os
+import time
+import numpy as np
 
+from .constants import (CHECKPOINT_EXTENSION, FREQUENCY_UNIT, GRID_EXTENSION,
+                        SPARSE_EXTENSION)
+from . import fdfd, sweep
+from .cache import file_key
+from .fdtd import Checkpoint, read_checkpoint, record, solve
+from .obj_io import iter_vertices, read_faces, read_vertices
+from .probes import DECIMATION, write_probes
+from .results import RESULT_EXTENSIONS, ResultWriter
+from .sparse import BrickMap, sparse_path
+from .voxel_grid import OccupancyGrid, grid_path, obj_material_file
 
-def parse_file(path):
+# Default number of consecutive vertices reduced into one row.
+GROUP_SIZE = 10
+
+# Reductions applied to the coordinates of each group of vertices.
+REDUCTIONS = ('MEAN', 'MAX', 'RMS')
+
+# Number of rows read or written at once by the streaming pipeline.
+STREAM_ROWS = 1 << 16
+
+
+def parse_file(path, faces=False):
     """
     Parses a file from the given path and extracts the vertex data.
-    It returns the vertices as a list of lists, where each inner list represents a vertex and contains its coordinates.
+    It returns the vertices as a contiguous (N, 3) float array, read in large blocks by the NumPy parser of obj_io.
+    With faces, it returns a tuple of the vertices and the (M, 3) zero based face indices.
 
     If the path does not point to a file, it returns None.
     """
 
     # Check if the given path points to a file
-    vertices = []
     if (os.path.isfile(path) == False):
         return None
 
-    # Open the file and iterate over its lines
-    with open(path, 'r') as f:
-        for line in f:
-            # Split the line into tokens
-            tokens = line.split()
-
-            # If tokens were found and the first one is 'v',
-            # this line contains vertex data, so we parse the coordinates
-            if tokens and tokens[0] == 'v':
-                # Append the coordinates of the vertex to the vertices list
-                vertices.append([float(x) for x in tokens[1:]])
+    vertices = read_vertices(path)
+    if faces:
+        return vertices, read_faces(path)
     return vertices
 
 
-def averages(vertices, dimension, frequency=1):
+def parse_grid(path):
+    """
+    Loads a binary voxel grid or brick map from the given path and returns the centers of its occupied voxels.
+    The centers are returned as an (N, 3) array, in the same order as the grid.
+
+    If the path does not point to a file, it returns None.
+    """
+
+    if (os.path.isfile(path) == False):
+        return None
+    if path.endswith(SPARSE_EXTENSION):
+        return BrickMap.load(path).points()
+    return OccupancyGrid.load(path).points()
+
+
+def averages(vertices, dimension, frequency=1, group_size=GROUP_SIZE,
+             reduction='MEAN'):
     """
-    Groups the vertices into sublists of size 10 and calculates the average coordinates for each group.
-    Returns a list of the averages.
+    Groups consecutive vertices by group_size and reduces the coordinates of each group, scaled by the frequency.
+    The last group holds the remaining vertices when their number is not a multiple of group_size.
+    Returns an (N, dimension) array of the reduced groups.
+
+    The reduction is one of REDUCTIONS: 'MEAN', 'MAX' or 'RMS' (root mean square).
     """
 
-    group_size = 10
+    if reduction not in REDUCTIONS:
+        raise ValueError(f"Unknown reduction: {reduction}")
+    if group_size < 1:
+        raise ValueError("group_size must be at least 1")
 
-    # Split the vertices into groups of 10
-    groups = [vertices[i: i + group_size]
-              for i in range(0, len(vertices), group_size)]
-    group_avgs = []
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    vertices = vertices[:, :dimension]
+    if len(vertices) == 0:
+        return np.empty((0, dimension))
 
-    # Iterate over each group
-    for group in groups:
-        avg = [0] * dimension
-        for vertex in group:
-            for i in range(dimension):
-                avg[i] += vertex[i]
-        avg = [a / len(group) * frequency for a in avg]
-        group_avgs.append(avg)
-    return group_avgs
+    # First vertex and size of each group, the last one may be smaller.
+    starts = np.arange(0, len(vertices), group_size)
+    sizes = np.diff(np.append(starts, len(vertices)))[:, None]
+
+    if reduction == 'MEAN':
+        groups = np.add.reduceat(vertices, starts, axis=0) / sizes
+    elif reduction == 'MAX':
+        groups = np.maximum.reduceat(vertices, starts, axis=0)
+    else:
+        groups = np.sqrt(
+            np.add.reduceat(vertices * vertices, starts, axis=0) / sizes)
+    groups *= frequency
+    return groups
 
 
 def write_to_file(filename, data, headers):
@@ -64,11 +104,129 @@ def write_to_file(filename, data, headers):
             f.write(','.join(str(x) for x in row) + '\n')
 
 
+def iter_vertex_blocks(path, rows=STREAM_ROWS):
+    """
+    Yields the vertices of an OBJ file, or the voxel centers of a grid or brick map, as (N, 3) blocks.
+    OBJ files are read in blocks of bytes, so the memory used does not depend on the size of the file.
+    """
+
+    if path.endswith(SPARSE_EXTENSION):
+        yield from BrickMap.load(path).iter_points(rows)
+    elif path.endswith(GRID_EXTENSION):
+        yield from OccupancyGrid.load(path).iter_points(rows)
+    else:
+        yield from iter_vertices(path)
+
+
+def iter_groups(blocks, dimension, frequency=1, group_size=GROUP_SIZE,
+                reduction='MEAN'):
+    """
+    Reduces a stream of vertex blocks group by group, as averages does on the whole array.
+    Each block yields the groups it completes, the vertices of an incomplete group are carried over to the next block.
+    """
+
+    rest = None
+    for block in blocks:
+        if rest is not None and len(rest):
+            block = np.concatenate((rest, block))
+        full = len(block) - len(block) % group_size
+        if full:
+            yield averages(block[:full], dimension, frequency,
+                           group_size=group_size, reduction=reduction)
+        rest = block[full:]
+    if rest is not None and len(rest):
+        yield averages(rest, dimension, frequency,
+                       group_size=group_size, reduction=reduction)
+
+
+def write_rows(filename, blocks, headers, chunk_rows=STREAM_ROWS,
+               metadata=None):
+    """
+    Writes a stream of row blocks, with the given comma separated headers as column names.
+    The format is given by the extension of the filename, see results.RESULT_EXTENSIONS.
+    Rows are written and flushed every chunk_rows rows, so the first results are on disk while the next ones are computed.
+    Returns the number of rows written.
+    """
+
+    with ResultWriter(filename, headers.split(','), metadata) as writer:
+        pending = []
+        count = 0
+        for block in blocks:
+            pending.append(block)
+            count += len(block)
+            if count >= chunk_rows:
+                writer.write(np.concatenate(pending))
+                writer.flush()
+                pending = []
+                count = 0
+        if count:
+            writer.write(np.concatenate(pending))
+        return writer.count
+
+
+def result_path(dimension, path, save_path, output_format='NPZ',
+                solver='AVERAGES', sweep=False, probes=False):
+    """
+    Returns the path of the result file of a simulation of the file at path, named after the file, the dimension and the solver.
+    Probe records are always written as an npz archive, see probes.write_probes.
+    """
+
+    suffix = '' if solver == 'AVERAGES' else '-' + solver.lower()
+    if sweep:
+        suffix += '-sweep'
+    extension = RESULT_EXTENSIONS[output_format]
+    if probes:
+        suffix += '-probes'
+        extension = '.npz'
+    filename = os.path.basename(path)
+    return f'{save_path}/{filename}{dimension}-dimension{suffix}{extension}'
+
+
 def run_simulation(dimension, context, path, save_path):
     """
     Runs a simulation that parses vertex data from a file, calculates averages and writes them to a CSV file.
     """
 
+    settings = context.scene.settings
+    freq = settings.frequency
+    if freq is None:
+        freq = 1
+    return simulate(dimension, path, save_path, freq,
+                    group_size=settings.group_size,
+                    reduction=settings.reduction,
+                    streaming=settings.streaming,
+                    output_format=settings.output_format,
+                    solver=settings.solver,
+                    time_steps=settings.time_steps,
+                    workers=settings.workers,
+                    fdfd_method=settings.fdfd_method)
+
+
+def simulate(dimension, path, save_path, frequency=1, group_size=GROUP_SIZE,
+             reduction='MEAN', streaming=False, output_format='NPZ',
+             solver='AVERAGES', time_steps=1000, workers=1,
+             fdfd_method='DIRECT', checkpoint_dir=None, probes=None,
+             decimation=DECIMATION):
+    """
+    Runs the simulation without Blender, so it can run in a worker process.
+    Returns the path of the written result file, or None if the input file does not exist.
+
+    With streaming, the vertices are read, reduced and written block by block, so the memory used stays the same whatever the size of the input.
+    The output_format is a key of results.RESULT_EXTENSIONS, binary formats keep the parameters of the simulation as metadata.
+    The 'FDTD' solver runs time_steps steps of the FDTD engine on a voxel grid file, with a source at frequency GHz, see simulate_fdtd. Its state is checkpointed to checkpoint_dir, if given, so the run can be resumed.
+    With probes, it only records the field at the probes every decimation steps, see simulate_fdtd.
+    The 'FDFD' solver computes the steady state field at that frequency with the fdfd_method sparse solver, see simulate_fdfd. With probes, it places a source at each of them instead.
+    """
+
+    if solver == 'FDTD':
+        return simulate_fdtd(dimension, path, save_path, frequency,
+                             time_steps, output_format, workers,
+                             checkpoint_dir, probes=probes,
+                             decimation=decimation)
+    if solver == 'FDFD':
+        return simulate_fdfd(dimension, path, save_path, frequency,
+                             fdfd_method, output_format, sources=probes)
+
     if dimension == 1:
         header = 'x'
     elif dimension == 2:
@@ -77,11 +235,232 @@ def run_simulation(dimension, context, path, save_path):
         header = 'x,y,z'
 
     filename = os.path.basename(path)
-    vertices = parse_file(path)
-    if (vertices is not None):
-        freq = context.scene.settings.frequency
-        if freq is None:
-            freq = 1
-        avgs = averages(vertices, dimension, freq)
-        file_path = f'{save_path}/{filename}{dimension}-dimension.csv'
-        write_to_file(file_path, avgs, header)
+    file_path = result_path(dimension, path, save_path, output_format)
+    metadata = {'source': filename, 'dimension': dimension,
+                'frequency': frequency, 'group_size': group_size,
+                'reduction': reduction}
+
+    if (os.path.isfile(path) == False):
+        return None
+
+    if streaming:
+        groups = iter_groups(iter_vertex_blocks(path), dimension, frequency,
+                             group_size=group_size, reduction=reduction)
+        write_rows(file_path, groups, header, metadata=metadata)
+        return file_path
+
+    if path.endswith((GRID_EXTENSION, SPARSE_EXTENSION)):
+        vertices = parse_grid(path)
+    else:
+        vertices = parse_file(path)
+    avgs = averages(vertices, dimension, frequency,
+                    group_size=group_size, reduction=reduction)
+    write_rows(file_path, [avgs], header, metadata=metadata)
+    return file_path
+
+
+def grid_files(path):
+    """
+    Returns the files load_grid reads for the given path.
+    For a voxel OBJ file, they are the grid or brick map file written next to it, or, for OBJ files exported without one, the OBJ file and its mtl file.
+    """
+
+    if not path.endswith(".obj"):
+        return [path]
+    for grid_file in (grid_path(path), sparse_path(path)):
+        if os.path.isfile(grid_file):
+            return [grid_file]
+    mtl_file = obj_material_file(path)
+    return [path] if mtl_file is None else [path, mtl_file]
+
+
+def grid_key(path, **params):
+    """
+    Returns the cache key of the grid load_grid reads for the given path and the parameters.
+    It hashes the content of every file given by grid_files, so regenerating the grid or changing the material changes the key.
+    """
+
+    return file_key(grid_files(path), **params)
+
+
+def load_grid(path, solver):
+    """
+    Loads the occupancy grid of a voxel grid or brick map file for a field solver.
+    A voxel OBJ file is read through the grid file written next to it, or, for OBJ files exported without one, rebuilt from its boxes by OccupancyGrid.from_obj, see grid_files.
+    """
+
+    if path.endswith(".obj"):
+        path = grid_files(path)[0]
+        if path.endswith(".obj"):
+            return OccupancyGrid.from_obj(path)
+    if not path.endswith((GRID_EXTENSION, SPARSE_EXTENSION)):
+        raise ValueError(
+            f"The {solver} solver needs a voxel .obj, {GRID_EXTENSION} or {SPARSE_EXTENSION} file")
+    if path.endswith(SPARSE_EXTENSION):
+        return BrickMap.load(path).to_grid()
+    return OccupancyGrid.load(path)
+
+
+def simulate_fdtd(dimension, path, save_path, frequency=1, time_steps=1000,
+                  output_format='NPZ', workers=1, checkpoint_dir=None,
+                  resume=False, probes=None, decimation=DECIMATION):
+    """
+    Runs the FDTD solver on a voxel grid or brick map file and writes the peak electric field magnitude of every cell.
+    The frequency is in GHz and the voxel size of the grid in meters.
+    With several workers, the domain is split into slabs updated by as many processes, with the same results.
+    With a checkpoint_dir, the state of the fields is saved there periodically, within a few percent of the run time, and removed once the results are written.
+    With resume, the run continues from that checkpoint when it exists, see resume_simulation.
+    With probes, a list of dicts with the 'name', 'kind' and 'points' of each probe, only the electric field of the cells of the probes is recorded, every decimation steps, and written to a '-probes' npz file instead of the whole domain.
+    Returns the path of the written result file, or None if the input file does not exist.
+    """
+
+    if (os.path.isfile(path) == False):
+        return None
+
+    file_path = result_path(dimension, path, save_path, output_format, 'FDTD',
+                            probes=bool(probes))
+    checkpoint = None
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        arguments = {'dimension': dimension, 'path': path,
+                     'save_path': save_path, 'frequency': frequency,
+                     'time_steps': time_steps, 'output_format': output_format,
+                     'workers': workers, 'probes': probes,
+                     'decimation': decimation}
+        checkpoint = Checkpoint(
+            os.path.join(checkpoint_dir,
+                         os.path.basename(file_path) + CHECKPOINT_EXTENSION),
+            metadata={'arguments': arguments})
+
+    grid = load_grid(path, 'FDTD')
+    if probes:
+        points, owners, times, values, stats = record(
+            grid, dimension, frequency * FREQUENCY_UNIT, time_steps, probes,
+            decimation, workers=workers, checkpoint=checkpoint, resume=resume)
+    else:
+        points, amplitude, stats = solve(grid, dimension,
+                                         frequency * FREQUENCY_UNIT,
+                                         time_steps, workers=workers,
+                                         checkpoint=checkpoint, resume=resume)
+
+    filename = os.path.basename(path)
+    metadata = {'source': filename, 'dimension': dimension,
+                'frequency': frequency, 'solver': 'FDTD', 'stats': stats}
+    if probes:
+        metadata['decimation'] = decimation
+        write_probes(file_path, probes, points, owners, times, values,
+                     metadata)
+    else:
+        header = ','.join('xyz'[:dimension]) + ',e'
+        write_rows(file_path, [np.column_stack((points, amplitude))], header,
+                   metadata=metadata)
+    if checkpoint is not None and os.path.isfile(checkpoint.path):
+        os.remove(checkpoint.path)
+    return file_path
+
+
+def resume_simulation(checkpoint_file):
+    """
+    Continues the FDTD run saved in a checkpoint file, with the arguments it was started with, and writes its results.
+    Returns the path of the written result file, or None if the input file no longer exists.
+    """
+
+    arguments = read_checkpoint(checkpoint_file)['arguments']
+    return simulate_fdtd(checkpoint_dir=os.path.dirname(checkpoint_file),
+                         resume=True, **arguments)
+
+
+def latest_checkpoint(checkpoint_dir):
+    """
+    Returns the most recently written checkpoint file of a directory, or None if there is none.
+    """
+
+    if not os.path.isdir(checkpoint_dir):
+        return None
+    files = [os.path.join(checkpoint_dir, name)
+             for name in os.listdir(checkpoint_dir)
+             if name.endswith(CHECKPOINT_EXTENSION)]
+    if not files:
+        return None
+    return max(files, key=os.path.getmtime)
+
+
+def simulate_fdfd(dimension, path, save_path, frequency=1, method='DIRECT',
+                  output_format='NPZ', sources=None):
+    """
+    Runs the FDFD solver on a voxel grid or brick map file and writes the electric field magnitude of every cell at the frequency, in GHz.
+    Without sources, the field is the one of a single source as in the FDTD solver, in the column 'e'.
+    With sources, a list of dicts with the 'name', 'kind' and 'points' of probes, a source is spread over the cells of each probe and all of them are solved with a single factorization, the field of each one in a column 'e_' followed by its name.
+    The stats of the metadata tell whether the 'ITERATIVE' method fell back to the complete factorization, see fdfd.FDFD.fallback.
+    Returns the path of the written result file, or None if the input file does not exist.
+    """
+
+    if (os.path.isfile(path) == False):
+        return None
+
+    grid = load_grid(path, 'FDFD')
+    start = time.perf_counter()
+    cells = None
+    if sources:
+        cells = fdfd.probe_sources(grid, dimension, sources)
+    points, magnitude, stats = fdfd.solve(grid, dimension,
+                                          frequency * FREQUENCY_UNIT,
+                                          sources=cells, method=method)
+    stats.update(cells=len(points), method=method,
+                 seconds=time.perf_counter() - start)
+
+    filename = os.path.basename(path)
+    file_path = result_path(dimension, path, save_path, output_format, 'FDFD')
+    header = ','.join('xyz'[:dimension])
+    if sources:
+        header += ''.join(',e_' + source['name'] for source in sources)
+    else:
+        header += ',e'
+    metadata = {'source': filename, 'dimension': dimension,
+                'frequency': frequency, 'solver': 'FDFD', 'stats': stats}
+    write_rows(file_path, [np.column_stack((points, magnitude))],
+               header, metadata=metadata)
+    return file_path
+
+
+def simulate_sweep(dimension, path, save_path, start=1, stop=10, step=1,
+                   group_size=GROUP_SIZE, reduction='MEAN',
+                   output_format='NPZ', solver='AVERAGES', time_steps=1000,
+                   workers=1, fdfd_method='DIRECT'):
+    """
+    Runs the simulation at every frequency from start to stop by step, in GHz, and writes all of them to one result file with the frequency as first column 'f'.
+    The file is parsed, or the grid loaded, only once and shared read only with workers processes evaluating the frequencies concurrently.
+    Rows are written frequency by frequency, in the order of the sweep.
+    Returns the path of the written result file, or None if the input file does not exist.
+    """
+
+    if (os.path.isfile(path) == False):
+        return None
+
+    frequencies = sweep.frequencies(start, stop, step)
+    header = 'f,' + ','.join('xyz'[:dimension])
+    if solver == 'AVERAGES':
+        if path.endswith((GRID_EXTENSION, SPARSE_EXTENSION)):
+            vertices = parse_grid(path)
+        else:
+            vertices = parse_file(path)
+        geometry = {'vertices': vertices}
+    else:
+        grid = load_grid(path, solver)
+        geometry = {'labels': grid.labels, 'origin': grid.origin,
+                    'pitch': grid.pitch, 'materials': grid.materials}
+        header += ',e'
+
+    options = {'solver': solver, 'dimension': dimension,
+               'group_size': group_size, 'reduction': reduction,
+               'time_steps': time_steps, 'fdfd_method': fdfd_method}
+    filename = os.path.basename(path)
+    file_path = result_path(dimension, path, save_path, output_format, solver,
+                            sweep=True)
+    metadata = {'source': filename, 'dimension': dimension,
+                'solver': solver, 'frequencies': frequencies.tolist(),
+                'group_size': group_size, 'reduction': reduction}
+
+    write_rows(file_path, sweep.run(geometry, frequencies, options, workers),
+               header, metadata=metadata)
+    return file_path
@@ -0,0 +1,271 @@
+import json
+import numpy as np
+
+from .constants import SPARSE_EXTENSION
+from .voxel_grid import BACKGROUND_MATERIAL, OccupancyGrid, to_jsonable
+
+# Edge length in voxels of the bricks of a BrickMap.
+BRICK = 8
+
+# Offsets of the six face neighbours of a voxel.
+NEIGHBOURS = np.array([[1, 0, 0], [-1, 0, 0], [0, 1, 0],
+                       [0, -1, 0], [0, 0, 1], [0, 0, -1]])
+
+
+def sparse_path(obj_file):
+    """
+    Returns the path of the brick map file written next to a voxel OBJ file.
+    """
+    return f"{obj_file.rsplit('.obj', 1)[0]}{SPARSE_EXTENSION}"
+
+
+class BrickMap:
+    """
+    Sparse voxel grid storing dense bricks only where voxels are occupied.
+
+    Voxels hold a material id, 0 meaning empty, as in OccupancyGrid. The
+    grid is split into bricks of BRICK^3 voxels kept in a dictionary keyed on
+    the brick coordinates, so memory grows with the occupied volume rather
+    than with the extent of the grid.
+    """
+
+    def __init__(self, pitch, origin=(0, 0, 0), materials=None, dtype=np.uint8):
+        """
+        Parameters
+        ----------
+        pitch : float
+            Edge length of a voxel.
+        origin : array_like
+            World position of the center of voxel (0, 0, 0).
+        materials : list of dict
+            Properties of each material id.
+        dtype : numpy.dtype
+            Integer type of the material ids.
+        """
+        self.pitch = float(pitch)
+        self.origin = np.asarray(origin, dtype=np.float64).reshape(3)
+        if materials is None:
+            materials = [dict(BACKGROUND_MATERIAL)]
+        self.materials = list(materials)
+        self.dtype = np.dtype(dtype)
+        self.bricks = {}
+
+    def __len__(self):
+        """
+        Number of occupied voxels.
+        """
+        return sum(int(np.count_nonzero(b)) for b in self.bricks.values())
+
+    @property
+    def nbytes(self):
+        """
+        Memory used by the bricks, in bytes.
+        """
+        return sum(b.nbytes for b in self.bricks.values())
+
+    def _split(self, indices):
+        # Brick coordinates, local coordinates and the grouping by brick.
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+        coords = indices // BRICK
+        local = indices - coords * BRICK
+        keys, inverse = np.unique(coords, axis=0, return_inverse=True)
+        return keys, inverse.reshape(-1), local
+
+    def set(self, indices, values=1):
+        """
+        Writes material ids at voxel indices.
+
+        Parameters
+        ----------
+        indices : numpy.ndarray
+            Integer (N, 3) voxel indices.
+        values : int or numpy.ndarray
+            Material id for every index, 0 clears the voxel.
+        """
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+        values = np.broadcast_to(np.asarray(values, dtype=self.dtype),
+                                 (len(indices),))
+        keys, inverse, local = self._split(indices)
+        order = np.argsort(inverse, kind="stable")
+        splits = np.cumsum(np.bincount(inverse, minlength=len(keys)))[:-1]
+        for key, group in zip(keys, np.split(order, splits)):
+            key = tuple(key.tolist())
+            brick = self.bricks.get(key)
+            if brick is None:
+                if not values[group].any():
+                    continue
+                brick = np.zeros((BRICK,) * 3, dtype=self.dtype)
+                self.bricks[key] = brick
+            brick[tuple(local[group].T)] = values[group]
+            if not brick.any():
+                del self.bricks[key]
+
+    def get(self, indices):
+        """
+        Reads the material ids at voxel indices, 0 for empty voxels.
+        """
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+        result = np.zeros(len(indices), dtype=self.dtype)
+        keys, inverse, local = self._split(indices)
+        order = np.argsort(inverse, kind="stable")
+        splits = np.cumsum(np.bincount(inverse, minlength=len(keys)))[:-1]
+        for key, group in zip(keys, np.split(order, splits)):
+            brick = self.bricks.get(tuple(key.tolist()))
+            if brick is not None:
+                result[group] = brick[tuple(local[group].T)]
+        return result
+
+    def indices(self):
+        """
+        Returns the (N, 3) indices of the occupied voxels.
+        """
+        if not self.bricks:
+            return np.zeros((0, 3), dtype=np.int64)
+        return np.concatenate([np.argwhere(brick) + np.array(key) * BRICK
+                               for key, brick in self.bricks.items()])
+
+    def values(self):
+        """
+        Returns the material ids of the occupied voxels, in the order of
+        indices.
+        """
+        if not self.bricks:
+            return np.zeros(0, dtype=self.dtype)
+        return np.concatenate([brick[brick != 0]
+                               for brick in self.bricks.values()])
+
+    def points(self):
+        """
+        Returns the (N, 3) world positions of the occupied voxel centers.
+        """
+        return self.origin + self.indices() * self.pitch
+
+    def iter_points(self, rows=1 << 16):
+        """
+        Yields the occupied voxel centers in the order of points, in blocks
+        of about rows points, without building the whole array.
+        """
+        block = []
+        count = 0
+        for key, brick in self.bricks.items():
+            indices = np.argwhere(brick) + np.array(key) * BRICK
+            block.append(indices)
+            count += len(indices)
+            if count >= rows:
+                yield self.origin + np.concatenate(block) * self.pitch
+                block = []
+                count = 0
+        if count:
+            yield self.origin + np.concatenate(block) * self.pitch
+
+    def neighbours(self, indices):
+        """
+        Reads the material ids of the six face neighbours of voxels.
+
+        Returns
+        -------
+        ids : numpy.ndarray
+            Array of shape (N, 6), in the order of NEIGHBOURS.
+        """
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+        around = indices[:, None, :] + NEIGHBOURS[None]
+        return self.get(around.reshape(-1, 3)).reshape(-1, 6)
+
+    def _combine(self, other, keep):
+        # Brick by brick combination, keep(a, b) returns the ids of the
+        # resulting brick. Material ids are copied as they are, so both maps
+        # are expected to share the materials table.
+        result = BrickMap(self.pitch, self.origin, self.materials, self.dtype)
+        empty = np.zeros((BRICK,) * 3, dtype=self.dtype)
+        for key in set(self.bricks) | set(other.bricks):
+            a = self.bricks.get(key, empty)
+            b = other.bricks.get(key, empty)
+            brick = keep(a, b)
+            if brick.any():
+                result.bricks[key] = brick.astype(self.dtype)
+        return result
+
+    def union(self, other):
+        """
+        Voxels occupied in either map. This map wins where both are.
+        """
+        return self._combine(other, lambda a, b: np.where(a != 0, a, b))
+
+    def intersection(self, other):
+        """
+        Voxels occupied in both maps, with the ids of this map.
+        """
+        return self._combine(other, lambda a, b: np.where(b != 0, a, 0))
+
+    def difference(self, other):
+        """
+        Voxels of this map that are empty in the other.
+        """
+        return self._combine(other, lambda a, b: np.where(b != 0, 0, a))
+
+    def to_grid(self):
+        """
+        Converts to a dense OccupancyGrid covering the occupied voxels.
+        """
+        indices = self.indices()
+        if len(indices) == 0:
+            return OccupancyGrid(np.zeros((0, 0, 0), dtype=self.dtype),
+                                 self.origin, self.pitch, self.materials)
+        lower = indices.min(axis=0)
+        labels = np.zeros(indices.max(axis=0) - lower + 1, dtype=self.dtype)
+        labels[tuple((indices - lower).T)] = self.values()
+        return OccupancyGrid(labels, self.origin + lower * self.pitch,
+                             self.pitch, self.materials)
+
+    @classmethod
+    def from_grid(cls, grid, offset=(0, 0, 0)):
+        """
+        Builds a map from a dense OccupancyGrid.
+
+        Parameters
+        ----------
+        grid : OccupancyGrid
+            The dense grid.
+        offset : array_like
+            Index of the first voxel of the grid in the map.
+        """
+        result = cls(grid.pitch, grid.origin - np.asarray(offset) * grid.pitch,
+                     grid.materials, grid.labels.dtype)
+        indices = grid.indices()
+        result.set(indices + np.asarray(offset, dtype=np.int64),
+                   grid.labels[tuple(indices.T)])
+        return result
+
+    def save(self, path):
+        """
+        Writes the map as a compressed npz file.
+        """
+        keys = np.array(list(self.bricks), dtype=np.int64).reshape(-1, 3)
+        bricks = np.array(list(self.bricks.values()), dtype=self.dtype)
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                pitch=np.float64(self.pitch),
+                origin=self.origin,
+                brick=np.int64(BRICK),
+                keys=keys,
+                bricks=bricks.reshape(-1, BRICK, BRICK, BRICK),
+                materials=np.array(json.dumps(self.materials,
+                                              default=to_jsonable)),
+            )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a map written by save.
+        """
+        with np.load(path) as data:
+            if int(data["brick"]) != BRICK:
+                raise ValueError(
+                    f"{path} uses bricks of {int(data['brick'])} voxels, expected {BRICK}")
+            bricks = data["bricks"]
+            result = cls(float(data["pitch"]), data["origin"],
+                         json.loads(str(data["materials"])), bricks.dtype)
+            for key, brick in zip(data["keys"], bricks):
+                result.bricks[tuple(key.tolist())] = brick
+            return result
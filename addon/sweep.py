@@ -0,0 +1,132 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import fdfd, fdtd
+from .constants import FREQUENCY_UNIT
+from .shared import SharedArrays, attach
+from .voxel_grid import OccupancyGrid
+
+# Geometry and options of the sweep, set once per worker process.
+_GEOMETRY = None
+_OPTIONS = None
+_BLOCKS = []
+
+
+def frequencies(start, stop, step):
+    """
+    Returns the frequencies of a sweep, from start to stop included.
+
+    Parameters
+    ----------
+    start, stop : float
+        First and last frequency, stop being included when it falls on a
+        step.
+    step : float
+        Increment, strictly positive.
+
+    Returns
+    -------
+    frequencies : numpy.ndarray
+        The frequencies, in the unit of the arguments.
+    """
+    if step <= 0:
+        raise ValueError("The sweep step must be positive")
+    if stop < start:
+        raise ValueError("The sweep stops before it starts")
+    count = int(np.floor((stop - start) / step + 1e-9)) + 1
+    return start + step * np.arange(count)
+
+
+def _initialize(geometry, options):
+    # Attaches the worker to the shared geometry, read only.
+    global _GEOMETRY, _OPTIONS
+    _GEOMETRY = {}
+    for key, value in attach(geometry, _BLOCKS).items():
+        if isinstance(value, np.ndarray):
+            value = value.view()
+            value.setflags(write=False)
+        _GEOMETRY[key] = value
+    _OPTIONS = options
+
+
+def _evaluate(frequency):
+    # Runs the solver of the options at one frequency, in GHz, and returns
+    # the rows with the frequency as first column.
+    from .simulations import averages
+
+    solver = _OPTIONS['solver']
+    dimension = _OPTIONS['dimension']
+    if solver == 'AVERAGES':
+        rows = averages(_GEOMETRY['vertices'], dimension, frequency,
+                        group_size=_OPTIONS['group_size'],
+                        reduction=_OPTIONS['reduction'])
+    else:
+        grid = OccupancyGrid(_GEOMETRY['labels'], _GEOMETRY['origin'],
+                             _GEOMETRY['pitch'], _GEOMETRY['materials'])
+        if solver == 'FDTD':
+            points, values, _ = fdtd.solve(grid, dimension,
+                                           frequency * FREQUENCY_UNIT,
+                                           _OPTIONS['time_steps'])
+        else:
+            points, values, _ = fdfd.solve(grid, dimension,
+                                           frequency * FREQUENCY_UNIT,
+                                           method=_OPTIONS['fdfd_method'])
+            values = values[:, 0]
+        rows = np.column_stack((points, values))
+    return np.column_stack((np.full(len(rows), frequency), rows))
+
+
+def run(geometry, sweep, options, workers=1):
+    """
+    Evaluates a solver at every frequency of a sweep.
+
+    The geometry is copied once to shared memory and every worker process
+    attaches to it read only, instead of parsing the input again or
+    receiving a copy per frequency.
+
+    Parameters
+    ----------
+    geometry : dict
+        Either 'vertices', an (N, 3) array, for the 'AVERAGES' solver, or
+        the 'labels', 'origin', 'pitch' and 'materials' of an occupancy
+        grid for the field solvers.
+    sweep : array_like
+        Frequencies, in GHz.
+    options : dict
+        'solver', 'dimension' and the settings of the solver: 'group_size'
+        and 'reduction', 'time_steps' or 'fdfd_method'.
+    workers : int
+        Number of worker processes, 1 evaluates the frequencies in the
+        calling process.
+
+    Yields
+    ------
+    rows : numpy.ndarray
+        Rows of each frequency, in the order of the sweep, the frequency
+        being the first column.
+    """
+    sweep = [float(frequency) for frequency in sweep]
+    workers = min(max(int(workers), 1), len(sweep))
+    if workers <= 1:
+        _initialize(geometry, options)
+        yield from map(_evaluate, sweep)
+        return
+
+    shared = SharedArrays()
+    try:
+        handles = {}
+        for key, value in geometry.items():
+            if isinstance(value, np.ndarray) and value.size:
+                array = shared(value.shape, value.dtype)
+                array[...] = value
+                value = array
+            handles[key] = shared.handle(value)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_initialize,
+                                 initargs=(handles, options)) as pool:
+            yield from pool.map(_evaluate, sweep)
+    finally:
+        shared.close()
@@ -0,0 +1,148 @@
+import bpy
+
+from .tasks import TASKS, CANCELLED, DONE, FAILED, BackgroundTask
+
+# Icons of the item statuses in the task list.
+STATUS_ICONS = {
+    DONE: 'CHECKMARK',
+    FAILED: 'ERROR',
+    CANCELLED: 'CANCEL',
+}
+
+
+class BackgroundOperator:
+    """
+    Mixin running the work of an operator in worker processes.
+
+    Subclasses override prepare, which reads what it needs from Blender and
+    returns a BackgroundTask, and finish, which runs on the main thread once
+    the task is done. When invoked from the UI, the operator stays modal and
+    polls the task on a timer, so Blender keeps responding. Executed from a
+    script, it waits for the task.
+    """
+
+    # Name of the task in the TASKS registry, shown in the panels.
+    task_name = ''
+
+    def prepare(self, context):
+        """
+        Returns the task to run, or an operator return set to stop early.
+        By default the task is empty and the operator finishes at once.
+        """
+        return BackgroundTask()
+
+    def finish(self, context):
+        """
+        Handles the results of the task and returns the operator result.
+        By default it only tells whether an item failed.
+        """
+        return {'CANCELLED'} if self.task.failed else {'FINISHED'}
+
+    def execute(self, context):
+        task = self.prepare(context)
+        if isinstance(task, set):
+            return task
+        self.task = task
+        self.task.run()
+        return self._finish(context)
+
+    def invoke(self, context, event):
+        if self.task_name in TASKS:
+            self.report({'WARNING'}, f"{self.task_name} is already running.")
+            return {'CANCELLED'}
+
+        task = self.prepare(context)
+        if isinstance(task, set):
+            return task
+        self.task = task
+        if not self.task.items:
+            return self._finish(context)
+        self.task.start()
+        TASKS[self.task_name] = self.task
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.25, window=context.window)
+        wm.modal_handler_add(self)
+        wm.progress_begin(0, 1)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.task.cancel()
+        elif event.type != 'TIMER' and not self.task.cancelled:
+            return {'PASS_THROUGH'}
+
+        if not self.task.cancelled:
+            self.task.poll()
+        context.window_manager.progress_update(self.task.progress)
+        redraw_panels(context)
+
+        if self.task.cancelled:
+            self._stop(context)
+            self.report({'WARNING'}, f"{self.task_name} cancelled.")
+            return {'CANCELLED'}
+        if not self.task.done:
+            return {'PASS_THROUGH'}
+
+        self._stop(context)
+        return self._finish(context)
+
+    def _finish(self, context):
+        for item in self.task.failed:
+            self.report({'ERROR'}, f"{item.label}: {item.error}")
+        return self.finish(context)
+
+    def _stop(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        TASKS.pop(self.task_name, None)
+        redraw_panels(context)
+
+
+class TASK_OT_cancel(bpy.types.Operator):
+    """ Operator to cancel a running background task. """
+
+    bl_idname = "task.cancel"
+    bl_label = "Cancel"
+
+    task_name: bpy.props.StringProperty()
+
+    def execute(self, context):
+        task = TASKS.get(self.task_name)
+        if task is not None:
+            task.cancel()
+        return {'FINISHED'}
+
+
+def redraw_panels(context):
+    """ Tags the 3D views for redraw, so the panels show the progress. """
+
+    for area in context.screen.areas:
+        if area.type == 'VIEW_3D':
+            area.tag_redraw()
+
+
+def draw_task(layout, task_name):
+    """
+    Draws the progress, the status of each item and a cancel button for a
+    running task. Draws nothing when the task is not running.
+    """
+
+    task = TASKS.get(task_name)
+    if task is None:
+        return
+
+    box = layout.box()
+    text = f"{task_name}: {int(task.progress * 100)}%"
+    if hasattr(box, 'progress'):
+        box.progress(factor=task.progress, text=text)
+    else:
+        box.label(text=text, icon='TIME')
+
+    for item in task.items:
+        box.label(text=f"{item.label}: {item.status.lower()}",
+                  icon=STATUS_ICONS.get(item.status, 'SORTTIME'))
+
+    op = box.operator(TASK_OT_cancel.bl_idname, text="Cancel", icon='CANCEL')
+    op.task_name = task_name
@@ -0,0 +1,195 @@
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Running tasks by name, read by the panels to draw their progress.
+TASKS = {}
+
+PENDING = 'PENDING'
+DONE = 'DONE'
+FAILED = 'FAILED'
+CANCELLED = 'CANCELLED'
+
+
+def _report_pid(pids):
+    # Initializer of the workers of a WorkerPool.
+    pids.put(os.getpid())
+
+
+class WorkerPool(ProcessPoolExecutor):
+    """
+    Process pool executor whose workers can be terminated.
+
+    The executor has no public way to stop the items already running, so
+    every worker reports its process id through its initializer, before it
+    runs any item, and terminate signals them directly. Unlike a
+    multiprocessing pool, the workers are not daemon processes, so items
+    can start processes of their own.
+    """
+
+    def __init__(self, max_workers, mp_context):
+        self._worker_pids = mp_context.SimpleQueue()
+        super().__init__(max_workers, mp_context=mp_context,
+                         initializer=_report_pid,
+                         initargs=(self._worker_pids,))
+
+    def terminate(self):
+        """
+        Cancels the pending items and kills the workers.
+        """
+        self.shutdown(wait=False, cancel_futures=True)
+        pids = set()
+        while not self._worker_pids.empty():
+            pids.add(self._worker_pids.get())
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                # The worker already exited.
+                pass
+        # Waits for the executor to notice the workers stopped.
+        self.shutdown(wait=True)
+
+
+class TaskItem:
+    """
+    One unit of work of a BackgroundTask.
+    """
+
+    def __init__(self, label, function, args):
+        self.label = label
+        self.function = function
+        self.args = args
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self._async = None
+
+
+class BackgroundTask:
+    """
+    Runs functions in worker processes and tracks their progress.
+
+    Items are added before the task starts. Once started, poll collects the
+    finished items without blocking, so it can be called from a Blender
+    timer or modal operator, and cancel terminates the workers, stopping the
+    items still running.
+    """
+
+    def __init__(self, workers=1):
+        """
+        Parameters
+        ----------
+        workers : int
+            Number of worker processes.
+        """
+        self.workers = max(int(workers), 1)
+        self.items = []
+        self.cancelled = False
+        self._pool = None
+
+    def add(self, label, function, *args):
+        """
+        Adds a call of function(*args), shown as label in the UI.
+
+        The function and its arguments must be picklable and must not use
+        bpy, since they run in a separate interpreter.
+        """
+        self.items.append(TaskItem(label, function, args))
+
+    @property
+    def done(self):
+        return all(item.status != PENDING for item in self.items)
+
+    @property
+    def progress(self):
+        """
+        Fraction of the items that are finished.
+        """
+        if not self.items:
+            return 1.0
+        finished = sum(item.status != PENDING for item in self.items)
+        return finished / len(self.items)
+
+    @property
+    def failed(self):
+        return [item for item in self.items if item.status == FAILED]
+
+    def results(self):
+        """
+        Returns the results of the items, in the order they were added.
+        """
+        return [item.result for item in self.items]
+
+    def start(self):
+        """
+        Starts the workers and queues every item.
+        """
+        # Blender cannot be forked safely, workers start a fresh interpreter.
+        context = multiprocessing.get_context("spawn")
+        self._pool = WorkerPool(
+            min(self.workers, max(len(self.items), 1)), mp_context=context)
+        for item in self.items:
+            item._async = self._pool.submit(item.function, *item.args)
+
+    def poll(self):
+        """
+        Collects the items that finished since the last call.
+
+        Returns
+        -------
+        done : bool
+            True once every item is finished.
+        """
+        for item in self.items:
+            if item.status != PENDING or item._async is None:
+                continue
+            if not item._async.done():
+                continue
+            try:
+                item.result = item._async.result()
+                item.status = DONE
+            except Exception as e:
+                item.error = str(e)
+                item.status = FAILED
+        if self.done:
+            self._close()
+        return self.done
+
+    def run(self):
+        """
+        Runs every item and waits for the end.
+
+        A single worker runs the items in the calling process.
+        """
+        if self.workers > 1 and len(self.items) > 1:
+            self.start()
+            while not self.poll():
+                time.sleep(.05)
+            return
+        for item in self.items:
+            try:
+                item.result = item.function(*item.args)
+                item.status = DONE
+            except Exception as e:
+                item.error = str(e)
+                item.status = FAILED
+
+    def cancel(self):
+        """
+        Stops the workers. Items not finished yet are marked cancelled.
+        """
+        self.cancelled = True
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+        for item in self.items:
+            if item.status == PENDING:
+                item.status = CANCELLED
+
+    def _close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
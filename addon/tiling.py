@@ -0,0 +1,230 @@
+import numpy as np
+
+# Approximate peak memory per cell of a brick: the dense occupancy, the
+# exposed face masks and the subdivided surface points that land in it.
+BYTES_PER_CELL = 64
+
+# Smallest brick edge, in voxels, whatever the memory budget.
+MIN_BRICK = 8
+
+# Approximate peak memory per triangle being subdivided: its corners, its
+# parts, the temporaries of a pass and the parts still waiting in the stack.
+BYTES_PER_TRIANGLE = 2048
+
+# Smallest number of triangles subdivided together.
+MIN_CHUNK = 256
+
+
+def brick_edge(memory_budget):
+    """
+    Returns the edge length in voxels of the bricks fitting a memory budget.
+
+    Parameters
+    ----------
+    memory_budget : int
+        Peak memory allowed for one brick, in bytes.
+    """
+    edge = int((memory_budget / BYTES_PER_CELL) ** (1 / 3))
+    return max(edge, MIN_BRICK)
+
+
+def _brick_triangles(triangles, pitch, origin, brick, halo):
+    """
+    Pairs every triangle with the bricks its bounding box overlaps.
+
+    Returns
+    -------
+    bricks : numpy.ndarray
+        Integer (M, 3) brick coordinates, sorted.
+    pairs : list of numpy.ndarray
+        For each brick, the indices of the triangles overlapping it.
+    """
+    # Voxel k spans [(k - 0.5) * pitch, (k + 0.5) * pitch].
+    lo = np.floor(triangles.min(axis=1) / pitch + 0.5).astype(np.int64)
+    hi = np.floor(triangles.max(axis=1) / pitch + 0.5).astype(np.int64)
+    lo = (lo - halo - origin) // brick
+    hi = (hi + halo - origin) // brick
+    counts = hi - lo + 1
+    totals = counts.prod(axis=1)
+
+    # Expand each triangle into one row per overlapped brick.
+    tri = np.repeat(np.arange(len(triangles)), totals)
+    offset = np.arange(totals.sum()) - np.repeat(
+        np.cumsum(totals) - totals, totals)
+    cy = np.repeat(counts[:, 1], totals)
+    cz = np.repeat(counts[:, 2], totals)
+    coords = np.repeat(lo, totals, axis=0)
+    coords[:, 0] += offset // (cy * cz)
+    coords[:, 1] += (offset // cz) % cy
+    coords[:, 2] += offset % cz
+
+    bricks, inverse = np.unique(coords, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    order = np.argsort(inverse, kind="stable")
+    splits = np.cumsum(np.bincount(inverse, minlength=len(bricks)))[:-1]
+    return bricks, np.split(tri[order], splits)
+
+
+def subdivision_passes(triangles, pitch):
+    """
+    Returns the number of subdivision passes needed to bring every edge of
+    the triangles under half a pitch.
+
+    Each pass halves the longest edges, so it is the base 2 logarithm of
+    the longest edge over half a pitch, plus one pass for the diagonals of
+    the triangles split on two edges, which can be a bit longer than half.
+    """
+    edges = triangles - np.roll(triangles, 1, axis=-2)
+    longest = np.sqrt((edges ** 2).sum(axis=-1).max(initial=0))
+    if longest <= pitch / 2:
+        return 0
+    return int(np.ceil(np.log2(longest / (pitch / 2)))) + 1
+
+
+def _subdivide_in_box(triangles, max_edge, lower, upper, max_iter, chunk):
+    """
+    Subdivides triangles like ``trimesh.remesh.subdivide_to_size`` but only
+    keeps the parts of them touching a box.
+
+    The split of a triangle only depends on its own edges and its parts
+    stay inside it, so dropping the parts whose bounding box is outside
+    the box at every pass gives the same points inside it as subdividing
+    everything. The triangles are subdivided depth first, at most `chunk`
+    of them at a time, so the memory used does not depend on their size.
+
+    Yields
+    ------
+    points : numpy.ndarray
+        (N, 3) corners of subdivided triangles touching the box.
+    """
+    stack = [(triangles, 0)]
+    while stack:
+        triangles, i = stack.pop()
+        inside = ((triangles.min(axis=1) <= upper)
+                  & (triangles.max(axis=1) >= lower)).all(axis=1)
+        triangles = triangles[inside]
+        if len(triangles) > chunk:
+            stack.extend((part, i) for part in
+                         np.array_split(triangles, -(-len(triangles) // chunk)))
+            continue
+        # Edge j of a triangle goes from its corner j to its corner j + 1.
+        edges = triangles - np.roll(triangles, -1, axis=1)
+        split = (edges ** 2).sum(axis=2) ** 0.5 > max_edge
+        count = split.sum(axis=1)
+        yield triangles[count == 0].reshape(-1, 3)
+        if not count.any():
+            continue
+        if i >= max_iter:
+            raise ValueError("max_iter exceeded!")
+        middle = (triangles + np.roll(triangles, -1, axis=1)) / 2
+
+        one = count == 1
+        j = np.argmax(split[one], axis=1)
+        r = np.arange(len(j))
+        t1, m1 = triangles[one], middle[one]
+        a, b, c = t1[r, j], t1[r, (j + 1) % 3], t1[r, (j + 2) % 3]
+        p = m1[r, j]
+        faces_one = np.stack((a, p, c, p, b, c), axis=1).reshape(-1, 3, 3)
+
+        # Two split edges: a corner triangle and the rest cut along its
+        # shortest diagonal, the unsplit edge going from c to a.
+        two = count == 2
+        j = (np.argmin(split[two], axis=1) + 1) % 3
+        r = np.arange(len(j))
+        t2, m2 = triangles[two], middle[two]
+        a, b, c = t2[r, j], t2[r, (j + 1) % 3], t2[r, (j + 2) % 3]
+        p, q = m2[r, j], m2[r, (j + 1) % 3]
+        use_aq = (((a - q) ** 2).sum(axis=1)
+                  <= ((p - c) ** 2).sum(axis=1))[:, None, None]
+        faces_two = np.concatenate((
+            np.stack((p, b, q), axis=1),
+            np.where(use_aq, np.stack((a, p, q), axis=1),
+                     np.stack((a, p, c), axis=1)),
+            np.where(use_aq, np.stack((a, q, c), axis=1),
+                     np.stack((p, q, c), axis=1))))
+
+        three = count == 3
+        v0, v1, v2 = np.moveaxis(triangles[three], 1, 0)
+        n0, n1, n2 = np.moveaxis(middle[three], 1, 0)
+        faces_three = np.stack((v0, n0, n2, n0, v1, n1, n2, n1, v2,
+                                n0, n1, n2), axis=1).reshape(-1, 3, 3)
+
+        stack.append((np.concatenate((faces_one, faces_two, faces_three)),
+                      i + 1))
+
+
+def brick_core(matrix, halo):
+    """
+    Returns the boolean mask of the voxels of a brick that are not part of
+    its halo.
+    """
+    core = np.zeros_like(matrix, dtype=bool)
+    core[halo:matrix.shape[0] - halo, halo:matrix.shape[1] - halo,
+         halo:matrix.shape[2] - halo] = True
+    return core
+
+
+def iter_bricks(mesh, pitch, memory_budget, halo=0, max_iter=None):
+    """
+    Voxelizes the surface of a mesh one brick at a time.
+
+    Voxels are aligned on the same lattice as trimesh's subdivide
+    voxelization, voxel k being centered on k * pitch, so bricks fit
+    together. Only bricks touched by the mesh are produced, and each brick
+    only subdivides the parts of the triangles overlapping its own box, so
+    the peak memory does not depend on the size of the whole grid nor on
+    the size of the triangles.
+
+    The subdivision of a triangle only depends on the triangle itself, so
+    the voxels are the same as when voxelizing the whole mesh.
+
+    Parameters
+    ----------
+    mesh : trimesh.Trimesh
+        Mesh to voxelize.
+    pitch : float
+        Edge length of a voxel.
+    memory_budget : int
+        Peak memory allowed for one brick, in bytes.
+    halo : int
+        Number of neighbouring voxels added around each brick.
+    max_iter : int, optional
+        Maximum number of subdivisions of the triangles, enough for the
+        longest edge of the mesh by default.
+
+    Yields
+    ------
+    offset : numpy.ndarray
+        Global index of the first voxel of the brick, halo included.
+    matrix : numpy.ndarray
+        Boolean occupancy of the brick and its halo.
+    """
+    brick = brick_edge(memory_budget)
+    vertices = np.asarray(mesh.vertices, dtype=np.float64)
+    faces = np.asarray(mesh.faces)
+    if len(faces) == 0:
+        return
+
+    triangles = vertices[faces]
+    if max_iter is None:
+        max_iter = subdivision_passes(triangles, pitch)
+    origin = np.floor(triangles.reshape(-1, 3).min(axis=0) / pitch + 0.5)
+    origin = origin.astype(np.int64)
+    bricks, pairs = _brick_triangles(triangles, pitch, origin, brick, halo)
+    del triangles
+
+    size = brick + 2 * halo
+    chunk = max(memory_budget // BYTES_PER_TRIANGLE, MIN_CHUNK)
+    for coords, tri in zip(bricks, pairs):
+        offset = origin + coords * brick - halo
+        # A margin of one voxel keeps the points rounding into the brick.
+        lower = (offset - 1) * pitch
+        upper = (offset + size) * pitch
+        matrix = np.zeros((size, size, size), dtype=bool)
+        for points in _subdivide_in_box(vertices[faces[tri]], pitch / 2,
+                                        lower, upper, max_iter, chunk):
+            index = np.round(points / pitch).astype(np.int64) - offset
+            index = index[((index >= 0) & (index < size)).all(axis=1)]
+            matrix[tuple(index.T)] = True
+        if matrix.any():
+            yield offset, matrix
@@ -4,7 +4,9 @@ import os
 from bpy.types import Context, Event
 from bpy_extras.io_utils import ImportHelper
 from .plot import *
-from .constants import VISUALISATIONS_DIR
+from .constants import GRID_EXTENSION, SPARSE_EXTENSION, VISUALISATIONS_DIR
+from .task_opt import BackgroundOperator, draw_task
+from .tasks import BackgroundTask
 from .visualizations import *
 
 
@@ -52,6 +54,8 @@ class OBJECT_PT_visualization_section(bpy.types.Panel):
         row.operator("visualization.execute_visu",
                      text="Generate visualization", icon="PLAY")
 
+        draw_task(layout, VISUALIZATION_OT_generate_visu.task_name)
+
 
 class VISUALIZATION_OT_open_filebrowser(bpy.types.Operator, ImportHelper):
     """
@@ -62,7 +66,7 @@ class VISUALIZATION_OT_open_filebrowser(bpy.types.Operator, ImportHelper):
     filepath = bpy.props.StringProperty(subtype="FILE_PATH")
 
     filter_glob: bpy.props.StringProperty(
-        default="*.txt;*.csv", options={'HIDDEN'})
+        default="*.txt;*.csv;*.npz;*.parquet;*.feather", options={'HIDDEN'})
 
     def invoke(self, context: Context, event: Event):
         """
@@ -81,16 +85,19 @@ class VISUALIZATION_OT_open_filebrowser(bpy.types.Operator, ImportHelper):
         return {'FINISHED'}
 
 
-class VISUALIZATION_OT_generate_visu(bpy.types.Operator):
+class VISUALIZATION_OT_generate_visu(BackgroundOperator, bpy.types.Operator):
     """
     An operator for generating a visualization based on the selected data file and visualization type.
+    The plot is rendered in a worker process while the UI stays responsive.
     """
     bl_idname = "visualization.execute_visu"
     bl_label = "Generate Visualization"
 
-    def execute(self, context: Context):
+    task_name = "Visualization"
+
+    def prepare(self, context: Context):
         """
-        Executes the visualization generation.
+        Returns the task rendering the visualization.
         """
         # Check if a data file has been selected
         if not context.scene.data_file_path:
@@ -101,8 +108,17 @@ class VISUALIZATION_OT_generate_visu(bpy.types.Operator):
         # Define the directory for storing the generated visualizations
         root_dir = bpy.path.abspath("//")
         visusaliation_path = os.path.join(root_dir, VISUALISATIONS_DIR)
-        image_path = os.path.join(
+        self.image_path = os.path.join(
             visusaliation_path, context.scene.visualization_types + '.png')
+        if context.scene.visualization_types == 'ALL':
+            self.image_path = os.path.join(
+                visusaliation_path, ALL_KINDS[0] + '.png')
+
+        if context.scene.visualization_types == 'VOXELS':
+            if not context.scene.data_file_path.endswith((GRID_EXTENSION, SPARSE_EXTENSION)):
+                self.report(
+                    {'WARNING'}, f"Voxels visualization needs a {GRID_EXTENSION} or {SPARSE_EXTENSION} file.")
+                return {'CANCELLED'}
 
         # If the directory does not exist, create it
         if not os.path.exists(visusaliation_path):
@@ -112,30 +128,29 @@ class VISUALIZATION_OT_generate_visu(bpy.types.Operator):
 
         # Read data from the selected file and create the corresponding plot
         # Save the plot as a .png image
-        # Load the image into Blender and display it in a new image editor area
-
-        if context.scene.visualization_types == 'HEATMAP':
-            plot = HeatMap()
-            df = read_csv(context.scene.data_file_path)
-            plot.create_heatmap([df["x"], df["y"], df["z"]])
-            plot.save_to_png(image_path)
-        elif context.scene.visualization_types == 'SCATTERPLOT':
-            plot = ScatterPlot()
-            df = read_csv(context.scene.data_file_path)
-            plot.create_scatter(df["x"], df["y"], df["z"])
-            plot.save_to_png(image_path)
-        elif context.scene.visualization_types == 'SURFACECHART':
-            plot = SurfaceChart()
-            df = read_csv(context.scene.data_file_path)
-            plot.create_surface(df["x"], df["y"], df["z"])
-            plot.save_to_png(image_path)
-        elif context.scene.visualization_types == 'BUBBLEPLOT':
-            plot = BubblePlot()
-            df = read_csv(context.scene.data_file_path)
-            plot.create_bubble(df["x"], df["y"])
-            plot.save_to_png(image_path)
-
-        image = bpy.data.images.load(image_path, check_existing=False)
+        task = BackgroundTask()
+        if context.scene.visualization_types == 'ALL':
+            # The file is read once and the plots rendered in parallel.
+            task.add('ALL', render_all, context.scene.data_file_path,
+                     visusaliation_path)
+            return task
+        task.add(context.scene.visualization_types, render_visualization,
+                 context.scene.visualization_types,
+                 context.scene.data_file_path, self.image_path)
+        return task
+
+    def finish(self, context: Context):
+        """
+        Loads the image into Blender and displays it in a new image editor area.
+        """
+        if self.task.failed:
+            return {'CANCELLED'}
+
+        image = bpy.data.images.load(self.image_path, check_existing=False)
+        if context.scene.visualization_types == 'ALL':
+            # The other plots are loaded too, to be picked in the image editor.
+            for path in self.task.results()[0][1:]:
+                bpy.data.images.load(path, check_existing=False)
 
         # Call user prefs window
         bpy.ops.screen.userpref_show('INVOKE_DEFAULT')
@@ -144,7 +159,7 @@ class VISUALIZATION_OT_generate_visu(bpy.types.Operator):
         area.type = 'IMAGE_EDITOR'
 
         # Assign the image
-        bpy.context.area.spaces.active.image = image
+        area.spaces.active.image = image
 
         self.report(
             {'INFO'}, f'Visualization for {os.path.basename(context.scene.data_file_path)} has been generated successfully.')
@@ -1,6 +1,177 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 
+from .constants import GRID_EXTENSION, SPARSE_EXTENSION
+from .results import is_result_file, read_results
+from .plot import BubblePlot, HeatMap, ScatterPlot, SurfaceChart, VoxelPlot
+from .shared import SharedArrays, attach
+from .sparse import BrickMap
+from .voxel_grid import OccupancyGrid
+
+# Visualizations of the x, y, z columns of a data file, rendered together
+# by render_all.
+ALL_KINDS = ('HEATMAP', 'SCATTERPLOT', 'SURFACECHART', 'BUBBLEPLOT')
+
+# Columns of the data, set once per worker process of render_all.
+_COLUMNS = None
+_BLOCKS = []
+
 
 def read_csv(file_path):
     df = pd.read_csv(file_path)
     return df
+
+
+def read_grid(file_path):
+    """
+    Reads a binary voxel grid file. Brick maps are converted to a dense grid.
+    """
+    if file_path.endswith(SPARSE_EXTENSION):
+        return BrickMap.load(file_path).to_grid()
+    return OccupancyGrid.load(file_path)
+
+
+def read_data(file_path):
+    """
+    Reads the data to visualize as a DataFrame with x, y, z columns.
+    Voxel grid files give the centers of their occupied voxels, simulation results are read in their own format.
+    """
+    if file_path.endswith((GRID_EXTENSION, SPARSE_EXTENSION)):
+        points = read_grid(file_path).points()
+        return pd.DataFrame(points, columns=["x", "y", "z"])
+    if is_result_file(file_path):
+        return read_results(file_path)
+    return read_csv(file_path)
+
+
+def render_plot(kind, data, image_path):
+    """
+    Saves the plot of the given kind of already loaded data as a png image.
+
+    Parameters
+    ----------
+    kind : str
+        The visualization type, as in the visualization_types enum.
+    data : pandas.DataFrame or dict or OccupancyGrid
+        The x, y, z columns to plot, or the grid of the 'VOXELS' type.
+    image_path : str
+        Path of the image to write.
+
+    Returns
+    -------
+    image_path : str
+        Path of the written image.
+    """
+    if kind == 'HEATMAP':
+        plot = HeatMap()
+        plot.create_heatmap(pd.DataFrame(
+            np.vstack([data["x"], data["y"], data["z"]]), index=list("xyz")))
+    elif kind == 'SCATTERPLOT':
+        plot = ScatterPlot()
+        plot.create_scatter(data["x"], data["y"], data["z"])
+    elif kind == 'SURFACECHART':
+        plot = SurfaceChart()
+        plot.create_surface(data["x"], data["y"], data["z"])
+    elif kind == 'BUBBLEPLOT':
+        plot = BubblePlot()
+        plot.create_bubble(data["x"], data["y"])
+    elif kind == 'VOXELS':
+        plot = VoxelPlot()
+        plot.create_voxel(data.occupancy)
+    else:
+        raise ValueError(f"Unknown visualization type: {kind}")
+    with plot:
+        plot.save_to_png(image_path)
+    return image_path
+
+
+def render_visualization(kind, data_file_path, image_path):
+    """
+    Reads a data file and saves the plot of the given kind as a png image.
+
+    Does not use bpy, so it can run in a worker process.
+
+    Parameters
+    ----------
+    kind : str
+        The visualization type, as in the visualization_types enum.
+    data_file_path : str
+        Path of the data file.
+    image_path : str
+        Path of the image to write.
+
+    Returns
+    -------
+    image_path : str
+        Path of the written image.
+    """
+    if kind == 'VOXELS':
+        data = read_grid(data_file_path)
+    else:
+        data = read_data(data_file_path)
+    return render_plot(kind, data, image_path)
+
+
+def _initialize(columns):
+    # Attaches the worker to the shared columns, read only.
+    global _COLUMNS
+    _COLUMNS = {}
+    for key, value in attach(columns, _BLOCKS).items():
+        value = value.view()
+        value.setflags(write=False)
+        _COLUMNS[key] = value
+
+
+def _render(kind, image_path):
+    return render_plot(kind, _COLUMNS, image_path)
+
+
+def render_all(data_file_path, image_dir, workers=len(ALL_KINDS)):
+    """
+    Reads a data file once and saves every plot of ALL_KINDS as a png image.
+
+    The x, y, z columns are copied once to shared memory, and the plots are
+    rendered concurrently by worker processes attached to it read only.
+
+    Parameters
+    ----------
+    data_file_path : str
+        Path of the data file.
+    image_dir : str
+        Directory of the images, named after their kind.
+    workers : int
+        Number of worker processes, at most one per CPU, 1 renders the
+        plots in the calling process.
+
+    Returns
+    -------
+    image_paths : list of str
+        Paths of the written images, in the order of ALL_KINDS.
+    """
+    df = read_data(data_file_path)
+    columns = {key: np.ascontiguousarray(df[key].to_numpy(dtype=np.float64))
+               for key in "xyz"}
+    image_paths = [os.path.join(image_dir, kind + '.png') for kind in ALL_KINDS]
+    workers = min(max(int(workers), 1), len(ALL_KINDS), os.cpu_count() or 1)
+    if workers <= 1:
+        return [render_plot(kind, columns, path)
+                for kind, path in zip(ALL_KINDS, image_paths)]
+
+    shared = SharedArrays()
+    try:
+        handles = {}
+        for key, value in columns.items():
+            array = shared(value.shape, value.dtype)
+            array[...] = value
+            handles[key] = shared.handle(array)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_initialize,
+                                 initargs=(handles,)) as pool:
+            return list(pool.map(_render, ALL_KINDS, image_paths))
+    finally:
+        shared.close()
@@ -0,0 +1,335 @@
+import json
+import os
+import numpy as np
+
+from .constants import GRID_EXTENSION
+from .obj_io import read_faces, read_vertices
+
+# Format version written in every grid file.
+GRID_VERSION = 1
+
+# Properties of the material id 0, which fills every empty voxel.
+BACKGROUND_MATERIAL = {"sigma": 0.0, "mu": 1.0, "epsilon": 1.0}
+
+# Largest distance, relative to the pitch, between a vertex of a voxel OBJ
+# file and the nearest voxel corner.
+SNAP_TOLERANCE = 1e-3
+
+
+def grid_path(obj_file):
+    """
+    Returns the path of the grid file written next to a voxel OBJ file.
+    """
+    return f"{obj_file.rsplit('.obj', 1)[0]}{GRID_EXTENSION}"
+
+
+def infer_pitch(vertices):
+    """
+    Returns the voxel size of the vertices of a voxel OBJ file, the smallest
+    distance between two distinct coordinates along any axis.
+    """
+    steps = [np.diff(np.unique(vertices[:, axis])) for axis in range(3)]
+    steps = np.concatenate(steps)
+    # Distinct coordinates closer than the tolerance are rounding noise.
+    steps = steps[steps > SNAP_TOLERANCE * max(steps.max(initial=0), 1e-12)]
+    if not len(steps):
+        raise ValueError("Cannot infer the voxel size of a flat mesh")
+    return float(steps.min())
+
+
+def obj_material_file(obj_file):
+    """
+    Returns the path of the mtl file referenced by the first mtllib record
+    of an OBJ file, relative to the directory of the OBJ file, or None if
+    the mtl file does not exist.
+
+    OBJ files without a mtllib record, such as the ones exported by
+    earlier versions of the add-on, use the mtl file of the same name next
+    to them.
+    """
+    mtl_file = None
+    with open(obj_file) as f:
+        for line in f:
+            if line.startswith(("v ", "f ")):
+                break
+            if line.startswith("mtllib "):
+                mtl_file = line[len("mtllib "):].strip()
+                break
+    if not mtl_file:
+        mtl_file = os.path.splitext(os.path.basename(obj_file))[0] + ".mtl"
+    mtl_file = os.path.join(os.path.dirname(os.path.abspath(obj_file)),
+                            mtl_file)
+    return mtl_file if os.path.isfile(mtl_file) else None
+
+
+def read_obj_material(obj_file):
+    """
+    Reads the properties of the material referenced by a voxel OBJ file.
+
+    The properties of the first material of the mtl file given by
+    obj_material_file are read, as written by CustomMaterial.to_obj.
+
+    Returns
+    -------
+    material : dict
+        Numeric values as floats, the others as strings. Empty if the file
+        references no material or the mtl file does not exist.
+    """
+    mtl_file = obj_material_file(obj_file)
+    if mtl_file is None:
+        return {}
+
+    material = {}
+    with open(mtl_file) as f:
+        for line in f:
+            key, _, value = line.strip().partition(" ")
+            if key == "newmtl":
+                if material:
+                    break
+                continue
+            if not key or key.startswith("#"):
+                continue
+            try:
+                material[key] = float(value)
+            except ValueError:
+                material[key] = value.strip()
+    return material
+
+
+def to_jsonable(value):
+    """
+    Converts values json cannot serialize, such as Blender ID properties.
+    """
+    # Blender ID properties expose their content through to_list / to_dict.
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    if hasattr(value, "to_list"):
+        return value.to_list()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+class OccupancyGrid:
+    """
+    Regular voxel grid with a material id per voxel.
+
+    Material id 0 marks an empty voxel. Every other id indexes the materials
+    table, a list of property dictionaries (sigma, mu, epsilon, ...) whose
+    first entry describes the background.
+    """
+
+    def __init__(self, labels, origin, pitch, materials=None):
+        """
+        Parameters
+        ----------
+        labels : numpy.ndarray
+            Integer grid of shape (nx, ny, nz) holding the material id of
+            every voxel, 0 for empty voxels. A boolean grid is accepted and
+            gives id 1 to every occupied voxel.
+        origin : array_like
+            World position of the center of voxel (0, 0, 0).
+        pitch : float
+            Edge length of a voxel.
+        materials : list of dict
+            Properties of each material id.
+        """
+        labels = np.asarray(labels)
+        if labels.dtype == bool:
+            labels = labels.astype(np.uint8)
+        self.labels = labels
+        self.origin = np.asarray(origin, dtype=np.float64).reshape(3)
+        self.pitch = float(pitch)
+        if materials is None:
+            materials = [dict(BACKGROUND_MATERIAL)]
+        self.materials = list(materials)
+
+    @property
+    def shape(self):
+        return self.labels.shape
+
+    @property
+    def occupancy(self):
+        """
+        Boolean grid, True for every occupied voxel.
+        """
+        return self.labels != 0
+
+    @property
+    def transform(self):
+        """
+        4x4 matrix mapping voxel indices to voxel centers, as in trimesh.
+        """
+        transform = np.eye(4)
+        transform[:3, :3] *= self.pitch
+        transform[:3, 3] = self.origin
+        return transform
+
+    def indices(self):
+        """
+        Returns the (N, 3) indices of the occupied voxels in C order.
+        """
+        return np.argwhere(self.labels)
+
+    def points(self):
+        """
+        Returns the (N, 3) world positions of the occupied voxel centers.
+        """
+        return self.origin + self.indices() * self.pitch
+
+    def iter_points(self, rows=1 << 16):
+        """
+        Yields the occupied voxel centers in the order of points, in blocks
+        of about rows points, without building the whole array.
+        """
+        plane = max(int(np.prod(self.shape[1:])), 1)
+        step = max(rows // plane, 1)
+        for start in range(0, self.shape[0], step):
+            indices = np.argwhere(self.labels[start:start + step])
+            if len(indices):
+                indices[:, 0] += start
+                yield self.origin + indices * self.pitch
+
+    @classmethod
+    def from_voxelgrid(cls, voxelgrid, material=None):
+        """
+        Builds a grid from a trimesh voxel grid.
+
+        Parameters
+        ----------
+        voxelgrid : trimesh.voxel.VoxelGrid
+            The voxelized mesh.
+        material : dict
+            Properties of the material of every occupied voxel.
+        """
+        transform = voxelgrid.transform
+        materials = [dict(BACKGROUND_MATERIAL), dict(material or {})]
+        return cls(voxelgrid.matrix, transform[:3, 3], transform[0, 0],
+                   materials)
+
+    @classmethod
+    def from_obj(cls, obj_file, pitch=None):
+        """
+        Rebuilds the grid of a voxel OBJ file without voxelizing its source
+        mesh again.
+
+        Vertices are snapped to the lattice of voxel corners, which merges
+        the corners shared between boxes. Every face normal to x then marks
+        where a run of occupied voxels starts, its normal pointing to -x, or
+        ends, and a running sum along x fills the voxels in between. Faces
+        shared by two boxes cancel out, so the boxes, surface and greedy
+        export modes all give the same grid, in a few array operations.
+
+        Parameters
+        ----------
+        obj_file : str
+            Path to an OBJ file of closed voxel surfaces with outward normals.
+        pitch : float
+            Edge length of a voxel, inferred from the vertices when None. A
+            greedy meshed file may only have faces larger than a voxel, its
+            pitch should then be given.
+
+        Returns
+        -------
+        grid : OccupancyGrid
+            Grid of the occupied voxels, with the material of the mtl file
+            referenced by the OBJ file as id 1.
+        """
+        vertices = read_vertices(obj_file)
+        faces = read_faces(obj_file)
+        material = read_obj_material(obj_file)
+        materials = [dict(BACKGROUND_MATERIAL), material]
+        if not len(faces):
+            return cls(np.zeros((0, 0, 0), dtype=np.uint8), np.zeros(3),
+                       pitch or 1.0, materials)
+        if pitch is None:
+            pitch = infer_pitch(vertices)
+
+        low = vertices.min(axis=0)
+        scaled = (vertices - low) / pitch
+        corners = np.rint(scaled).astype(np.int64)
+        if np.abs(scaled - corners).max() > SNAP_TOLERANCE:
+            raise ValueError(
+                f"{obj_file}: vertices are not on a lattice of pitch {pitch}")
+
+        # Faces normal to x, as the triangle corners and the sign of the
+        # normal; the two triangles of a quad both span the whole quad.
+        triangles = corners[faces]
+        normals = np.cross(triangles[:, 1] - triangles[:, 0],
+                           triangles[:, 2] - triangles[:, 0])
+        facing = ((normals[:, 0] != 0) & (normals[:, 1] == 0) &
+                  (normals[:, 2] == 0))
+        triangles = triangles[facing]
+        signs = np.sign(normals[facing, 0])
+        if np.any(triangles[:, :, 0] != triangles[:, :1, 0]):
+            raise ValueError(f"{obj_file}: faces are not axis aligned")
+        lo = triangles[:, :, 1:].min(axis=1)
+        hi = triangles[:, :, 1:].max(axis=1)
+        quads = np.unique(np.column_stack(
+            (triangles[:, 0, 0], lo, hi, signs)), axis=0)
+        x, y0, z0, y1, z1, sign = quads.T
+
+        # Start (+1) and end (-1) of the runs of the rectangle of each face,
+        # as a 2D difference array per corner plane.
+        shape = tuple(corners.max(axis=0))
+        delta = np.zeros((shape[0] + 1, shape[1] + 1, shape[2] + 1),
+                         dtype=np.int16)
+        start = -sign.astype(np.int16)
+        np.add.at(delta, (x, y0, z0), start)
+        np.add.at(delta, (x, y1, z0), -start)
+        np.add.at(delta, (x, y0, z1), -start)
+        np.add.at(delta, (x, y1, z1), start)
+        for axis in (1, 2, 0):
+            np.cumsum(delta, axis=axis, out=delta)
+        occupancy = delta[:-1, :-1, :-1] != 0
+
+        # Voxel i spans [i - 0.5, i + 0.5] in index space.
+        return cls(occupancy, low + pitch / 2, pitch, materials)
+
+    def save(self, path):
+        """
+        Writes the grid as a compressed npz file.
+
+        The occupancy is bit-packed and material ids are only stored for the
+        occupied voxels, in C order. A grid made of a single material stores
+        that id once.
+        """
+        occupancy = self.occupancy
+        ids = self.labels[occupancy]
+        if len(ids) and ids.min() == ids.max():
+            ids = ids[:1]
+        id_type = np.uint8 if len(self.materials) <= 256 else np.uint16
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                version=np.int64(GRID_VERSION),
+                shape=np.array(self.shape, dtype=np.int64),
+                origin=self.origin,
+                pitch=np.float64(self.pitch),
+                occupancy=np.packbits(occupancy, axis=None),
+                material_ids=ids.astype(id_type),
+                materials=np.array(json.dumps(self.materials,
+                                              default=to_jsonable)),
+            )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a grid written by save.
+        """
+        with np.load(path) as data:
+            shape = tuple(int(n) for n in data["shape"])
+            count = int(np.prod(shape))
+            occupancy = np.unpackbits(
+                data["occupancy"], count=count).view(bool).reshape(shape)
+            ids = data["material_ids"]
+            if len(ids) == 1:
+                # Single material, no need to scatter the ids.
+                labels = occupancy.view(np.uint8)
+                if ids[0] != 1:
+                    labels = labels.astype(ids.dtype) * ids[0]
+            else:
+                labels = np.zeros(shape, dtype=ids.dtype)
+                labels[occupancy] = ids
+            return cls(labels, data["origin"], float(data["pitch"]),
+                       json.loads(str(data["materials"])))
@@ -1,5 +1,12 @@
+import multiprocessing
+import numpy as np
 import trimesh
 import os
+from .meshing import box_mesh, surface_mesh
+from .obj_io import ObjWriter, write_obj
+from .sparse import BrickMap, sparse_path
+from .tiling import brick_core, iter_bricks
+from .voxel_grid import BACKGROUND_MATERIAL, OccupancyGrid, grid_path
 
 
 class CustomMaterial(trimesh.visual.material.Material):
@@ -44,24 +51,44 @@ class CustomMaterial(trimesh.visual.material.Material):
         return data
 
 
+def default_material():
+    """
+    Returns the material used when an object has no custom properties.
+    """
+    return CustomMaterial(sigma=1, mu=1, epsilon=1, custom_property=.5)
+
+
 class Voxelizer:
     """
-    Voxelizes a stl file and exports it as an obj file.
+    Voxelizes a stl file or an in-memory mesh and exports it as an obj file,
+    along with a binary occupancy grid.
     """
 
-    def __init__(self, stl_file, mtl_name, blender_dir, voxel_size=.1):
+    def __init__(self, stl_file, mtl_name, blender_dir, voxel_size=.1,
+                 export_mode='BOXES', memory_budget=None):
         """
         Parameters
         ----------
-        stl_file : str
-            Path to the stl file.
+        stl_file : str or trimesh.Trimesh
+            Path to the stl file, or a mesh already loaded in memory.
         mtl_name : str
             Name of the material.
         voxel_size : float
             Size of the voxels.
+        export_mode : str
+            'BOXES' writes a closed box per voxel, 'SURFACE' writes only the
+            exposed voxel faces and 'GREEDY' also merges coplanar faces into
+            larger quads.
+        memory_budget : int
+            When given, the mesh is voxelized brick by brick so that a brick
+            needs at most about this many bytes, and each brick is written
+            to the obj file as soon as it is done. The occupancy is then
+            saved as a sparse brick map instead of a dense grid file.
         """
         self.stl_file = stl_file
         self.voxel_size = voxel_size
+        self.export_mode = export_mode
+        self.memory_budget = memory_budget
         self.blender_dir = blender_dir
         self.mtl_name = mtl_name
         self.mtl_file = os.path.join(
@@ -71,22 +98,141 @@ class Voxelizer:
                    custom_material: CustomMaterial = None):
         """
         Exports the voxelized stl file as an obj file.
+
+        The occupancy grid is written next to the obj file, see grid_path.
         """
-        boxes = self._voxelize()
+        if custom_material is None:
+            custom_material = default_material()
+        if self.memory_budget:
+            self._export_tiled(obj_file, custom_material)
+            return
+        voxelgrid = self._voxel_grid()
+        boxes = self._voxelize(voxelgrid)
         self._save(boxes, obj_file, custom_material)
+        self._save_grid(voxelgrid, grid_path(obj_file), custom_material)
+
+    def _export_tiled(self, obj_file="export.obj",
+                      custom_material: CustomMaterial = None):
+        """
+        Voxelizes the mesh brick by brick and streams the bricks to the obj
+        file.
+
+        Parameters
+        ----------
+        obj_file : str
+            Path to the obj file.
+        custom_material : CustomMaterial
+            Custom material.
+        """
+        # Surface modes need the neighbours of the brick to hide shared faces,
+        # every mode only writes the voxels of the core of the brick.
+        halo = 1
+        self._save_mtl(custom_material)
+        occupancy = self._empty_brickmap(custom_material)
+
+        with ObjWriter(obj_file, os.path.abspath(self.mtl_file)) as writer:
+            bricks = iter_bricks(self._load_mesh(), self.voxel_size,
+                                 self.memory_budget, halo=halo)
+            for offset, matrix in bricks:
+                core = brick_core(matrix, halo)
+                occupancy.set(np.argwhere(matrix & core) + offset)
 
-    def _voxelize(self):
+                transform = trimesh.transformations.scale_and_translate(
+                    self.voxel_size, offset * self.voxel_size)
+                if self.export_mode == 'BOXES':
+                    mesh = box_mesh(np.argwhere(matrix & core), transform)
+                else:
+                    mesh = surface_mesh(matrix, transform,
+                                        greedy=self.export_mode == 'GREEDY',
+                                        region=core)
+                writer.write_mesh(mesh)
+
+        occupancy.save(sparse_path(obj_file))
+
+    def _empty_brickmap(self, custom_material: CustomMaterial = None):
+        """
+        Creates an empty brick map on the global voxel lattice, where voxel
+        k is centered on k * voxel_size.
+        """
+        material = custom_material.kwargs if custom_material else {}
+        return BrickMap(self.voxel_size, materials=[
+            dict(BACKGROUND_MATERIAL), dict(material)])
+
+    def brickmap(self, custom_material: CustomMaterial = None):
+        """
+        Voxelizes the mesh into a sparse brick map.
+
+        Occupied voxels get the material id 1. Maps of objects voxelized
+        with the same voxel size share their lattice, so they can be
+        combined with the brick map boolean operations.
+
+        Parameters
+        ----------
+        custom_material : CustomMaterial
+            Material of the occupied voxels.
+
+        Returns
+        -------
+        occupancy : BrickMap
+            The occupied voxels.
+        """
+        occupancy = self._empty_brickmap(custom_material)
+        if self.memory_budget:
+            bricks = iter_bricks(self._load_mesh(), self.voxel_size,
+                                 self.memory_budget)
+            for offset, matrix in bricks:
+                occupancy.set(np.argwhere(matrix) + offset)
+        else:
+            voxelgrid = self._voxel_grid()
+            offset = np.round(voxelgrid.transform[:3, 3] / self.voxel_size)
+            occupancy.set(np.argwhere(voxelgrid.matrix) + offset.astype(np.int64))
+        return occupancy
+
+    def _voxel_grid(self):
         """
         Voxelizes the stl file.
 
+        Returns
+        -------
+        voxelgrid : trimesh.voxel.VoxelGrid
+            Occupancy grid of the mesh.
+        """
+        mesh = self._load_mesh()
+        return mesh.voxelized(self.voxel_size)
+
+    def _voxelize(self, voxelgrid=None):
+        """
+        Builds the mesh of a voxel grid according to the export mode.
+
+        Parameters
+        ----------
+        voxelgrid : trimesh.voxel.VoxelGrid
+            Occupancy grid, computed from the stl file when not given.
+
         Returns
         -------
         boxes : trimesh.Trimesh
             Voxelized mesh.
         """
-        mesh = trimesh.load(self.stl_file)
-        voxelgrid = mesh.voxelized(self.voxel_size)
-        return voxelgrid.as_boxes()
+        if voxelgrid is None:
+            voxelgrid = self._voxel_grid()
+        if self.export_mode == 'BOXES':
+            return voxelgrid.as_boxes()
+        return surface_mesh(voxelgrid.matrix, voxelgrid.transform,
+                            greedy=self.export_mode == 'GREEDY')
+
+    def _load_mesh(self):
+        """
+        Loads the mesh to voxelize.
+
+        Returns
+        -------
+        mesh : trimesh.Trimesh
+            The mesh given at construction, or the mesh read from the stl file.
+        """
+        if isinstance(self.stl_file, trimesh.Trimesh):
+            return self.stl_file
+        return trimesh.load(self.stl_file)
 
     def _save_obj(self, boxes, obj_file="export.obj"):
         """
@@ -99,9 +245,7 @@ class Voxelizer:
         obj_file : str
             Path to the obj file.
         """
-        with open(obj_file, "w+") as f:
-            f.write(trimesh.exchange.obj.export_obj(
-                boxes, mtl_name=os.path.abspath(self.mtl_file)))
+        write_obj(obj_file, boxes, os.path.abspath(self.mtl_file))
 
     def _save_mtl(self, custom_material: None | CustomMaterial = None):
         """
@@ -113,14 +257,122 @@ class Voxelizer:
             Custom material.
         """
         if custom_material is None:
-            custom_material = CustomMaterial(
-                sigma=1, mu=1, epsilon=1, custom_property=.5)
+            custom_material = default_material()
         mtl_data = custom_material.to_obj(self.mtl_file)
 
         with open(self.mtl_file, "w+") as f:
             f.write(mtl_data)
 
+    def _save_grid(self, voxelgrid, grid_file,
+                   custom_material: CustomMaterial = None):
+        """
+        Saves the occupancy grid as a compressed binary file.
+
+        Parameters
+        ----------
+        voxelgrid : trimesh.voxel.VoxelGrid
+            Occupancy grid of the mesh.
+        grid_file : str
+            Path to the grid file.
+        custom_material : CustomMaterial
+            Material of the occupied voxels.
+        """
+        material = custom_material.kwargs if custom_material else None
+        OccupancyGrid.from_voxelgrid(voxelgrid, material).save(grid_file)
+
     def _save(self, boxes, obj_file="export.obj",
               custom_material: CustomMaterial = None):
         self._save_mtl(custom_material)
         self._save_obj(boxes, obj_file)
+
+
+class VoxelJob:
+    """
+    Picklable description of the voxelization of one object.
+
+    Jobs hold plain arrays and values only, so they can be sent to worker
+    processes that do not have access to Blender.
+    """
+
+    def __init__(self, source, mtl_name, blender_dir, obj_file, voxel_size=.1,
+                 export_mode='BOXES', material=None, memory_budget=None):
+        """
+        Parameters
+        ----------
+        source : str or tuple
+            Path to the stl file, or a (vertices, faces) tuple of arrays.
+        mtl_name : str
+            Name of the material.
+        blender_dir : str
+            Directory of the Blender file.
+        obj_file : str
+            Path of the output obj file.
+        voxel_size : float
+            Size of the voxels.
+        export_mode : str
+            The voxel geometry to write, 'BOXES', 'SURFACE' or 'GREEDY'.
+        material : dict
+            Properties of the custom material.
+        memory_budget : int
+            Peak memory of a brick for chunked voxelization, in bytes.
+        """
+        self.source = source
+        self.mtl_name = mtl_name
+        self.blender_dir = blender_dir
+        self.obj_file = obj_file
+        self.voxel_size = voxel_size
+        self.export_mode = export_mode
+        self.material = material or {}
+        self.memory_budget = memory_budget
+
+    def run(self):
+        """
+        Voxelizes the source and exports the obj file.
+
+        Returns
+        -------
+        obj_file : str
+            Path of the written obj file.
+        """
+        source = self.source
+        if not isinstance(source, str):
+            vertices, faces = source
+            source = trimesh.Trimesh(vertices=vertices, faces=faces,
+                                     process=False)
+        v = Voxelizer(source, self.mtl_name, self.blender_dir,
+                      voxel_size=self.voxel_size, export_mode=self.export_mode,
+                      memory_budget=self.memory_budget)
+        v.export_obj(obj_file=self.obj_file,
+                     custom_material=CustomMaterial(**self.material))
+        return self.obj_file
+
+
+def _run_job(job):
+    return job.run()
+
+
+def voxelize_jobs(jobs, workers=1):
+    """
+    Runs voxelization jobs, in worker processes when more than one is asked.
+
+    Parameters
+    ----------
+    jobs : list of VoxelJob
+        Jobs to run.
+    workers : int
+        Number of worker processes. With one worker the jobs run in the
+        calling process.
+
+    Returns
+    -------
+    obj_files : list of str
+        Paths of the written obj files, in the order of the jobs.
+    """
+    workers = min(workers, len(jobs))
+    if workers <= 1:
+        return [job.run() for job in jobs]
+
+    # Blender cannot be forked safely, workers start a fresh interpreter.
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers) as pool:
+        return pool.map(_run_job, jobs, chunksize=1)
@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from addon.voxel_grid import BACKGROUND_MATERIAL, OccupancyGrid
+
+
+@pytest.fixture
+def grid():
+    """
+    Small grid holding a dielectric block and a conductor.
+    """
+    labels = np.zeros((6, 5, 4), dtype=np.uint8)
+    labels[1:4, 1:3, 1:3] = 1
+    labels[4, 3, 2] = 2
+    materials = [dict(BACKGROUND_MATERIAL),
+                 {"name": "glass", "epsilon": 4.0, "mu": 1.0, "sigma": 0.0},
+                 {"name": "metal", "epsilon": 1.0, "mu": 1.0, "sigma": 1e3}]
+    return OccupancyGrid(labels, (0.5, -1.0, 2.0), 0.01, materials)
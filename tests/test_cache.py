@@ -0,0 +1,74 @@
+import itertools
+import os
+
+import numpy as np
+import pytest
+
+from addon import cache
+from addon.cache import FileCache, content_key, file_key
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    # Entries used one after another never share a time.
+    ticks = itertools.count()
+    monkeypatch.setattr(cache.time, "time", lambda: float(next(ticks)))
+
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_content_key():
+    a = np.arange(6)
+    assert content_key(a, pitch=.1) == content_key(a.copy(), pitch=.1)
+    assert content_key(a, pitch=.1) != content_key(a, pitch=.2)
+    assert content_key(a) != content_key(a.reshape(2, 3))
+    assert content_key(a) != content_key(a.astype(np.int32))
+    assert content_key(a[::2]) == content_key(np.ascontiguousarray(a[::2]))
+
+
+def test_file_key(tmp_path):
+    a = write(tmp_path / "a", b"ab")
+    b = write(tmp_path / "b", b"c")
+    c = write(tmp_path / "c", b"a")
+    d = write(tmp_path / "d", b"bc")
+    assert file_key(a, mode=1) == file_key([a], mode=1)
+    assert file_key(a, mode=1) != file_key(a, mode=2)
+    # The same bytes split differently between files are another key.
+    assert file_key([a, b]) != file_key([c, d])
+
+
+def test_get_put(tmp_path):
+    source = write(tmp_path / "out.obj", b"voxels")
+    store = FileCache(str(tmp_path / "cache"), 1 << 20)
+    assert not store.get("key", [source])
+    store.put("key", [source])
+
+    os.remove(source)
+    assert store.get("key", [source])
+    with open(source, "rb") as f:
+        assert f.read() == b"voxels"
+    assert (store.hits, store.misses) == (1, 1)
+
+    # The index survives a new instance.
+    assert FileCache(str(tmp_path / "cache"), 1 << 20).get("key", [source])
+
+
+def test_eviction(tmp_path):
+    store = FileCache(str(tmp_path / "cache"), 25)
+    for key in "abc":
+        store.put(key, [write(tmp_path / key, b"0123456789")])
+    assert [entry["key"] for entry in store.entries()] == ["c", "b"]
+    assert store.size == 20
+
+    # Using an entry keeps it over older ones.
+    assert store.get("b", [str(tmp_path / "b")])
+    store.put("d", [write(tmp_path / "d", b"0123456789")])
+    assert [entry["key"] for entry in store.entries()] == ["d", "b"]
+    assert not os.path.exists(tmp_path / "cache" / "c")
+
+    store.clear()
+    assert store.size == 0 and not store.entries()
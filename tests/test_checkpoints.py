@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pytest
+
+from addon import simulations
+from addon.constants import GRID_EXTENSION
+from addon.fdtd import FDTD, Checkpoint, read_checkpoint, solve
+from addon.results import read_results
+from addon.simulations import (latest_checkpoint, resume_simulation,
+                               simulate_fdtd)
+
+FREQUENCY = 3e9
+
+
+class Interrupted(Exception):
+    pass
+
+
+class InterruptedCheckpoint(Checkpoint):
+    """
+    Writes one checkpoint at step 15, then stops the run as if the process
+    was killed.
+    """
+
+    def due(self, solver):
+        return solver.steps == 15
+
+    def write(self, solver, end):
+        super().write(solver, end)
+        raise Interrupted
+
+
+def test_save_restore(tmp_path, grid):
+    path = str(tmp_path / "state.npz")
+    labels = np.pad(grid.labels, 11)
+    solver = FDTD(labels, grid.materials, grid.pitch, FREQUENCY)
+    solver.run(12)
+    solver.save(path, 30, {'run': 1})
+    assert read_checkpoint(path)['steps'] == 12
+
+    restored = FDTD(labels, grid.materials, grid.pitch, FREQUENCY)
+    header = restored.restore(path)
+    assert header['end'] == 30 and header['run'] == 1
+    assert restored.steps == 12
+    for name, field in solver.fields.items():
+        np.testing.assert_array_equal(restored.fields[name], field)
+
+    other = FDTD(labels, grid.materials, grid.pitch, 2 * FREQUENCY)
+    with pytest.raises(ValueError):
+        other.restore(path)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_resume_matches_uninterrupted(tmp_path, grid, workers):
+    path = str(tmp_path / "state.npz")
+    _, expected, _ = solve(grid, 3, FREQUENCY, 30)
+    with pytest.raises(Interrupted):
+        solve(grid, 3, FREQUENCY, 30, checkpoint=InterruptedCheckpoint(path))
+    assert read_checkpoint(path)['steps'] == 15
+
+    # The checkpoint does not depend on the number of workers.
+    _, amplitude, stats = solve(grid, 3, FREQUENCY, 30, workers=workers,
+                                checkpoint=Checkpoint(path), resume=True)
+    assert stats['steps'] == 15
+    np.testing.assert_array_equal(amplitude, expected)
+
+
+def test_resume_simulation(tmp_path, grid, monkeypatch):
+    path = str(tmp_path / ("input" + GRID_EXTENSION))
+    grid.save(path)
+    checkpoint_dir = str(tmp_path / "checkpoints")
+    expected = read_results(simulate_fdtd(3, path, str(tmp_path), 2,
+                                          time_steps=30))
+
+    monkeypatch.setattr(simulations, "Checkpoint", InterruptedCheckpoint)
+    with pytest.raises(Interrupted):
+        simulate_fdtd(3, path, str(tmp_path), 2, time_steps=30,
+                      checkpoint_dir=checkpoint_dir)
+    monkeypatch.undo()
+
+    checkpoint_file = latest_checkpoint(checkpoint_dir)
+    assert checkpoint_file is not None
+    result = read_results(resume_simulation(checkpoint_file))
+    np.testing.assert_array_equal(result.to_numpy(), expected.to_numpy())
+    # The checkpoint is removed once the results are written.
+    assert not os.path.exists(checkpoint_file)
+    assert latest_checkpoint(checkpoint_dir) is None
@@ -0,0 +1,70 @@
+import json
+import os
+
+import pytest
+import trimesh
+
+from addon.cli import (DONE, FAILED, SKIPPED, find_sources, main,
+                       output_name, parse_properties)
+
+
+@pytest.fixture
+def parts(tmp_path):
+    root = tmp_path / "parts"
+    (root / "a").mkdir(parents=True)
+    (root / "b").mkdir()
+    trimesh.creation.box((1, 1, 1)).export(str(root / "a" / "part.stl"))
+    trimesh.creation.icosphere().export(str(root / "b" / "part.STL"))
+    return root
+
+
+def test_parse_properties():
+    assert parse_properties(["epsilon=4", "sigma=1e-3", "name=glass"]) == {
+        "epsilon": 4, "sigma": 1e-3, "name": "glass"}
+    with pytest.raises(ValueError):
+        parse_properties(["epsilon"])
+
+
+def test_find_sources(parts):
+    sources = find_sources(str(parts), {"mu": 1})
+    assert [os.path.relpath(path, parts) for path, _ in sources] == [
+        os.path.join("a", "part.stl"), os.path.join("b", "part.STL")]
+    assert output_name(sources[0][0], str(parts)) == "a__part"
+
+    manifest = parts / "list.txt"
+    manifest.write_text("# parts\na/part.stl epsilon=2\n\nb/part.STL\n")
+    assert find_sources(str(manifest), {"mu": 1}) == [
+        (str(parts / "a" / "part.stl"), {"mu": 1, "epsilon": 2}),
+        (str(parts / "b" / "part.STL"), {"mu": 1})]
+
+
+def summary(tmp_path, *args):
+    path = str(tmp_path / "summary.json")
+    code = main([*args, "--mesh-size", ".25", "-j", "1", "--summary", path])
+    with open(path) as f:
+        return code, json.load(f)
+
+
+def test_main(tmp_path, parts):
+    output = str(tmp_path / "out")
+    code, result = summary(tmp_path, str(parts), "-o", output)
+    assert code == 0 and result["counts"] == {DONE: 2, SKIPPED: 0, FAILED: 0}
+    for name in ("a__part", "b__part"):
+        assert os.path.isfile(os.path.join(output, name + ".obj"))
+        assert os.path.isfile(os.path.join(output, name + ".grid.npz"))
+
+    # Unchanged sources are skipped, forced or changed ones are not.
+    code, result = summary(tmp_path, str(parts), "-o", output)
+    assert result["counts"][SKIPPED] == 2
+    code, result = summary(tmp_path, str(parts), "-o", output, "-f")
+    assert result["counts"][DONE] == 2
+    code, result = summary(tmp_path, str(parts), "-o", output, "-m", "mu=2")
+    assert result["counts"][DONE] == 2
+
+
+def test_failure(tmp_path, parts):
+    (parts / "broken.stl").write_text("not a mesh")
+    code, result = summary(tmp_path, str(parts), "-o", str(tmp_path / "out"))
+    assert code == 1
+    assert result["counts"] == {DONE: 2, SKIPPED: 0, FAILED: 1}
+    assert result["files"][2]["error"]
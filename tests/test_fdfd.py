@@ -0,0 +1,167 @@
+import numpy as np
+import pytest
+
+from addon import fdfd
+from addon.fdfd import (FACTORIZATIONS, FDFD, GMRES_STAGNATED, SPILU_FAILED,
+                        probe_sources, solve)
+from addon.fdtd import domain_labels
+from addon.probes import LINE, POINT
+from addon.results import read_results
+from addon.simulations import simulate_fdfd
+from addon.voxel_grid import OccupancyGrid
+
+FREQUENCY = 3e9
+
+# Thin layers keep the 3D problems small.
+SMALL = {"pml_cells": 4, "margin": 1}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    FACTORIZATIONS.clear()
+    yield
+    FACTORIZATIONS.clear()
+
+
+def problem(grid, dimension, method='DIRECT'):
+    labels = domain_labels(grid.labels, dimension, 5)
+    return FDFD(labels, grid.materials, grid.pitch, FREQUENCY, dimension,
+                pml_cells=4, method=method)
+
+
+@pytest.mark.parametrize("dimension", [1, 2, 3])
+def test_direct_matches_iterative(grid, dimension):
+    points, direct, stats = solve(grid, dimension, FREQUENCY, **SMALL)
+    _, iterative, _ = solve(grid, dimension, FREQUENCY, method='ITERATIVE',
+                            **SMALL)
+    assert direct.shape == (len(points), 1)
+    assert direct.max() > 0
+    assert stats == {'sources': 1, 'fallback': None}
+    np.testing.assert_allclose(iterative, direct, rtol=0,
+                               atol=1e-5 * direct.max())
+
+
+@pytest.mark.parametrize("dimension", [1, 2, 3])
+def test_residual(grid, dimension):
+    solver = problem(grid, dimension)
+    rhs = solver.point_source()
+    fields = solver.solve(rhs)
+    assert np.linalg.norm(solver.operator @ fields - rhs) < (
+        1e-8 * np.linalg.norm(rhs))
+
+
+def test_sources(grid):
+    sources = [(5, 7, 6), (8, 6, 7)]
+    _, both, _ = solve(grid, 3, FREQUENCY, sources=sources, **SMALL)
+    for i, source in enumerate(sources):
+        _, one, _ = solve(grid, 3, FREQUENCY, sources=[source], **SMALL)
+        np.testing.assert_allclose(both[:, i], one[:, 0])
+
+
+def test_factorization_cache(grid, monkeypatch):
+    factorization = problem(grid, 2).factorization()
+    assert problem(grid, 2).factorization() is factorization
+    assert problem(grid, 2, 'ITERATIVE').factorization() is not factorization
+    assert len(FACTORIZATIONS) == 2
+
+    # The least recently used problems are dropped first.
+    monkeypatch.setattr(fdfd, "CACHE_SIZE", 2)
+    problem(grid, 2).factorization()
+    problem(grid, 1).factorization()
+    assert len(FACTORIZATIONS) == 2
+    assert problem(grid, 2).key in FACTORIZATIONS
+
+
+def probes(grid):
+    # A point probe on a cell of the grid and a line probe along x.
+    point = grid.origin + grid.pitch * np.array([2, 2, 2])
+    line = grid.origin + grid.pitch * np.array([[0, 1, 1], [3, 1, 1]])
+    return [{'name': 'p', 'kind': POINT, 'points': point[None]},
+            {'name': 'l', 'kind': LINE, 'points': line}]
+
+
+def test_probe_sources(grid, monkeypatch):
+    factorizations = []
+    splu = fdfd.spla.splu
+    monkeypatch.setattr(fdfd.spla, "splu",
+                        lambda *args, **kwargs: factorizations.append(1)
+                        or splu(*args, **kwargs))
+
+    sources = probe_sources(grid, 3, probes(grid), **SMALL)
+    np.testing.assert_array_equal(sources[0], [[7, 7, 7]])
+    assert len(sources[1]) == 2
+    _, both, stats = solve(grid, 3, FREQUENCY, sources=sources, **SMALL)
+    assert stats['sources'] == 2
+    assert len(factorizations) == 1
+
+    # The point probe is the single cell source, the line probe the sum of
+    # its cells.
+    _, point, _ = solve(grid, 3, FREQUENCY, sources=[(7, 7, 7)], **SMALL)
+    np.testing.assert_allclose(both[:, 0], point[:, 0])
+    solver = FDFD(domain_labels(grid.labels, 3, 5), grid.materials,
+                  grid.pitch, FREQUENCY, 3, pml_cells=4)
+    fields = solver.solve(solver.point_source((5, 6, 6))
+                          + solver.point_source((8, 6, 6)))
+    np.testing.assert_allclose(both[:, 1], solver.magnitude(fields)[:, 0])
+    assert len(factorizations) == 1
+
+
+def test_simulate_sources(tmp_path, grid):
+    path = str(tmp_path / "part.grid.npz")
+    grid.save(path)
+    result = simulate_fdfd(2, path, str(tmp_path), 3, sources=probes(grid))
+    data = read_results(result)
+    assert list(data.columns) == ['x', 'y', 'e_p', 'e_l']
+    assert (data[['e_p', 'e_l']].to_numpy() > 0).any(axis=0).all()
+    stats = data.attrs['metadata']['stats']
+    assert stats['sources'] == 2
+    assert stats['fallback'] is None
+
+
+class IdentityPreconditioner:
+    def solve(self, rhs):
+        return rhs
+
+
+def test_spilu_fallback(grid, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("Factor is exactly singular")
+
+    monkeypatch.setattr(fdfd.spla, "spilu", fail)
+    _, _, stats = solve(grid, 2, FREQUENCY, method='ITERATIVE', **SMALL)
+    assert stats['fallback'] == SPILU_FAILED
+    # The cached factorization keeps its fallback.
+    _, _, stats = solve(grid, 2, FREQUENCY, method='ITERATIVE', **SMALL)
+    assert stats['fallback'] == SPILU_FAILED
+
+
+def test_gmres_fallback(grid, monkeypatch):
+    monkeypatch.setattr(fdfd.spla, "spilu",
+                        lambda *args, **kwargs: IdentityPreconditioner())
+    monkeypatch.setattr(fdfd, "STAGNATION", 0)
+    monkeypatch.setattr(fdfd, "CACHE_SIZE", 1)
+    problem(grid, 1).factorization()
+
+    _, magnitude, stats = solve(grid, 3, FREQUENCY, method='ITERATIVE',
+                                **SMALL)
+    assert stats['fallback'] == GMRES_STAGNATED
+    # The complete factorization went through the bounded cache.
+    assert len(FACTORIZATIONS) == 1
+
+    _, direct, _ = solve(grid, 3, FREQUENCY, **SMALL)
+    np.testing.assert_allclose(magnitude, direct, rtol=0,
+                               atol=1e-5 * direct.max())
+
+
+def test_plane_wave():
+    # In 1D vacuum, the source sends plane waves of constant magnitude
+    # both ways, absorbed by the PML.
+    grid = OccupancyGrid(np.zeros((40, 1, 1), dtype=bool), (0, 0, 0), .005)
+    _, magnitude, _ = solve(grid, 1, FREQUENCY)
+    wave = magnitude[20:-20, 0]
+    np.testing.assert_allclose(wave, wave.mean(), rtol=1e-2)
+
+
+def test_invalid_method(grid):
+    with pytest.raises(ValueError):
+        problem(grid, 1, 'QR')
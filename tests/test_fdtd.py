@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from addon.fdtd import (FDTD, MARGIN_CELLS, PML_CELLS, domain_labels,
+                        solve)
+
+FREQUENCY = 3e9
+
+
+def solver(grid, dimension=3, **kwargs):
+    labels = domain_labels(grid.labels, dimension, PML_CELLS + MARGIN_CELLS)
+    return FDTD(labels, grid.materials, grid.pitch, FREQUENCY, dimension,
+                **kwargs)
+
+
+@pytest.mark.parametrize("dimension", [1, 2, 3])
+def test_deterministic(grid, dimension):
+    points, amplitude, stats = solve(grid, dimension, FREQUENCY, 40)
+    again = solve(grid, dimension, FREQUENCY, 40)
+    np.testing.assert_array_equal(again[1], amplitude)
+    np.testing.assert_array_equal(again[0], points)
+    assert points.shape == (len(amplitude), dimension)
+    assert np.all(np.isfinite(amplitude)) and amplitude.max() > 0
+    assert stats["steps"] == 40 and stats["cells"] == len(amplitude)
+
+
+def test_points(grid):
+    points, amplitude, _ = solve(grid, 3, FREQUENCY, 1, pml_cells=4, margin=2)
+    # The first cell of the grid is padded by the layers and the margin.
+    np.testing.assert_allclose(points.min(axis=0), grid.origin - 6 * grid.pitch)
+    assert len(points) == np.prod(np.array(grid.shape) + 12)
+
+
+def test_split_run(grid):
+    whole = solver(grid)
+    whole.run(30)
+    split = solver(grid)
+    split.run(10)
+    split.run(20)
+    assert split.steps == whole.steps == 30
+    for name, field in whole.fields.items():
+        np.testing.assert_array_equal(split.fields[name], field)
+
+
+def test_field_propagates(grid):
+    # Nothing moves before the source starts, the field then spreads from
+    # the source cell.
+    fdtd = solver(grid, dimension=1)
+    assert not fdtd.fields["Ez"].any()
+    fdtd.run(5)
+    reached = np.flatnonzero(fdtd.fields["Ez"])
+    assert fdtd.source[0] in reached
+    fdtd.run(20)
+    assert len(np.flatnonzero(fdtd.fields["Ez"])) > len(reached)
+
+
+def test_conductor_attenuates(grid):
+    # A lossy block damps the field passing through it.
+    lossy = grid.materials[:1] + [{"sigma": 1e2}] * 2
+    vacuum = grid.materials[:1] + [{}] * 2
+    _, damped, _ = solve(type(grid)(grid.labels, grid.origin, grid.pitch,
+                                    lossy), 1, FREQUENCY, 200)
+    _, free, _ = solve(type(grid)(grid.labels, grid.origin, grid.pitch,
+                                  vacuum), 1, FREQUENCY, 200)
+    assert damped[-20:].max() < free[-20:].max()
+
+
+def test_invalid_grid(grid):
+    with pytest.raises(ValueError):
+        FDTD(grid.labels, grid.materials, grid.pitch, FREQUENCY, dimension=2)
+    with pytest.raises(ValueError):
+        FDTD(grid.labels, grid.materials, grid.pitch, FREQUENCY, pml_cells=4)
+
+
+@pytest.mark.parametrize("dimension, workers", [(1, 2), (2, 3), (3, 2)])
+def test_workers_match_serial(grid, dimension, workers):
+    _, serial, _ = solve(grid, dimension, FREQUENCY, 30)
+    _, parallel, stats = solve(grid, dimension, FREQUENCY, 30,
+                               workers=workers)
+    assert stats["workers"] == workers
+    np.testing.assert_array_equal(parallel, serial)
+
+
+def test_slabs(grid):
+    fdtd = solver(grid, workers=3)
+    try:
+        slabs = fdtd.slabs()
+    finally:
+        fdtd.close()
+    assert slabs[0][0] == 0 and slabs[-1][1] == fdtd.shape[0]
+    assert all(hi == lo for (_, hi), (lo, _) in zip(slabs, slabs[1:]))
@@ -0,0 +1,108 @@
+import multiprocessing
+
+import pytest
+import trimesh
+
+from addon import jobs
+from addon.jobs import (CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobQueue,
+                        run_worker)
+from addon.obj_io import write_obj
+
+
+@pytest.fixture
+def queue(tmp_path):
+    with JobQueue(str(tmp_path / "queue" / "jobs.sqlite")) as queue:
+        yield queue
+
+
+def dead_pid():
+    process = multiprocessing.get_context("spawn").Process(target=int)
+    process.start()
+    process.join()
+    return process.pid
+
+
+def test_claim_order(queue):
+    low = queue.submit("simulate", {"dimension": 1})
+    high = queue.submit("simulate", {"dimension": 2}, priority=5)
+    later = queue.submit("simulate", {"dimension": 3}, label="later")
+    assert [job["id"] for job in queue.jobs()] == [later, high, low]
+    assert queue.counts()[QUEUED] == 3
+
+    job = queue.claim(worker=1)
+    assert job["id"] == high and job["arguments"] == {"dimension": 2}
+    assert job["status"] == RUNNING and job["attempts"] == 1
+    # Another connection never claims the same job.
+    with JobQueue(queue.path) as other:
+        assert other.claim(worker=2)["id"] == low
+    assert queue.claim(worker=1)["label"] == "later"
+    assert queue.claim(worker=1) is None
+
+    queue.complete(high, "result.npz")
+    assert queue.job(high)["status"] == DONE
+    assert queue.job(high)["result"] == "result.npz"
+
+
+def test_unknown_function(queue):
+    with pytest.raises(ValueError):
+        queue.submit("remove", {})
+
+
+def test_retries(queue, monkeypatch):
+    monkeypatch.setattr(jobs, "RETRY_DELAY", 0.)
+    job_id = queue.submit("simulate", {}, max_attempts=2)
+    queue.claim(worker=1)
+    queue.fail(job_id, "first")
+    assert queue.job(job_id)["status"] == QUEUED
+    assert queue.claim(worker=1)["attempts"] == 2
+    queue.fail(job_id, "second")
+    assert queue.job(job_id)["status"] == FAILED
+    assert queue.job(job_id)["error"] == "second"
+
+
+def test_retry_delay(queue):
+    job_id = queue.submit("simulate", {})
+    queue.claim(worker=1)
+    queue.fail(job_id, "error")
+    # Queued again, but not before the delay.
+    assert queue.job(job_id)["status"] == QUEUED
+    assert queue.claim(worker=1) is None
+
+
+def test_cancel_and_release(queue):
+    first = queue.submit("simulate", {})
+    second = queue.submit("simulate", {})
+    assert queue.cancel(second)
+    assert queue.job(second)["status"] == CANCELLED
+    queue.claim(worker=1)
+    assert not queue.cancel(first)
+    queue.release(first)
+    assert queue.job(first)["status"] == QUEUED
+    assert queue.job(first)["attempts"] == 0
+
+
+def test_recover(queue):
+    job_id = queue.submit("simulate", {})
+    queue.claim(worker=dead_pid())
+    running = queue.submit("simulate", {})
+    queue.claim(worker=multiprocessing.current_process().pid)
+    assert queue.recover() == 1
+    assert queue.job(job_id)["status"] == QUEUED
+    assert queue.job(running)["status"] == RUNNING
+
+
+def test_run_worker(tmp_path, queue, monkeypatch):
+    monkeypatch.setattr(jobs, "RETRY_DELAY", 0.)
+    obj_file = str(tmp_path / "mesh.obj")
+    write_obj(obj_file, trimesh.creation.icosphere())
+    good = queue.submit("simulate", {"dimension": 3, "path": obj_file,
+                                     "save_path": str(tmp_path)})
+    bad = queue.submit("simulate", {"dimension": 3, "unknown": 1},
+                       max_attempts=1)
+
+    counts = run_worker(queue.path, concurrency=2, poll=.05, once=True)
+    assert counts == {DONE: 1, FAILED: 1}
+    assert queue.job(good)["status"] == DONE
+    assert queue.job(good)["result"].startswith(str(tmp_path))
+    assert queue.job(bad)["status"] == FAILED
+    assert "TypeError" in queue.job(bad)["error"]
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import trimesh
+
+from addon.meshing import box_mesh, exposed_faces, surface_mesh
+
+
+@pytest.fixture
+def matrix():
+    # Random blob with holes and cavities.
+    return np.random.default_rng(1).random((7, 6, 5)) < .6
+
+
+def test_exposed_faces(matrix):
+    mask = exposed_faces(matrix, 0, 1)
+    np.testing.assert_array_equal(mask[-1], matrix[-1])
+    np.testing.assert_array_equal(mask[:-1], matrix[:-1] & ~matrix[1:])
+
+
+def test_box_mesh(matrix):
+    mesh = box_mesh(np.argwhere(matrix), np.eye(4))
+    assert len(mesh.faces) == 12 * matrix.sum()
+    np.testing.assert_allclose(mesh.volume, matrix.sum())
+
+
+@pytest.mark.parametrize("greedy", [False, True])
+def test_surface_mesh(matrix, greedy):
+    transform = trimesh.transformations.scale_and_translate(.1, (1, 2, 3))
+    mesh = surface_mesh(matrix, transform, greedy=greedy)
+    np.testing.assert_allclose(mesh.volume, matrix.sum() * .1 ** 3)
+    np.testing.assert_allclose(mesh.bounds,
+                               box_mesh(np.argwhere(matrix), transform).bounds)
+
+
+def test_greedy_merges_faces():
+    matrix = np.ones((4, 3, 2), dtype=bool)
+    plain = surface_mesh(matrix, np.eye(4))
+    greedy = surface_mesh(matrix, np.eye(4), greedy=True)
+    assert plain.is_watertight and greedy.is_watertight
+    assert len(plain.faces) == 2 * 2 * (4 * 3 + 3 * 2 + 4 * 2)
+    assert len(greedy.faces) == 2 * 6
+    np.testing.assert_allclose(greedy.volume, plain.volume)
+
+
+def test_region(matrix):
+    region = np.zeros_like(matrix)
+    region[:3] = True
+    left = surface_mesh(matrix, np.eye(4), region=region)
+    right = surface_mesh(matrix, np.eye(4), region=~region)
+    whole = surface_mesh(matrix, np.eye(4))
+    assert len(left.faces) + len(right.faces) == len(whole.faces)
+
+
+def test_empty():
+    assert len(surface_mesh(np.zeros((2, 2, 2), bool), np.eye(4)).faces) == 0
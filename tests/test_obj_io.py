@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+import trimesh
+
+from addon.obj_io import (BLOCK_SIZE, ObjWriter, format_rows, iter_vertices,
+                          read_faces, read_vertices, write_obj)
+
+
+@pytest.fixture
+def mesh():
+    return trimesh.creation.icosphere(subdivisions=1)
+
+
+def test_format_rows():
+    rows = np.array([[1, 2], [3, 4]])
+    assert format_rows("f %d %d\n", rows) == "f 1 2\nf 3 4\n"
+
+
+def test_write_obj(tmp_path, mesh):
+    path = str(tmp_path / "mesh.obj")
+    write_obj(path, mesh)
+    loaded = trimesh.load(path, process=False)
+    np.testing.assert_allclose(loaded.vertices, mesh.vertices, atol=1e-8)
+    np.testing.assert_array_equal(loaded.faces, mesh.faces)
+
+
+def test_append_meshes(tmp_path, mesh):
+    path = str(tmp_path / "meshes.obj")
+    other = mesh.copy()
+    other.apply_translation((3, 0, 0))
+    with ObjWriter(path, chunk_rows=7) as writer:
+        writer.write_mesh(mesh)
+        writer.write_mesh(other)
+    assert writer.count == 2 * len(mesh.vertices)
+
+    loaded = trimesh.load(path, process=False)
+    both = trimesh.util.concatenate([mesh, other])
+    np.testing.assert_allclose(loaded.vertices, both.vertices, atol=1e-8)
+    np.testing.assert_array_equal(loaded.faces, both.faces)
+
+
+def test_material_reference(tmp_path, mesh):
+    (tmp_path / "materials").mkdir()
+    path = str(tmp_path / "mesh.obj")
+    write_obj(path, mesh, str(tmp_path / "materials" / "glass.mtl"))
+    with open(path) as f:
+        assert f.readline() == "mtllib materials/glass.mtl\n"
+        assert f.readline() == "usemtl glass\n"
+
+
+@pytest.mark.parametrize("block_size", [BLOCK_SIZE, 64])
+def test_read_written(tmp_path, mesh, block_size):
+    path = str(tmp_path / "mesh.obj")
+    write_obj(path, mesh)
+    np.testing.assert_allclose(read_vertices(path, block_size), mesh.vertices,
+                               atol=1e-8)
+    np.testing.assert_array_equal(read_faces(path, block_size), mesh.faces)
+    blocks = list(iter_vertices(path, block_size))
+    assert (len(blocks) > 1) == (block_size == 64)
+
+
+@pytest.mark.parametrize("block_size", [BLOCK_SIZE, 16])
+def test_read_other_records(tmp_path, block_size):
+    path = tmp_path / "mesh.obj"
+    path.write_bytes(
+        b"# comment v 9 9 9\r\n"
+        b"mtllib a.mtl\n"
+        b"v 0 0 0 1.0\n"
+        b"vt 0.5 0.5\n"
+        b"vn 0 0 1\n"
+        b"v\t1.5 -2e-3 3 0.2 0.3 0.4\r\n"
+        b"v 0 1 0\n"
+        b"vp 1 2\n"
+        b"f 1/1/1 2/1/1 3/1/1\n"
+        b"f 3//1 2//1 1//1\n"
+        b"f 1 2 3 3\n"
+        b"f 2/1 3/1 1/1")
+    np.testing.assert_allclose(read_vertices(str(path), block_size),
+                               [[0, 0, 0], [1.5, -2e-3, 3], [0, 1, 0]])
+    np.testing.assert_array_equal(read_faces(str(path), block_size),
+                                  [[0, 1, 2], [2, 1, 0], [0, 1, 2], [1, 2, 0]])
+
+
+def test_read_empty(tmp_path):
+    path = tmp_path / "empty.obj"
+    path.write_bytes(b"")
+    assert read_vertices(str(path)).shape == (0, 3)
+    assert read_faces(str(path)).shape == (0, 3)
+
+
+def test_short_record(tmp_path):
+    path = tmp_path / "short.obj"
+    path.write_bytes(b"v 0 0 0\nv 1 1\n")
+    with pytest.raises(ValueError):
+        read_vertices(str(path))
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from addon.fdtd import record, solve
+from addon.probes import (LINE, POINT, RESERVED_NAMES, line_points,
+                          plane_points, probe_cells, probe_name, read_probes,
+                          write_probes)
+
+
+def test_sampling():
+    points = line_points((0, 0, 0), (0, 0, 1), .25)
+    np.testing.assert_allclose(points[:, 2], [0, .25, .5, .75, 1])
+    assert len(plane_points((0, 0, 0), (1, 0, 0), (0, .5, 0), .5)) == 3 * 2
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "probes.npz")
+    probes = [{'name': 'a', 'kind': POINT}, {'name': 'b', 'kind': LINE}]
+    points = np.arange(9).reshape(3, 3)
+    owners = np.array([0, 1, 1])
+    times = np.array([0., 1.])
+    values = np.random.default_rng(0).random((2, 3, 3))
+    write_probes(path, probes, points, owners, times, values, {'run': 1})
+
+    data = read_probes(path)
+    np.testing.assert_array_equal(data['time'], times)
+    assert data['metadata']['run'] == 1
+    assert data['a']['kind'] == POINT
+    np.testing.assert_array_equal(data['b']['points'], points[1:])
+    np.testing.assert_array_equal(data['b']['values'], values[:, 1:])
+
+
+@pytest.mark.parametrize("names", [['time'], ['metadata'], ['a', 'a']])
+def test_reserved_names(tmp_path, names):
+    probes = [{'name': name, 'kind': POINT} for name in names]
+    with pytest.raises(ValueError):
+        write_probes(str(tmp_path / "probes.npz"), probes, np.zeros((0, 3)),
+                     np.zeros(0), np.zeros(0), np.zeros((0, 0, 3)))
+
+
+def test_probe_name():
+    for name in RESERVED_NAMES:
+        assert probe_name(name) not in RESERVED_NAMES
+    assert probe_name('time', {'probe_time'}) == 'probe_probe_time'
+    assert probe_name('a') == 'a'
+
+
+def test_record_matches_solve(grid):
+    # The peak field of the recorded cells is the one of the whole domain
+    # when every step is recorded.
+    center = grid.origin + grid.pitch * (np.array(grid.shape) - 1) / 2
+    probes = [{'name': 'line', 'kind': LINE,
+               'points': line_points(center - (.02, 0, 0),
+                                     center + (.02, 0, 0), grid.pitch)}]
+    points, amplitude, _ = solve(grid, 3, 3e9, 30)
+    cells, owners, times, values, _ = record(grid, 3, 3e9, 30, probes,
+                                             decimation=1)
+    assert len(cells) == 5 and np.all(owners == 0)
+    peak = np.linalg.norm(values, axis=2).max(axis=0)
+    found = {tuple(point): e for point, e in zip(points, amplitude)}
+    np.testing.assert_allclose(peak, [found[tuple(c)] for c in cells],
+                               rtol=1e-6)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from addon.results import (RESULT_EXTENSIONS, ResultWriter, is_result_file,
+                           read_results, result_format)
+
+BINARY = ['NPZ', 'PARQUET', 'FEATHER']
+
+
+def writable(output_format):
+    if output_format in ('PARQUET', 'FEATHER'):
+        pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def rows():
+    return np.random.default_rng(3).normal(size=(50, 4)) * 1e3
+
+
+@pytest.mark.parametrize("output_format", list(RESULT_EXTENSIONS))
+def test_round_trip(tmp_path, rows, output_format):
+    writable(output_format)
+    path = str(tmp_path / ("out" + RESULT_EXTENSIONS[output_format]))
+    assert result_format(path) == output_format and is_result_file(path)
+    with ResultWriter(path, ['x', 'y', 'z', 'e'], {'solver': 'FDTD'}) as w:
+        for block in np.array_split(rows, 3):
+            w.write(block)
+            w.flush()
+    assert w.count == len(rows)
+
+    df = read_results(path)
+    assert list(df.columns) == ['x', 'y', 'z', 'e']
+    if output_format in BINARY:
+        # Full precision and the metadata are kept.
+        np.testing.assert_array_equal(df.to_numpy(), rows)
+        assert df.attrs['metadata'] == {'solver': 'FDTD',
+                                        'columns': ['x', 'y', 'z', 'e']}
+    else:
+        np.testing.assert_allclose(df.to_numpy(), rows)
+
+
+@pytest.mark.parametrize("output_format", BINARY)
+def test_empty(tmp_path, output_format):
+    writable(output_format)
+    path = str(tmp_path / ("out" + RESULT_EXTENSIONS[output_format]))
+    with ResultWriter(path, ['x', 'e']) as w:
+        w.write(np.zeros((0, 2)))
+    df = read_results(path)
+    assert len(df) == 0 and list(df.columns) == ['x', 'e']
+
+
+def test_unknown_format():
+    assert not is_result_file("out.txt")
+    with pytest.raises(ValueError):
+        result_format("out.txt")
@@ -0,0 +1,59 @@
+import numpy as np
+import trimesh
+
+from addon.scene_grid import material_table, save_scene_grid, voxelize_scene
+from addon.voxel_grid import BACKGROUND_MATERIAL, OccupancyGrid
+
+GLASS = {"epsilon": 4.0}
+METAL = {"sigma": 1e3}
+
+
+def box(lower, upper):
+    return trimesh.creation.box(bounds=[lower, upper])
+
+
+def test_material_table():
+    table, ids = material_table([GLASS, METAL, dict(GLASS)])
+    assert table == [BACKGROUND_MATERIAL, GLASS, METAL]
+    np.testing.assert_array_equal(ids, [1, 2, 1])
+
+
+def test_filled_box():
+    grid = voxelize_scene([box((.25, .25, .25), (.85, .65, .45))], [GLASS],
+                          (0, 0, 0), (1, 1, 1), .1)
+    assert grid.shape == (10, 10, 10)
+    np.testing.assert_allclose(grid.origin, .05)
+    occupied = np.argwhere(grid.labels)
+    np.testing.assert_array_equal(occupied.min(axis=0), (2, 2, 2))
+    np.testing.assert_array_equal(occupied.max(axis=0), (8, 6, 4))
+    # Filled, every voxel of the bounds is labeled.
+    assert len(occupied) == 7 * 5 * 3
+
+
+def test_surface_only():
+    meshes = [box((.2, .2, .2), (.8, .8, .8))]
+    filled = voxelize_scene(meshes, [GLASS], (0, 0, 0), (1, 1, 1), .1)
+    shell = voxelize_scene(meshes, [GLASS], (0, 0, 0), (1, 1, 1), .1,
+                           fill=False)
+    assert not shell.labels[4, 4, 4] and filled.labels[4, 4, 4]
+    assert np.all(filled.labels[shell.occupancy] == 1)
+
+
+def test_last_object_wins():
+    meshes = [box((0, 0, 0), (.5, .5, .5)), box((.3, .3, .3), (.9, .9, .9))]
+    grid = voxelize_scene(meshes, [GLASS, METAL], (0, 0, 0), (1, 1, 1), .1)
+    assert grid.materials == [BACKGROUND_MATERIAL, GLASS, METAL]
+    assert grid.labels[1, 1, 1] == 1
+    assert grid.labels[4, 4, 4] == 2
+    assert grid.labels[8, 8, 8] == 2
+
+
+def test_save(tmp_path):
+    mesh = box((.25, .25, .25), (.85, .65, .45))
+    grid_file = str(tmp_path / "scene.grid.npz")
+    save_scene_grid([(mesh.vertices, mesh.faces)], [GLASS], (0, 0, 0),
+                    (1, 1, 1), .1, grid_file)
+    expected = voxelize_scene([mesh], [GLASS], (0, 0, 0), (1, 1, 1), .1)
+    loaded = OccupancyGrid.load(grid_file)
+    np.testing.assert_array_equal(loaded.labels, expected.labels)
+    assert loaded.materials == expected.materials
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+import trimesh
+
+from addon.constants import GRID_EXTENSION, SPARSE_EXTENSION
+from addon.obj_io import write_obj
+from addon.results import read_results
+from addon.simulations import REDUCTIONS, averages, iter_groups, simulate
+from addon.sparse import BrickMap
+
+NAIVE = {
+    'MEAN': lambda group: group.mean(axis=0),
+    'MAX': lambda group: group.max(axis=0),
+    'RMS': lambda group: np.sqrt((group ** 2).mean(axis=0)),
+}
+
+
+@pytest.fixture
+def vertices():
+    return np.random.default_rng(2).normal(size=(103, 3))
+
+
+@pytest.mark.parametrize("reduction", REDUCTIONS)
+@pytest.mark.parametrize("group_size", [1, 10, 103, 200])
+@pytest.mark.parametrize("dimension", [1, 2, 3])
+def test_averages(vertices, reduction, group_size, dimension):
+    expected = [NAIVE[reduction](vertices[start:start + group_size,
+                                          :dimension]) * 2.5
+                for start in range(0, len(vertices), group_size)]
+    np.testing.assert_allclose(
+        averages(vertices, dimension, 2.5, group_size, reduction), expected)
+
+
+def test_averages_empty():
+    assert averages(np.zeros((0, 3)), 2).shape == (0, 2)
+
+
+def test_averages_arguments(vertices):
+    with pytest.raises(ValueError):
+        averages(vertices, 3, reduction='MEDIAN')
+    with pytest.raises(ValueError):
+        averages(vertices, 3, group_size=0)
+
+
+@pytest.mark.parametrize("reduction", REDUCTIONS)
+@pytest.mark.parametrize("splits", [[], [5, 7, 50], [1, 2, 3, 4, 100]])
+def test_iter_groups(vertices, reduction, splits):
+    blocks = np.split(vertices, splits)
+    np.testing.assert_allclose(
+        np.concatenate(list(iter_groups(blocks, 3, 2, 7, reduction))),
+        averages(vertices, 3, 2, 7, reduction))
+
+
+@pytest.fixture(params=['obj', 'grid', 'sparse'])
+def source(request, tmp_path, grid):
+    path = str(tmp_path / "input")
+    if request.param == 'obj':
+        path += '.obj'
+        write_obj(path, trimesh.creation.icosphere())
+    elif request.param == 'grid':
+        path += GRID_EXTENSION
+        grid.save(path)
+    else:
+        path += SPARSE_EXTENSION
+        BrickMap.from_grid(grid).save(path)
+    return path
+
+
+@pytest.mark.parametrize("output_format", ['NPZ', 'CSV'])
+def test_streaming_matches(tmp_path, source, output_format):
+    results = []
+    for streaming in (False, True):
+        save_path = tmp_path / str(streaming)
+        save_path.mkdir()
+        path = simulate(3, source, str(save_path), 2, group_size=4,
+                        reduction='RMS', streaming=streaming,
+                        output_format=output_format)
+        results.append(read_results(path))
+    assert len(results[0]) > 0
+    pd.testing.assert_frame_equal(*results)
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from addon.sparse import BRICK, BrickMap
+
+
+def dense(brickmap, lower, shape):
+    # Material ids of a box of voxels, read one by one.
+    indices = np.argwhere(np.ones(shape, dtype=bool)) + lower
+    return brickmap.get(indices).reshape(shape)
+
+
+def test_set_get():
+    brickmap = BrickMap(.1)
+    indices = np.array([[0, 0, 0], [-1, 5, 9], [100, -200, 3]])
+    brickmap.set(indices, [1, 2, 3])
+    np.testing.assert_array_equal(brickmap.get(indices), [1, 2, 3])
+    assert len(brickmap) == 3 and len(brickmap.bricks) == 3
+    assert brickmap.get([[1, 0, 0]])[0] == 0
+
+    # Clearing the last voxel of a brick drops the brick.
+    brickmap.set(indices[:1], 0)
+    assert len(brickmap.bricks) == 2
+
+
+@pytest.mark.parametrize("offset", [(0, 0, 0), (-5, 3, BRICK + 1)])
+def test_grid_round_trip(grid, offset):
+    brickmap = BrickMap.from_grid(grid, offset)
+    assert len(brickmap) == np.count_nonzero(grid.labels)
+    np.testing.assert_allclose(np.sort(brickmap.points(), axis=0),
+                               np.sort(grid.points(), axis=0))
+
+    back = brickmap.to_grid()
+    np.testing.assert_array_equal(back.labels, grid.labels[1:5, 1:4, 1:3])
+    np.testing.assert_allclose(back.origin, grid.origin + grid.pitch)
+    assert back.materials == grid.materials
+
+
+def test_save_load(tmp_path, grid):
+    brickmap = BrickMap.from_grid(grid, (-3, 0, 7))
+    path = str(tmp_path / "map.npz")
+    brickmap.save(path)
+    loaded = BrickMap.load(path)
+    assert loaded.pitch == brickmap.pitch
+    np.testing.assert_allclose(loaded.origin, brickmap.origin)
+    np.testing.assert_array_equal(loaded.indices(), brickmap.indices())
+    np.testing.assert_array_equal(loaded.values(), brickmap.values())
+    assert loaded.materials == brickmap.materials
+
+
+def test_set_operations():
+    a = BrickMap(1)
+    b = BrickMap(1)
+    a.set(np.argwhere(np.ones((10, 1, 1))), 1)
+    b.set(np.argwhere(np.ones((10, 1, 1))) + (5, 0, 0), 2)
+    lower, shape = (0, 0, 0), (15, 1, 1)
+    ids_a = dense(a, lower, shape).ravel()
+    ids_b = dense(b, lower, shape).ravel()
+    np.testing.assert_array_equal(dense(a.union(b), lower, shape).ravel(),
+                                  np.where(ids_a != 0, ids_a, ids_b))
+    np.testing.assert_array_equal(
+        dense(a.intersection(b), lower, shape).ravel(),
+        np.where(ids_b != 0, ids_a, 0))
+    np.testing.assert_array_equal(dense(a.difference(b), lower, shape).ravel(),
+                                  np.where(ids_b != 0, 0, ids_a))
+
+
+def test_neighbours():
+    brickmap = BrickMap(1)
+    brickmap.set([[BRICK - 1, 0, 0], [BRICK, 0, 0]], [1, 2])
+    np.testing.assert_array_equal(brickmap.neighbours([[BRICK - 1, 0, 0]]),
+                                  [[2, 0, 0, 0, 0, 0]])
+
+
+def test_iter_points(grid):
+    brickmap = BrickMap.from_grid(grid, (-3, 0, 7))
+    np.testing.assert_allclose(
+        np.concatenate(list(brickmap.iter_points(rows=5))), brickmap.points())
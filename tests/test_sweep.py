@@ -0,0 +1,88 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from addon import fdfd, fdtd, sweep
+from addon.constants import FREQUENCY_UNIT, GRID_EXTENSION
+from addon.results import read_results
+from addon.shared import SharedArrays, attach
+from addon.simulations import averages, simulate_sweep
+
+OPTIONS = {'dimension': 2, 'group_size': 3, 'reduction': 'MEAN',
+           'time_steps': 20, 'fdfd_method': 'DIRECT'}
+
+
+def geometry(grid):
+    return {'labels': grid.labels, 'origin': grid.origin,
+            'pitch': grid.pitch, 'materials': grid.materials}
+
+
+def test_frequencies():
+    np.testing.assert_allclose(sweep.frequencies(1, 2, .1),
+                               np.linspace(1, 2, 11))
+    np.testing.assert_allclose(sweep.frequencies(1, 2.5, 1), [1, 2])
+    with pytest.raises(ValueError):
+        sweep.frequencies(1, 2, 0)
+    with pytest.raises(ValueError):
+        sweep.frequencies(2, 1, 1)
+
+
+def test_shared_arrays():
+    shared = SharedArrays()
+    try:
+        array = shared((3, 4), np.float32)
+        array[...] = np.arange(12).reshape(3, 4)
+        handles = pickle.loads(pickle.dumps(
+            shared.handle({'a': array, 'b': [1, array]})))
+        blocks = []
+        attached = attach(handles, blocks)
+        np.testing.assert_array_equal(attached['a'], array)
+        # The attached arrays share the memory of the originals.
+        attached['b'][1][0, 0] = 42
+        assert array[0, 0] == 42
+        for block in blocks:
+            block.close()
+    finally:
+        shared.close()
+    assert not shared.blocks
+
+
+def test_averages():
+    vertices = np.random.default_rng(4).normal(size=(20, 3))
+    options = dict(OPTIONS, solver='AVERAGES')
+    for frequency, rows in zip([1, 3], sweep.run({'vertices': vertices},
+                                                 [1, 3], options)):
+        expected = averages(vertices, 2, frequency, 3, 'MEAN')
+        np.testing.assert_array_equal(rows[:, 0], frequency)
+        np.testing.assert_array_equal(rows[:, 1:], expected)
+
+
+@pytest.mark.parametrize("solver", ['FDTD', 'FDFD'])
+def test_field_solvers(grid, solver):
+    options = dict(OPTIONS, solver=solver)
+    rows = list(sweep.run(geometry(grid), [2, 3], options))
+    if solver == 'FDTD':
+        points, values, _ = fdtd.solve(grid, 2, 3 * FREQUENCY_UNIT, 20)
+    else:
+        points, values, _ = fdfd.solve(grid, 2, 3 * FREQUENCY_UNIT)
+        values = values[:, 0]
+    np.testing.assert_array_equal(rows[1][:, 1:3], points)
+    np.testing.assert_array_equal(rows[1][:, 3], values)
+
+
+@pytest.mark.parametrize("solver", ['AVERAGES', 'FDTD', 'FDFD'])
+def test_workers_match_serial(tmp_path, grid, solver):
+    path = str(tmp_path / ("input" + GRID_EXTENSION))
+    grid.save(path)
+    results = []
+    for workers in (1, 2):
+        save_path = tmp_path / str(workers)
+        save_path.mkdir()
+        result = simulate_sweep(2, path, str(save_path), 1, 3, 1,
+                                group_size=3, solver=solver, time_steps=20,
+                                workers=workers)
+        results.append(read_results(result))
+    np.testing.assert_array_equal(*[df.to_numpy() for df in results])
+    np.testing.assert_array_equal(np.unique(results[0]['f']), [1, 2, 3])
+    assert results[0].attrs['metadata']['frequencies'] == [1, 2, 3]
@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+from addon.tasks import CANCELLED, DONE, FAILED, BackgroundTask
+
+
+def sleep(path, seconds):
+    # Marks that the item started, once its worker is known to the pool.
+    open(path, "w").close()
+    time.sleep(seconds)
+
+
+def add_items(task):
+    task.add("square", pow, 3, 2)
+    task.add("bad", int, "x")
+    task.add("divide", divmod, 7, 2)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run(workers):
+    task = BackgroundTask(workers)
+    add_items(task)
+    assert task.progress == 0
+    task.run()
+    assert task.done and task.progress == 1
+    assert task.results() == [9, None, (3, 1)]
+    assert [item.status for item in task.items] == [DONE, FAILED, DONE]
+    assert task.failed[0].label == "bad" and "invalid" in task.failed[0].error
+
+
+def test_cancel(tmp_path):
+    task = BackgroundTask(2)
+    started = [tmp_path / "a", tmp_path / "b"]
+    for path in started:
+        task.add("slow", sleep, str(path), 60)
+    task.start()
+    while not all(path.exists() for path in started):
+        time.sleep(.05)
+    assert not task.poll()
+    start = time.monotonic()
+    task.cancel()
+    assert time.monotonic() - start < 30
+    assert task.cancelled
+    assert [item.status for item in task.items] == [CANCELLED, CANCELLED]
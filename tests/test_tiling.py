@@ -0,0 +1,102 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+import trimesh
+
+from addon.tiling import brick_core, iter_bricks, subdivision_passes
+from addon.voxelizer import Voxelizer
+from addon.sparse import BrickMap, sparse_path
+from addon.voxel_grid import OccupancyGrid, grid_path
+
+# Budget of the smallest bricks, 8 voxels on a side.
+BUDGET = 64 * 8 ** 3
+
+
+def dense_voxels(mesh, pitch):
+    voxelgrid = mesh.voxelized(pitch)
+    offset = np.round(voxelgrid.transform[:3, 3] / pitch).astype(np.int64)
+    return set(map(tuple, np.argwhere(voxelgrid.matrix) + offset))
+
+
+def tiled_voxels(mesh, pitch, halo):
+    voxels = set()
+    for offset, matrix in iter_bricks(mesh, pitch, BUDGET, halo=halo):
+        core = brick_core(matrix, halo)
+        voxels |= set(map(tuple, np.argwhere(matrix & core) + offset))
+    return voxels
+
+
+def rotated_box():
+    # Triangles much larger than a brick, not aligned with the lattice.
+    mesh = trimesh.creation.box((1, .7, .4))
+    mesh.apply_transform(trimesh.transformations.rotation_matrix(
+        .7, [1, 2, 3]))
+    return mesh
+
+
+@pytest.mark.parametrize("mesh, pitch", [
+    (trimesh.creation.icosphere(), .1),
+    (trimesh.creation.torus(1, .3), .07),
+    (rotated_box(), .05),
+])
+@pytest.mark.parametrize("halo", [0, 1])
+def test_tiled_matches_dense(mesh, pitch, halo):
+    assert tiled_voxels(mesh, pitch, halo) == dense_voxels(mesh, pitch)
+
+
+def test_fine_pitch():
+    # The long edge needs more subdivisions than the dense voxelization
+    # allows.
+    mesh = trimesh.Trimesh([[0, 0, 0], [3, .2, .1], [.1, .05, .3]],
+                           [[0, 1, 2]])
+    pitch = .005
+    with pytest.raises(ValueError):
+        mesh.voxelized(pitch)
+
+    vertices, _ = trimesh.remesh.subdivide_to_size(
+        mesh.vertices, mesh.faces, max_edge=pitch / 2,
+        max_iter=subdivision_passes(mesh.triangles, pitch))
+    expected = set(map(tuple, np.round(vertices / pitch).astype(np.int64)))
+    voxels = set()
+    for offset, matrix in iter_bricks(mesh, pitch, 2 ** 20):
+        voxels |= set(map(tuple, np.argwhere(matrix) + offset))
+    assert voxels == expected
+
+
+def test_memory_budget():
+    # Faces much larger than a brick are only subdivided near each brick.
+    mesh = trimesh.creation.box((1, 1, 1))
+    budget = 2 ** 21
+    count = 0
+    tracemalloc.start()
+    try:
+        for offset, matrix in iter_bricks(mesh, .01, budget):
+            count += matrix.sum()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # The faces are on the voxel centers -50 and 50, a shell 101 voxels wide.
+    assert count == 101 ** 3 - 99 ** 3
+    assert peak < budget
+
+
+@pytest.mark.parametrize("mode", ['BOXES', 'SURFACE', 'GREEDY'])
+def test_tiled_export_matches_dense(tmp_path, mode):
+    (tmp_path / "materials").mkdir()
+    mesh = trimesh.creation.icosphere()
+    dense_obj = str(tmp_path / "dense.obj")
+    tiled_obj = str(tmp_path / "tiled.obj")
+    Voxelizer(mesh, "m", str(tmp_path), .1, mode).export_obj(dense_obj)
+    Voxelizer(mesh, "m", str(tmp_path), .1, mode,
+              memory_budget=BUDGET).export_obj(tiled_obj)
+
+    dense = OccupancyGrid.load(grid_path(dense_obj))
+    tiled = BrickMap.load(sparse_path(tiled_obj)).to_grid()
+    np.testing.assert_array_equal(tiled.labels, dense.labels)
+    np.testing.assert_allclose(tiled.origin, dense.origin)
+
+    # Both OBJ files describe the same voxels.
+    np.testing.assert_array_equal(
+        OccupancyGrid.from_obj(tiled_obj, .1).labels,
+        OccupancyGrid.from_obj(dense_obj, .1).labels)
@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from addon import visualizations
+from addon.constants import GRID_EXTENSION
+from addon.plot import HeatMap, ScatterPlot
+from addon.visualizations import (ALL_KINDS, read_data, render_all,
+                                  render_visualization)
+
+PNG = b"\x89PNG"
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = str(tmp_path / "data.csv")
+    points = np.random.default_rng(5).random((30, 3))
+    pd.DataFrame(points, columns=list("xyz")).to_csv(path, index=False)
+    return path
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_plots_do_not_share_figures():
+    with HeatMap() as heatmap, ScatterPlot() as scatter:
+        heatmap.set_title("heat")
+        scatter.create_scatter([0, 1], [0, 1], [0, 1])
+        assert heatmap.figure is not scatter.figure
+        assert heatmap.axes().get_title() == "heat"
+        assert scatter.axes().get_title() == ""
+    assert not heatmap.figure.axes
+
+
+@pytest.mark.parametrize("kind", ALL_KINDS)
+def test_render_visualization(tmp_path, data_file, kind):
+    image = str(tmp_path / "image.png")
+    assert render_visualization(kind, data_file, image) == image
+    assert read(image).startswith(PNG)
+
+
+def test_render_voxels(tmp_path, grid):
+    path = str(tmp_path / ("grid" + GRID_EXTENSION))
+    grid.save(path)
+    np.testing.assert_allclose(read_data(path)[list("xyz")].to_numpy(),
+                               grid.points())
+    image = render_visualization('VOXELS', path, str(tmp_path / "voxels.png"))
+    assert read(image).startswith(PNG)
+
+
+def test_unknown_kind(tmp_path, data_file):
+    with pytest.raises(ValueError):
+        render_visualization('PIE', data_file, str(tmp_path / "image.png"))
+
+
+def test_render_all(tmp_path, data_file, monkeypatch):
+    # Workers are capped by the CPUs of the machine.
+    monkeypatch.setattr(visualizations.os, "cpu_count", lambda: 4)
+    images = []
+    for workers in (1, 2):
+        image_dir = tmp_path / str(workers)
+        image_dir.mkdir()
+        paths = render_all(data_file, str(image_dir), workers=workers)
+        assert [os.path.basename(path) for path in paths] == [
+            kind + ".png" for kind in ALL_KINDS]
+        images.append([read(path) for path in paths])
+    assert all(image.startswith(PNG) for image in images[0])
+    assert images[0] == images[1]
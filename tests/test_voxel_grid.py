@@ -0,0 +1,142 @@
+import os
+
+import numpy as np
+import pytest
+import trimesh
+
+from addon.simulations import grid_key, load_grid
+from addon.voxel_grid import OccupancyGrid, grid_path, obj_material_file
+from addon.voxelizer import CustomMaterial, Voxelizer
+
+
+def assert_same_grid(grid, other):
+    np.testing.assert_array_equal(grid.labels, other.labels)
+    np.testing.assert_allclose(grid.origin, other.origin)
+    assert grid.pitch == pytest.approx(other.pitch)
+
+
+def test_round_trip(tmp_path, grid):
+    path = str(tmp_path / "grid.npz")
+    grid.save(path)
+    loaded = OccupancyGrid.load(path)
+    assert_same_grid(loaded, grid)
+    assert loaded.materials == grid.materials
+
+
+@pytest.mark.parametrize("label", [1, 3])
+def test_single_material(tmp_path, grid, label):
+    grid.labels = grid.occupancy.astype(np.uint8) * label
+    path = str(tmp_path / "grid.npz")
+    grid.save(path)
+    assert_same_grid(OccupancyGrid.load(path), grid)
+
+
+def test_empty(tmp_path):
+    grid = OccupancyGrid(np.zeros((3, 2, 1), dtype=bool), (0, 0, 0), .5)
+    path = str(tmp_path / "grid.npz")
+    grid.save(path)
+    assert_same_grid(OccupancyGrid.load(path), grid)
+
+
+def test_points(grid):
+    np.testing.assert_allclose(grid.points(),
+                               grid.origin + grid.pitch * grid.indices())
+    np.testing.assert_allclose(np.concatenate(list(grid.iter_points(rows=4))),
+                               grid.points())
+
+
+def test_export_writes_grid(tmp_path):
+    (tmp_path / "materials").mkdir()
+    mesh = trimesh.creation.icosphere()
+    obj_file = str(tmp_path / "sphere.obj")
+    Voxelizer(mesh, "m", str(tmp_path), .2).export_obj(obj_file)
+
+    grid = OccupancyGrid.load(grid_path(obj_file))
+    voxelgrid = mesh.voxelized(.2)
+    np.testing.assert_array_equal(grid.occupancy, voxelgrid.matrix)
+    np.testing.assert_allclose(grid.transform, voxelgrid.transform)
+    assert len(grid.materials) == 2
+
+
+@pytest.mark.parametrize("mode", ['BOXES', 'SURFACE', 'GREEDY'])
+def test_from_obj(tmp_path, mode):
+    (tmp_path / "materials").mkdir()
+    mesh = trimesh.creation.torus(1, .4)
+    obj_file = str(tmp_path / "torus.obj")
+    Voxelizer(mesh, "m", str(tmp_path), .1, mode).export_obj(
+        obj_file, CustomMaterial(epsilon=3.0))
+
+    grid = OccupancyGrid.load(grid_path(obj_file))
+    # Greedy quads can be larger than a voxel, the pitch is then given.
+    pitch = .1 if mode == 'GREEDY' else None
+    rebuilt = OccupancyGrid.from_obj(obj_file, pitch)
+    assert_same_grid(rebuilt, grid)
+    assert float(rebuilt.materials[1]["epsilon"]) == 3.0
+
+
+def test_from_legacy_obj(tmp_path):
+    # Files written by trimesh itself, before the streaming writer.
+    voxelgrid = trimesh.creation.icosphere().voxelized(.15)
+    obj_file = str(tmp_path / "legacy.obj")
+    voxelgrid.as_boxes().export(obj_file)
+    rebuilt = OccupancyGrid.from_obj(obj_file)
+    np.testing.assert_array_equal(rebuilt.occupancy, voxelgrid.matrix)
+    np.testing.assert_allclose(rebuilt.transform, voxelgrid.transform,
+                               atol=1e-6)
+
+
+def test_from_obj_sibling_material(tmp_path):
+    # OBJ files exported by trimesh have no mtllib record, the material is
+    # the mtl file of the same name.
+    voxelgrid = trimesh.creation.box((1, 1, 1)).voxelized(.25)
+    obj_file = str(tmp_path / "part.obj")
+    with open(obj_file, "w") as f:
+        f.write(trimesh.exchange.obj.export_obj(
+            voxelgrid.as_boxes(), mtl_name=str(tmp_path / "part.mtl")))
+    mtl_file = tmp_path / "part.mtl"
+    CustomMaterial(sigma=5, epsilon=4).to_obj(str(mtl_file))
+
+    assert obj_material_file(obj_file) == str(mtl_file)
+    rebuilt = OccupancyGrid.from_obj(obj_file)
+    assert rebuilt.materials[1]["sigma"] == 5.0
+    assert rebuilt.materials[1]["epsilon"] == 4.0
+
+    key = grid_key(obj_file, solver='FDTD')
+    mtl_file.write_text("newmtl part\nsigma 6\nepsilon 4\n")
+    assert grid_key(obj_file, solver='FDTD') != key
+
+
+def test_from_obj_errors(tmp_path):
+    obj_file = tmp_path / "bad.obj"
+    obj_file.write_text("v 0 0 0\nv 1 0 0\nv 0 1 0\nv .35 0 0\nf 1 2 3\n")
+    with pytest.raises(ValueError):
+        OccupancyGrid.from_obj(str(obj_file), 1.)
+    empty = tmp_path / "empty.obj"
+    empty.write_text("")
+    assert OccupancyGrid.from_obj(str(empty)).labels.size == 0
+
+
+def test_grid_key(tmp_path, grid):
+    (tmp_path / "materials").mkdir()
+    obj_file = str(tmp_path / "box.obj")
+    Voxelizer(trimesh.creation.box((1, 1, 1)), "m", str(tmp_path),
+              .25).export_obj(obj_file)
+    key = grid_key(obj_file, solver='FDTD')
+    assert grid_key(obj_file, solver='FDFD') != key
+    np.testing.assert_array_equal(load_grid(obj_file, 'FDTD').labels,
+                                  OccupancyGrid.load(grid_path(obj_file)).labels)
+
+    # Without the grid file the OBJ is read, with the material it refers to.
+    os.remove(grid_path(obj_file))
+    without_grid = grid_key(obj_file, solver='FDTD')
+    assert without_grid != key
+    np.testing.assert_array_equal(load_grid(obj_file, 'FDTD').labels,
+                                  OccupancyGrid.from_obj(obj_file).labels)
+    mtl_file = obj_material_file(obj_file)
+    with open(mtl_file, "a") as f:
+        f.write("epsilon 5\n")
+    assert grid_key(obj_file, solver='FDTD') != without_grid
+
+    # Regenerating the grid changes the key.
+    grid.save(grid_path(obj_file))
+    assert grid_key(obj_file, solver='FDTD') not in (key, without_grid)
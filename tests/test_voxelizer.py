@@ -0,0 +1,42 @@
+import filecmp
+import pickle
+import shutil
+
+import numpy as np
+import pytest
+import trimesh
+
+from addon.voxel_grid import OccupancyGrid, grid_path
+from addon.voxelizer import VoxelJob, voxelize_jobs
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    (tmp_path / "materials").mkdir()
+    stl_file = str(tmp_path / "box.stl")
+    trimesh.creation.box((1, .5, .3)).export(stl_file)
+    sphere = trimesh.creation.icosphere()
+    sources = [stl_file, (sphere.vertices, sphere.faces), stl_file]
+    return [VoxelJob(source, f"m{i}", str(tmp_path),
+                     str(tmp_path / f"out{i}.obj"), voxel_size=.1,
+                     material={"epsilon": 2.0})
+            for i, source in enumerate(sources)]
+
+
+def test_job_is_picklable(jobs):
+    job = pickle.loads(pickle.dumps(jobs[1]))
+    assert job.obj_file == jobs[1].obj_file
+
+
+def test_workers_match_serial(jobs):
+    serial = voxelize_jobs(jobs)
+    grids = [OccupancyGrid.load(grid_path(path)) for path in serial]
+    for path in serial:
+        shutil.copyfile(path, path + ".serial")
+
+    assert voxelize_jobs(jobs, workers=2) == serial
+    for path, grid in zip(serial, grids):
+        assert filecmp.cmp(path, path + ".serial", shallow=False)
+        parallel = OccupancyGrid.load(grid_path(path))
+        np.testing.assert_array_equal(parallel.labels, grid.labels)
+        assert parallel.materials == grid.materials